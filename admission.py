@@ -0,0 +1,65 @@
+import threading
+
+
+class TokenBucket:
+    """Ограничение частоты: rate жетонов в секунду, не больше burst подряд."""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, now):
+        tokens = self.tokens + (now - self.updated) * self.rate
+        self.updated = now
+        if tokens > self.burst:
+            tokens = self.burst
+        if tokens < 1:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1
+        return True
+
+
+class AdmissionControl:
+    """Счетчики подключений: всего на сервер и с одного адреса.
+
+    admit возвращает ключ ошибки из commands.ERRORS или None, если
+    подключение принято; каждому принятому должен соответствовать release.
+    """
+
+    def __init__(self, max_connections=1000, max_per_ip=16):
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.total = 0
+        self.per_ip = {}
+        self.lock = threading.Lock()
+
+    def admit(self, ip):
+        with self.lock:
+            if self.max_connections is not None and self.total >= self.max_connections:
+                return 'server_full'
+            count = self.per_ip.get(ip, 0)
+            if self.max_per_ip is not None and count >= self.max_per_ip:
+                return 'too_many_connections'
+            self.per_ip[ip] = count + 1
+            self.total += 1
+            return None
+
+    def add(self, ip):
+        # подключение, принятое прежним процессом при перезапуске: считается и сверх лимитов
+        with self.lock:
+            self.per_ip[ip] = self.per_ip.get(ip, 0) + 1
+            self.total += 1
+
+    def release(self, ip):
+        with self.lock:
+            count = self.per_ip.get(ip, 0)
+            if count <= 1:
+                self.per_ip.pop(ip, None)
+            else:
+                self.per_ip[ip] = count - 1
+            self.total -= 1
@@ -0,0 +1,366 @@
+"""Выгрузка сыгранных партий для аналитики и офлайн-сводка по ним.
+
+Сервер подписывается на шину событий и копит ходы каждой идущей партии;
+закончившаяся партия (game_over) становится строкой CSV. Строки пишутся
+пачками в сжатый файл games-*.csv.gz.part, который по числу строк или
+по времени закрывается и переименовывается в .csv.gz - такие файлы уже
+не меняются, и сводка читает только их. Время проверяется и без новых
+партий: сервер вызывает tick вместе с проверкой дедлайнов. Партии, сброшенные без
+game_over (все вышли), не выгружаются.
+
+Сводка читает файлы потоком, по файлу на процесс, и складывает счетчики:
+популярные города, длина и время партий, буквы, на которых партии
+заканчиваются (тупики), и игроки.
+
+    python analytics.py analytics/*.csv.gz --workers 8
+    python analytics.py --generate 1000000 --out /tmp/games     # синтетические партии для замера
+"""
+import argparse
+import csv
+import glob
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+ANALYTICS_EVENTS = ('game_started', 'city_played', 'game_over', 'reset')
+ROTATE_ROWS = 50000
+ROTATE_SECONDS = 3600
+# игроки, города и очки - JSON (в названиях бывают любые знаки), номера ходящих и паузы - через '|'
+COLUMNS = ('started_at', 'room', 'dictionary', 'players', 'cities', 'movers', 'move_ms', 'duration_ms',
+           'scores', 'last_letter')
+
+
+class GameTrace:
+    __slots__ = ('started_at', 'started_wall', 'dictionary', 'players', 'cities', 'movers', 'move_ms', 'last_at',
+                 'last_letter')
+
+    def __init__(self, started_at, started_wall, dictionary):
+        self.started_at = started_at        # по часам сервера, от них считаются длительности
+        self.started_wall = started_wall    # время начала для строки CSV
+        self.dictionary = dictionary
+        self.players = {}       # имя -> номер в порядке первого хода
+        self.cities = []
+        self.movers = []
+        self.move_ms = []       # мс с предыдущего хода, у первого - 0
+        self.last_at = started_at
+        self.last_letter = None
+
+    def move(self, player, city, last_letter, at):
+        if player is None:
+            mover = ''          # партию открыл сервер
+        else:
+            mover = self.players.setdefault(player, len(self.players))
+        self.cities.append(city)
+        self.movers.append(mover)
+        self.move_ms.append(int((at - self.last_at) * 1000))
+        self.last_at = at
+        self.last_letter = last_letter
+
+
+class AnalyticsWriter:
+    """Строки партий в сменяющиеся сжатые файлы CSV"""
+
+    def __init__(self, directory, rotate_rows=ROTATE_ROWS, rotate_seconds=ROTATE_SECONDS, clock=time.monotonic):
+        self.directory = directory
+        self.rotate_rows = rotate_rows
+        self.rotate_seconds = rotate_seconds
+        self.clock = clock
+        self.file = None
+        self.writer = None
+        self.path = None
+        self.rows = 0
+        self.opened = 0.0
+        self.files_written = 0
+        self.lock = threading.Lock()    # пишет поток шины, по времени закрывает поток дедлайнов
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(self.directory, f"games-{stamp}-{os.getpid()}-{self.files_written}.csv.gz.part")
+        self.file = gzip.open(self.path, 'wt', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+        self.rows = 0
+        self.opened = self.clock()
+
+    def write(self, rows):
+        if not rows:
+            return
+        with self.lock:
+            if self.file is None:
+                self._open()
+            self.writer.writerows(rows)
+            self.rows += len(rows)
+            # Z_SYNC_FLUSH после пачки: при падении процесса теряется только незаписанная пачка
+            self.file.flush()
+            if self.rows >= self.rotate_rows or self.clock() - self.opened >= self.rotate_seconds:
+                self._close()
+
+    def rotate_if_due(self):
+        # без новых партий файл иначе так и остался бы .part до следующей записи
+        with self.lock:
+            if self.file is not None and self.clock() - self.opened >= self.rotate_seconds:
+                return self._close()
+        return None
+
+    def close(self):
+        with self.lock:
+            return self._close()
+
+    def _close(self):
+        if self.file is None:
+            return None
+        self.file.close()
+        final = self.path[:-len('.part')]
+        os.replace(self.path, final)
+        self.file = None
+        self.files_written += 1
+        return final
+
+
+class AnalyticsExporter:
+    """Подписчик шины событий: собирает партии комнат и отдает готовые писателю.
+
+    describe(room_name) возвращает словарь комнаты ('ru/classic'), его
+    нет в событиях. clock - часы сервера, по которым помечены события.
+    """
+
+    def __init__(self, writer, describe=None, clock=time.monotonic):
+        self.writer = writer
+        self.describe = describe or (lambda room_name: '')
+        self.clock = clock
+        self.games = {}         # комната -> GameTrace идущей партии
+        self.exported = 0
+
+    def on_events(self, events):
+        rows = []
+        for event in events:
+            data = event.data
+            if event.type == 'game_started':
+                started_wall = time.time() - (self.clock() - event.at)
+                trace = self.games[event.room] = GameTrace(event.at, started_wall, self.describe(event.room))
+                trace.move(data['player'], data['city'], data['last_letter'], event.at)
+            elif event.type == 'city_played':
+                trace = self.games.get(event.room)
+                if trace is not None:
+                    trace.move(data['player'], data['city'], data['last_letter'], event.at)
+            elif event.type == 'game_over':
+                trace = self.games.pop(event.room, None)
+                if trace is not None:
+                    rows.append(self.row(event.room, trace, data['scores'], event.at))
+            else:
+                self.games.pop(event.room, None)
+        self.writer.write(rows)
+        self.exported += len(rows)
+
+    @staticmethod
+    def row(room_name, trace, scores, finished_at):
+        players = list(trace.players)
+        # игроки без единого хода тоже попадают в партию
+        players.extend(name for name in scores if name not in trace.players)
+        return (round(trace.started_wall, 3), room_name, trace.dictionary,
+                json.dumps(players, ensure_ascii=False), json.dumps(trace.cities, ensure_ascii=False),
+                '|'.join(map(str, trace.movers)), '|'.join(map(str, trace.move_ms)),
+                int((finished_at - trace.started_at) * 1000), json.dumps(scores, ensure_ascii=False),
+                trace.last_letter or '')
+
+    def tick(self):
+        return self.writer.rotate_if_due()
+
+    def close(self):
+        return self.writer.close()
+
+
+# офлайн-сводка
+
+class GameAggregate:
+    """Счетчики по файлам партий, которые можно складывать между процессами"""
+
+    def __init__(self):
+        self.games = 0
+        self.moves = 0
+        self.duration_ms = 0
+        self.move_ms = 0
+        self.lengths = Counter()        # ходов в партии -> партий
+        self.cities = {}                # словарь -> Counter(город -> сколько раз сыгран)
+        self.openings = Counter()       # (словарь, город) -> сколько партий начал
+        self.dead_ends = Counter()      # (словарь, буква) -> сколько партий на ней закончилось
+        self.players = {}               # имя -> [партий, побед, очков]
+
+    def add_row(self, row):
+        _, _, dictionary, players, cities, _, move_ms, duration_ms, scores, last_letter = row
+        cities = json.loads(cities)
+        self.games += 1
+        self.moves += len(cities)
+        self.lengths[len(cities)] += 1
+        self.duration_ms += int(duration_ms)
+        if move_ms:
+            self.move_ms += sum(map(int, move_ms.split('|')))
+        # Counter.update со списком считает в C, по городу на ход это основная работа сводки
+        counter = self.cities.get(dictionary)
+        if counter is None:
+            counter = self.cities[dictionary] = Counter()
+        counter.update(cities)
+        if cities:
+            self.openings[dictionary, cities[0]] += 1
+        self.dead_ends[dictionary, last_letter] += 1
+
+        scores = json.loads(scores)
+        best = max(scores.values(), default=0)
+        winners = [name for name, score in scores.items() if score == best]
+        for name in json.loads(players):
+            stats = self.players.get(name)
+            if stats is None:
+                stats = self.players[name] = [0, 0, 0]
+            stats[0] += 1
+            stats[2] += scores.get(name, 0)
+            if len(winners) == 1 and winners[0] == name and best:
+                stats[1] += 1
+
+    def merge(self, other):
+        self.games += other.games
+        self.moves += other.moves
+        self.duration_ms += other.duration_ms
+        self.move_ms += other.move_ms
+        self.lengths.update(other.lengths)
+        for dictionary, counter in other.cities.items():
+            self.cities.setdefault(dictionary, Counter()).update(counter)
+        self.openings.update(other.openings)
+        self.dead_ends.update(other.dead_ends)
+        for name, (games, wins, points) in other.players.items():
+            stats = self.players.get(name)
+            if stats is None:
+                self.players[name] = [games, wins, points]
+            else:
+                stats[0] += games
+                stats[1] += wins
+                stats[2] += points
+
+
+def aggregate_file(path):
+    aggregate = GameAggregate()
+    opener = gzip.open if path.endswith(('.gz', '.gz.part')) else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)      # заголовок
+        for row in reader:
+            aggregate.add_row(row)
+    return aggregate
+
+
+def aggregate_files(paths, workers=None):
+    total = GameAggregate()
+    # по файлу на задачу: в памяти процесса только счетчики, не строки
+    with Pool(workers) as pool:
+        for aggregate in pool.imap_unordered(aggregate_file, paths):
+            total.merge(aggregate)
+    return total
+
+
+def print_report(total, elapsed, top=10):
+    print(f"📊 Партий: {total.games}, ходов: {total.moves}, {elapsed:.1f} с "
+          f"({total.games / max(elapsed, 1e-9):.0f} партий/с)")
+    if not total.games:
+        return
+    print(f"  средняя длина: {total.moves / total.games:.1f} ходов, "
+          f"самая длинная: {max(total.lengths)}, "
+          f"средняя партия: {total.duration_ms / total.games / 1000:.1f} с, "
+          f"средний ход: {total.move_ms / max(total.moves - total.games, 1) / 1000:.2f} с")
+
+    print("\n🏙️ Чаще всего играют:")
+    played = Counter({(dictionary, city): count for dictionary, counter in total.cities.items()
+                      for city, count in counter.items()})
+    for (dictionary, city), count in played.most_common(top):
+        print(f"  {city:24} {dictionary:14} {count:10} ({count / total.games * 100:.1f}% партий)")
+
+    print("\n🚪 Первые города:")
+    for (dictionary, city), count in total.openings.most_common(top):
+        print(f"  {city:24} {dictionary:14} {count:10}")
+
+    print("\n🧱 Тупики (на какую букву заканчиваются партии):")
+    for (dictionary, letter), count in total.dead_ends.most_common(top):
+        print(f"  {letter.upper() or '-':3} {dictionary:14} {count:10} ({count / total.games * 100:.1f}%)")
+
+    print("\n🏆 Игроки (побед / партий, очков):")
+    ranked = sorted(total.players.items(), key=lambda item: (-item[1][1], -item[1][2]))
+    for name, (games, wins, points) in ranked[:top]:
+        print(f"  {name:24} {wins:7} / {games:<7} {points:9}")
+
+
+# синтетические партии для замера сводки
+
+def synthetic_rows(games, seed=None):
+    from server import DEFAULT_DICTIONARY as dictionary
+
+    rng = random.Random(seed)
+    buckets = [list(ids) for ids in dictionary.ids_by_letter]
+    last_ids = dictionary.last_letter_ids
+    started_at = time.time()
+    for game in range(games):
+        players = [f"Игрок {rng.randrange(1000)}" for _ in range(rng.randrange(2, 5))]
+        remaining = [bucket.copy() for bucket in buckets]
+        city_id = rng.randrange(len(dictionary))
+        remaining[dictionary.first_letter_ids[city_id]].remove(city_id)
+        cities = [city_id]
+        while remaining[last_ids[city_id]]:
+            bucket = remaining[last_ids[city_id]]
+            i = rng.randrange(len(bucket))
+            city_id = bucket[i]
+            bucket[i] = bucket[-1]
+            bucket.pop()
+            cities.append(city_id)
+
+        movers = [i % len(players) for i in range(len(cities))]
+        move_ms = [0] + [rng.randrange(500, 15000) for _ in cities[1:]]
+        scores = Counter(players[mover] for mover in movers)
+        yield (round(started_at + game, 3), "Синтетика", dictionary.describe(),
+               json.dumps(players, ensure_ascii=False),
+               json.dumps([dictionary.names[i] for i in cities], ensure_ascii=False), '|'.join(map(str, movers)),
+               '|'.join(map(str, move_ms)), sum(move_ms), json.dumps(scores, ensure_ascii=False),
+               dictionary.letters[last_ids[city_id]])
+
+
+def generate(games, directory, rotate_rows=ROTATE_ROWS, batch=1000, seed=1):
+    writer = AnalyticsWriter(directory, rotate_rows, rotate_seconds=float('inf'))
+    rows = []
+    for row in synthetic_rows(games, seed):
+        rows.append(row)
+        if len(rows) >= batch:
+            writer.write(rows)
+            rows = []
+    writer.write(rows)
+    writer.close()
+    return writer.files_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводка по выгруженным партиям")
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--workers', type=int, default=None, help="процессов (по умолчанию по числу ядер)")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--generate', type=int, default=0, help="записать столько синтетических партий")
+    parser.add_argument('--out', default='analytics')
+    parser.add_argument('--rotate-rows', type=int, default=ROTATE_ROWS)
+    args = parser.parse_args()
+
+    if args.generate:
+        started = time.perf_counter()
+        files = generate(args.generate, args.out, args.rotate_rows)
+        print(f"📝 Записано партий: {args.generate}, файлов: {files}, {time.perf_counter() - started:.1f} с")
+        return
+
+    paths = sorted(path for pattern in args.files for path in glob.glob(pattern))
+    if not paths:
+        parser.error("нет файлов партий (games-*.csv.gz)")
+    started = time.perf_counter()
+    total = aggregate_files(paths, args.workers)
+    print_report(total, time.perf_counter() - started, args.top)
+
+
+if __name__ == "__main__":
+    main()
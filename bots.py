@@ -0,0 +1,49 @@
+import random
+
+
+# mistake_rate - вероятность "не вспомнить" город и пропустить ход,
+# greedy - выбирать ход, оставляющий сопернику меньше всего городов
+BOT_DIFFICULTIES = {
+    'easy': {'mistake_rate': 0.25, 'greedy': False},
+    'medium': {'mistake_rate': 0.05, 'greedy': False},
+    'hard': {'mistake_rate': 0.0, 'greedy': True},
+}
+
+
+class BotPlayer:
+    """Серверный бот, который ходит прямо внутри процесса"""
+
+    def __init__(self, name, difficulty='medium', rng=None):
+        if difficulty not in BOT_DIFFICULTIES:
+            raise ValueError(f"Неизвестная сложность: {difficulty}")
+
+        self.name = name
+        self.difficulty = difficulty
+        self.settings = BOT_DIFFICULTIES[difficulty]
+        self.rng = rng or random.Random()
+
+    def choose_city(self, room):
+        index = room.index
+        candidates = index.candidates(room.last_letter)
+        if not candidates:
+            return None
+
+        if self.rng.random() < self.settings['mistake_rate']:
+            return None
+
+        if self.settings['greedy']:
+            # ход, после которого у соперника меньше всего вариантов
+            best_left = None
+            best = []
+            for city_id in candidates:
+                left = index.count_after(city_id)
+                if best_left is None or left < best_left:
+                    best_left = left
+                    best = [city_id]
+                elif left == best_left:
+                    best.append(city_id)
+            city_id = self.rng.choice(best)
+        else:
+            city_id = self.rng.choice(tuple(candidates))
+
+        return index.dictionary.names[city_id]
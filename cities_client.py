@@ -0,0 +1,559 @@
+"""Клиент игры в города без Qt: библиотека на asyncio и терминальный клиент.
+
+    python cities_client.py --name Вася                 # игра в терминале
+    python cities_client.py --swarm 2000 --moves 20     # нагрузка из одного процесса
+
+Ответы сервера приходят в том же порядке, что и команды, поэтому каждая
+команда возвращает ответ из очереди ожидания; рассылки (room_state, чат,
+match_found, game_over) идут в обработчики, подписанные через on().
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import deque
+
+from city_index import CityDictionary
+from compression import (COMPRESSION, FRAME_HEADER, STREAM_CONTINUE, STREAM_START, StreamDecompressor,
+                         unpack_dictionary)
+from dictionaries import RUSSIAN_CITIES
+
+# длиннее строки readline не читает; снимок комнаты на тысячи игроков больше 64 КБ по умолчанию
+READ_LIMIT = 16 * 1024 * 1024
+
+# словари сжатия, полученные от серверов: id -> словарь (общие для всех клиентов процесса)
+DICTIONARIES = {}
+
+# тип ответа для команд, которые отвечают не 'success'
+RESPONSE_TYPES = {
+    'resume': 'resume',
+    'list_rooms': 'rooms_list',
+    'leaderboard': 'leaderboard',
+    'player_stats': 'player_stats',
+    'tournament_standings': 'tournament_standings',
+    'latency': 'latency',
+}
+
+
+def apply_room_delta(state, delta):
+    # дельта из лога событий комнаты поверх последнего снимка room_state
+    event = delta.get('event')
+    players = state.setdefault('players', [])
+    scores = state.setdefault('scores', {})
+
+    if event == 'player_joined':
+        if delta['player'] not in players:
+            players.append(delta['player'])
+    elif event == 'player_left':
+        if delta['player'] in players:
+            players.remove(delta['player'])
+        if delta['player'] in state.get('reserved', ()):
+            state['reserved'].remove(delta['player'])
+    elif event == 'seat_reserved':
+        if delta['player'] in players:
+            players.remove(delta['player'])
+        state.setdefault('reserved', []).append(delta['player'])
+    elif event == 'seat_reclaimed':
+        if delta['player'] in state.get('reserved', ()):
+            state['reserved'].remove(delta['player'])
+        players.append(delta['player'])
+    elif event in ('game_started', 'city_played'):
+        state.setdefault('used_cities', []).append(delta['city'])
+        state['used_count'] = len(state['used_cities'])
+        state['last_letter'] = delta['last_letter']
+        state['game_started'] = True
+        if delta['player']:
+            scores[delta['player']] = scores.get(delta['player'], 0) + 1
+    elif event == 'game_over':
+        state['game_started'] = False
+        state['scores'] = delta['scores']
+    elif event == 'reset':
+        state['used_cities'] = []
+        state['used_count'] = 0
+        state['last_letter'] = None
+        state['game_started'] = False
+        state['scores'] = {}
+
+    if 'current_player' in delta:
+        state['current_player'] = delta['current_player']
+    state['version'] = delta['version']
+
+
+class ServerError(Exception):
+    pass
+
+
+class AsyncCitiesClient:
+    """Одно подключение к серверу.
+
+    Состояние держится минимальным, чтобы тысячи клиентов помещались в
+    одном процессе: обработчики и их словарь создаются только при первой
+    подписке.
+    """
+
+    __slots__ = ('host', 'port', 'player_name', 'reader', 'writer', 'session_token',
+                 'room_name', 'room_state', 'pending', 'handlers', 'reader_task', 'closed',
+                 'compression', 'dictionary_id', 'decoder')
+
+    def __init__(self, player_name, host='localhost', port=8888, compression=False):
+        self.host = host
+        self.port = port
+        self.player_name = player_name
+        self.compression = compression     # просить сервер сжимать большие кадры
+        self.dictionary_id = None
+        self.decoder = None
+        self.reader = None
+        self.writer = None
+        self.session_token = None
+        self.room_name = None
+        self.room_state = None
+        self.pending = deque()      # (future, ожидаемый тип ответа)
+        self.handlers = None        # тип сообщения -> [callback(message)], '*' - все сообщения
+        self.reader_task = None
+        self.closed = False
+
+    def on(self, message_type, callback):
+        if self.handlers is None:
+            self.handlers = {}
+        self.handlers.setdefault(message_type, []).append(callback)
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit=READ_LIMIT)
+        self.closed = False
+        self.reader_task = asyncio.ensure_future(self._read_loop())
+
+    async def close(self):
+        self.closed = True
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        if self.reader_task:
+            await asyncio.gather(self.reader_task, return_exceptions=True)
+
+    async def command(self, command, **fields):
+        """Отправляет команду и ждет ответа; ошибка сервера поднимается как ServerError"""
+        fields.setdefault('player_name', self.player_name)
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((future, RESPONSE_TYPES.get(command, 'success')))
+        self.writer.write((json.dumps({'type': 'command', 'command': command, **fields}) + '\n').encode('utf-8'))
+
+        response = await future
+        if response['type'] == 'error':
+            raise ServerError(response.get('message', ''))
+        return response
+
+    async def _read_loop(self):
+        try:
+            while True:
+                # сжатый кадр начинается с байта-маркера, строка JSON - с '{'
+                first = await self.reader.read(1)
+                if not first:
+                    break
+                if first in (STREAM_CONTINUE, STREAM_START):
+                    header = first + await self.reader.readexactly(FRAME_HEADER.size - 1)
+                    _, length = FRAME_HEADER.unpack(header)
+                    payload = await self.reader.readexactly(length)
+                    if self.decoder is None:
+                        continue
+                    lines = self.decoder.decode(first, payload).splitlines()
+                else:
+                    lines = [first + await self.reader.readline()]
+
+                for line in lines:
+                    try:
+                        message = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._dispatch(message)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError):
+            pass
+        except (ValueError, asyncio.LimitOverrunError) as e:
+            # строка длиннее READ_LIMIT: дальше поток не разобрать, соединение считается закрытым
+            print(f"❌ Слишком большой кадр от сервера: {e}")
+        finally:
+            while self.pending:
+                future, _ = self.pending.popleft()
+                if not future.done():
+                    future.set_exception(ConnectionError("Соединение с сервером закрыто"))
+            if not self.closed:
+                self._emit({'type': 'disconnected'})
+
+    def _dispatch(self, message):
+        message_type = message.get('type')
+        if message_type == 'room_state':
+            self.room_state = message
+            self.room_name = message.get('room_name')
+        elif message_type == 'match_found':
+            self.room_name = message.get('room_name')
+        elif message_type in ('success', 'resume'):
+            if 'session_token' in message:
+                self.session_token = message['session_token']
+            if 'room_name' in message:
+                self.room_name = message['room_name']
+            if message.get('deltas') and self.room_state:
+                for delta in message['deltas']:
+                    apply_room_delta(self.room_state, delta)
+            if 'compression' in message:
+                # здесь, а не после await: следующий кадр может быть уже сжат
+                self._start_decoder(message['compression'], message.get('dictionary'))
+
+        # ответом считается первое сообщение нужного типа, ошибка или переход на другой узел
+        if self.pending and message_type in ('error', 'redirect', self.pending[0][1]):
+            future, _ = self.pending.popleft()
+            if not future.done():
+                future.set_result(message)
+
+        self._emit(message)
+
+    def _start_decoder(self, dictionary_id, packed):
+        zdict = DICTIONARIES.get(dictionary_id)
+        if zdict is None:
+            zdict = DICTIONARIES[dictionary_id] = unpack_dictionary(packed)
+        self.dictionary_id = dictionary_id
+        self.decoder = StreamDecompressor(zdict)
+
+    def _compression_fields(self):
+        if not self.compression:
+            return {}
+        # id словаря, если он уже получен этим или другим клиентом процесса
+        dictionary_id = self.dictionary_id or next(iter(DICTIONARIES), None)
+        return {'compression': COMPRESSION, 'dictionary': dictionary_id}
+
+    def _emit(self, message):
+        if self.handlers is None:
+            return
+        for callback in self.handlers.get(message.get('type'), []) + self.handlers.get('*', []):
+            try:
+                callback(message)
+            except Exception as e:
+                print(f"Ошибка обработчика {message.get('type')}: {e}")
+
+    # состояние комнаты
+
+    @property
+    def my_turn(self):
+        state = self.room_state
+        return bool(state and state.get('game_started') and state.get('current_player') == self.player_name)
+
+    @property
+    def last_letter(self):
+        return self.room_state.get('last_letter') if self.room_state else None
+
+    # команды протокола
+
+    async def join(self, redirect_token=None):
+        fields = self._compression_fields()
+        if redirect_token:
+            fields['redirect_token'] = redirect_token
+        return await self.command('join', **fields)
+
+    async def resume(self):
+        version = self.room_state.get('version') if self.room_state else None
+        return await self.command('resume', session_token=self.session_token,
+                                  room_name=self.room_name, version=version, **self._compression_fields())
+
+    async def reconnect(self):
+        # декодер остается: снимок после resume может прийти сжатым раньше ответа
+        await self.close()
+        await self.connect()
+        return await self.resume()
+
+    async def join_room(self, room_name):
+        response = await self.command('join_room', room_name=room_name)
+        if response['type'] == 'redirect':
+            return await self.follow_redirect(response)
+        return response
+
+    async def follow_redirect(self, redirect):
+        # комната на другом узле федерации: переподключаемся туда с выданным токеном
+        await self.close()
+        self.host, self.port = redirect['host'], redirect['port']
+        self.session_token = None
+        self.room_state = None
+        self.decoder = None
+        await self.connect()
+        return await self.join(redirect['redirect_token'])
+
+    async def create_room(self, room_name, dictionary=None, rules=None, skip_letters=None, min_length=None,
+                          capacity=None):
+        return await self.command('create_room', room_name=room_name, dictionary=dictionary, rules=rules,
+                                  skip_letters=skip_letters, min_length=min_length, capacity=capacity)
+
+    async def spectate(self, room_name):
+        return await self.command('spectate', room_name=room_name)
+
+    async def list_rooms(self):
+        return (await self.command('list_rooms'))['rooms']
+
+    async def start(self, city):
+        return await self.command('start', city=city)
+
+    async def add_city(self, city):
+        return await self.command('add_city', city=city)
+
+    async def reset(self):
+        return await self.command('reset')
+
+    async def leave(self):
+        response = await self.command('leave')
+        self.session_token = None
+        self.room_state = None
+        return response
+
+    async def chat(self, text):
+        return await self.command('chat', message=text)
+
+    async def queue(self, skill=None):
+        return await self.command('queue', skill=skill)
+
+    async def leave_queue(self):
+        return await self.command('leave_queue')
+
+    async def tournament_start(self, name, players, system='swiss', rounds=3, duration=120, admin_token=None):
+        return await self.command('tournament_start', tournament=name, players=players,
+                                  system=system, rounds=rounds, duration=duration, admin_token=admin_token)
+
+    async def tournament_standings(self, name):
+        return await self.command('tournament_standings', tournament=name)
+
+    async def leaderboard(self, limit=10):
+        return (await self.command('leaderboard', limit=limit))['players']
+
+    async def player_stats(self, target=None):
+        return await self.command('player_stats', target=target)
+
+    async def add_bot(self, difficulty='medium'):
+        return await self.command('add_bot', difficulty=difficulty)
+
+    async def latency(self, room_name=None):
+        return await self.command('latency', room_name=room_name)
+
+
+# терминальный клиент
+
+def format_message(message, player_name):
+    message_type = message.get('type')
+    if message_type == 'room_state':
+        players = ', '.join(f"{p}{' *' if p == message.get('current_player') else ''}"
+                            f" ({message.get('scores', {}).get(p, 0)})" for p in message.get('players', []))
+        line = f"🏠 {message.get('room_name')}: {players}"
+        if message.get('reserved'):
+            line += f" ⏳ {', '.join(message['reserved'])}"
+        if message.get('game_started'):
+            cities = message.get('used_cities', [])
+            line += f"\n   последний город: {cities[-1] if cities else '-'}, буква: {(message.get('last_letter') or '').upper()}"
+            if message.get('current_player') == player_name:
+                line += " — ваш ход!"
+        return line
+    if message_type == 'chat_message':
+        return f"[{message.get('timestamp', '')}] {message.get('sender')}: {message.get('message')}"
+    if message_type in ('success', 'error'):
+        line = f"{'✅' if message_type == 'success' else '❌'} {message.get('message', '')}"
+        if message.get('trace_id'):
+            line += f" [трасса {message['trace_id']}]"
+        return line
+    if message_type == 'rooms_list':
+        return '\n'.join(f"  {room['name']} ({room['players']}{'/' + str(room['capacity']) if room.get('capacity') else ''}"
+                         f" игроков){' 🎮' if room['game_started'] else ''}"
+                         + (f" [{room['dictionary']}]" if room.get('dictionary', 'ru/classic') != 'ru/classic' else '')
+                         + (f" @{room['node']}" if room.get('node') else '')
+                         for room in message.get('rooms', []))
+    if message_type == 'redirect':
+        return f"🌐 Комната {message.get('room_name')} на узле {message.get('node')}, переходим..."
+    if message_type == 'leaderboard':
+        return '\n'.join(f"  {i}. {row['player']}: {row['cities']} городов, побед {row['wins']}"
+                         for i, row in enumerate(message.get('players', []), 1))
+    if message_type == 'latency':
+        lines = [f"  {name}: p50 {row['p50_ms']} мс, p95 {row['p95_ms']} мс, p99 {row['p99_ms']} мс, "
+                 f"до {row['slo_ms']} мс {row['within_slo'] * 100:.1f}% из {row['count']}"
+                 for name, row in message.get('rooms', {}).items()]
+        lines += [f"  🐢 {entry['at']} {entry['command']} ({entry['room']}) {entry['total_ms']} мс: "
+                  + ', '.join(f"{stage} {ms}" for stage, ms in entry.get('spans', []))
+                  for entry in message.get('slow', [])]
+        return '\n'.join(lines) or "  ходов за последнюю минуту не было"
+    if message_type == 'game_over':
+        return f"🏆 Игра окончена: {message.get('scores')}"
+    if message_type == 'match_found':
+        return f"🎲 Соперники найдены: {message.get('room_name')}"
+    if message_type == 'disconnected':
+        return "❌ Соединение потеряно, /reconnect для восстановления"
+    return json.dumps(message, ensure_ascii=False)
+
+
+HELP = """Команды:
+  <город>            сделать ход (или начать игру, если она не идет)
+  /rooms             список комнат
+  /join <комната>    войти в комнату
+  /create <комната> [словарь] [правила]
+                     создать комнату (словари ru, en, latin; правила classic, strict, long)
+  /queue             автоподбор соперников
+  /bot [сложность]   добавить бота (easy, medium, hard)
+  /say <текст>       сообщение в чат
+  /reset             новая игра
+  /top               таблица лидеров
+  /latency           задержки ходов в комнате и медленные команды
+  /reconnect         восстановить сессию
+  /quit              выйти"""
+
+
+async def run_terminal(host, port, name, compression=False):
+    client = AsyncCitiesClient(name, host, port, compression)
+    client.on('*', lambda message: print(format_message(message, name)))
+    await client.connect()
+    try:
+        await client.join()
+    except ServerError:
+        return
+
+    print(HELP)
+    loop = asyncio.get_running_loop()
+    while True:
+        line = (await loop.run_in_executor(None, sys.stdin.readline))
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+
+        command, _, argument = line.partition(' ')
+        try:
+            if command == '/quit':
+                await client.leave()
+                break
+            elif command == '/rooms':
+                await client.list_rooms()
+            elif command == '/join':
+                await client.join_room(argument)
+            elif command == '/create':
+                room_name, *options = argument.split() or ['']
+                await client.create_room(room_name, *options[:2])
+            elif command == '/queue':
+                await client.queue()
+            elif command == '/bot':
+                await client.add_bot(argument or 'medium')
+            elif command == '/say':
+                await client.chat(argument)
+            elif command == '/reset':
+                await client.reset()
+            elif command == '/top':
+                await client.leaderboard()
+            elif command == '/latency':
+                await client.latency(argument or client.room_name)
+            elif command == '/reconnect':
+                await client.reconnect()
+            elif command.startswith('/'):
+                print(HELP)
+            elif client.room_state and client.room_state.get('game_started'):
+                await client.add_city(line)
+            else:
+                await client.start(line)
+        except ServerError:
+            pass    # текст ошибки уже напечатан обработчиком
+        except ConnectionError as e:
+            print(f"❌ {e}")
+    await client.close()
+
+
+# нагрузка: тысячи клиентов в одном цикле событий
+
+async def run_swarm(host, port, clients, moves, connect_rate=500, seed=None, compression=False,
+                    cities=RUSSIAN_CITIES):
+    # cities - словарь комнат подбора на сервере, по классическим правилам
+    rng = random.Random(seed)
+    dictionary = CityDictionary(cities)
+    by_letter = {letter: dictionary.cities_on(letter) for letter in dictionary.by_letter}
+
+    swarm = [AsyncCitiesClient(f"Нагрузка {i}", host, port, compression) for i in range(clients)]
+    stats = {'connected': 0, 'rejected': 0, 'moves': 0, 'errors': 0}
+    latencies = []
+
+    async def play(client):
+        try:
+            await client.connect()
+            await client.join()
+            stats['connected'] += 1
+        except (ServerError, ConnectionError, OSError):
+            stats['rejected'] += 1
+            return
+
+        await client.queue()
+        # состояние комнаты опрашивается, а не ждется по событию, чтобы не держать
+        # на каждого клиента лишние объекты
+        made = 0
+        deadline = time.monotonic() + 30 + moves * 2
+        while made < moves and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            state = client.room_state
+            if not state or state.get('room_name') == 'Основная':
+                continue
+            if not state.get('game_started'):
+                if state.get('players') and state['players'][0] == client.player_name and len(state['players']) > 1:
+                    city = rng.choice(cities)
+                else:
+                    continue
+            elif client.my_turn:
+                used = set(state.get('used_cities', []))
+                options = [city for city in by_letter.get(client.last_letter, ()) if city not in used]
+                if not options:
+                    break
+                city = rng.choice(options)
+            else:
+                continue
+
+            started = time.perf_counter()
+            try:
+                await (client.add_city(city) if state.get('game_started') else client.start(city))
+                stats['moves'] += 1
+                made += 1
+            except ServerError:
+                stats['errors'] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    tasks = []
+    for i, client in enumerate(swarm):
+        tasks.append(asyncio.ensure_future(play(client)))
+        if connect_rate and (i + 1) % connect_rate == 0:
+            await asyncio.sleep(1)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*(client.close() for client in swarm))
+
+    latencies.sort()
+    print(f"🧪 Клиентов: {clients}, подключено: {stats['connected']}, отказано: {stats['rejected']}")
+    print(f"  ходов: {stats['moves']}, ошибок: {stats['errors']}, за {elapsed:.1f} с")
+    if latencies:
+        print(f"  задержка хода: p50 {latencies[len(latencies) // 2] * 1000:.1f} мс, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Клиент игры в города без графического интерфейса")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--name', help="имя игрока для терминального клиента")
+    parser.add_argument('--swarm', type=int, default=0, help="запустить столько клиентов для нагрузки")
+    parser.add_argument('--moves', type=int, default=10, help="ходов на клиента в режиме нагрузки")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--compress', action='store_true', help="просить сервер сжимать большие кадры")
+    args = parser.parse_args()
+
+    if args.swarm:
+        asyncio.run(run_swarm(args.host, args.port, args.swarm, args.moves, seed=args.seed,
+                              compression=args.compress))
+    elif args.name:
+        try:
+            asyncio.run(run_terminal(args.host, args.port, args.name, args.compress))
+        except KeyboardInterrupt:
+            pass
+    else:
+        parser.error("укажите --name для игры или --swarm для нагрузки")
+
+
+if __name__ == "__main__":
+    main()
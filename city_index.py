@@ -0,0 +1,121 @@
+from array import array
+from collections import defaultdict
+
+
+INVALID_LAST_LETTERS = frozenset({'ь', 'ъ', 'ы'})  # буквы, на которые нет городов
+
+
+def valid_last_letter(city, skip_letters=INVALID_LAST_LETTERS):
+    # последняя буква, с которой должен начаться следующий город; пробелы, дефисы и skip_letters пропускаются
+    city_lower = city.lower()
+    for letter in reversed(city_lower):
+        if letter.isalpha() and letter not in skip_letters:
+            return letter
+    return city_lower[-1]
+
+
+class RuleProfile:
+    """Правила комнаты, которые влияют на словарь: пропускаемые последние буквы и длина названия"""
+
+    __slots__ = ('name', 'skip_letters', 'min_length')
+
+    def __init__(self, name, skip_letters=INVALID_LAST_LETTERS, min_length=1):
+        self.name = name
+        self.skip_letters = frozenset(skip_letters)
+        self.min_length = min_length
+
+    @property
+    def key(self):
+        return ''.join(sorted(self.skip_letters)), self.min_length
+
+    def allows(self, city):
+        return sum(1 for letter in city if letter.isalpha()) >= self.min_length
+
+
+CLASSIC_RULES = RuleProfile('classic')
+
+
+class CityDictionary:
+    """Словарь городов, общий для всех комнат с тем же списком и правилами"""
+
+    def __init__(self, cities, rules=CLASSIC_RULES, name='ru'):
+        self.name = name
+        self.rules = rules
+        self.names = []
+        self.ids = {}
+        self.first_letters = []
+        self.last_letters = []
+        by_letter = defaultdict(list)
+
+        for city in cities:
+            city_lower = city.lower()
+            if city_lower in self.ids or not rules.allows(city):
+                continue
+
+            city_id = len(self.names)
+            self.ids[city_lower] = city_id
+            self.names.append(city)
+            self.first_letters.append(city_lower[0])
+            self.last_letters.append(valid_last_letter(city, rules.skip_letters))
+            by_letter[city_lower[0]].append(city_id)
+
+        self.by_letter = {letter: tuple(ids) for letter, ids in by_letter.items()}
+
+        # целочисленное кодирование букв, чтобы в симуляции не было операций со строками
+        self.letters = sorted(set(self.first_letters) | set(self.last_letters))
+        self.letter_ids = {letter: i for i, letter in enumerate(self.letters)}
+        self.first_letter_ids = array('B', (self.letter_ids[l] for l in self.first_letters))
+        self.last_letter_ids = array('B', (self.letter_ids[l] for l in self.last_letters))
+        self.ids_by_letter = tuple(self.by_letter.get(letter, ()) for letter in self.letters)
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, city):
+        return self.ids.get(city.lower())
+
+    # буквы записей считаются один раз при сборке словаря, здесь только чтение таблиц
+
+    def cities_on(self, letter):
+        return [self.names[city_id] for city_id in self.by_letter.get(letter, ())]
+
+    def describe(self):
+        # для списка комнат и снимка: "словарь/правила"
+        return f"{self.name}/{self.rules.name}"
+
+
+class AvailabilityIndex:
+    """Оставшиеся в комнате города, сгруппированные по первой букве.
+
+    Обновляется на каждом ходе, поэтому ботам не нужно перебирать весь словарь.
+    """
+
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+        self.remaining = {}
+        self.reset()
+
+    def reset(self):
+        self.remaining = {letter: set(ids) for letter, ids in self.dictionary.by_letter.items()}
+
+    def use(self, city_id):
+        bucket = self.remaining.get(self.dictionary.first_letters[city_id])
+        if bucket is not None:
+            bucket.discard(city_id)
+
+    def is_available(self, city_id):
+        return city_id in self.remaining.get(self.dictionary.first_letters[city_id], ())
+
+    def count(self, letter):
+        return len(self.remaining.get(letter, ()))
+
+    def candidates(self, letter):
+        return self.remaining.get(letter, ())
+
+    def count_after(self, city_id):
+        # сколько городов останется сопернику, если сыграть city_id
+        last_letter = self.dictionary.last_letters[city_id]
+        left = self.count(last_letter)
+        if self.dictionary.first_letters[city_id] == last_letter:
+            left -= 1
+        return left
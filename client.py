@@ -1,3 +1,8 @@
+import time
+
+STARTED = time.perf_counter()   # отсчет для замера запуска, до импорта Qt
+
+import argparse
 import threading
 import sys
 import socket
@@ -11,6 +16,167 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QListWidget, QLabel, QMessageBox, QGroupBox,
                              QProgressBar)
 
+from cities_client import apply_room_delta
+
+STARTUP_BUDGET_MS = 300     # бюджет до первого кадра, в котором можно ввести имя
+
+
+# все стили окна в одном месте: Qt разбирает таблицу один раз при установке на
+# приложение, а состояния виджетов переключаются динамическими свойствами
+APP_STYLESHEET = """
+    QMainWindow {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:1, stop:0 #8B5FBF, stop:1 #6A1B9A);
+    }
+    QGroupBox {
+        background: rgba(255, 255, 255, 220);
+        border: 2px solid #7B1FA2;
+        border-radius: 12px;
+        margin-top: 12px;
+        padding-top: 12px;
+        font-weight: bold;
+        color: #4A148C;
+    }
+    QGroupBox::title {
+        subcontrol-origin: margin;
+        left: 12px;
+        padding: 6px 12px;
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #7B1FA2, stop:1 #4A148C);
+        color: white;
+        border-radius: 8px;
+        font-weight: bold;
+    }
+    QLineEdit {
+        padding: 10px;
+        border: 2px solid #BA68C8;
+        border-radius: 10px;
+        background: white;
+        color: #4A148C;
+        font-size: 12px;
+        font-weight: bold;
+    }
+    QPushButton {
+        background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #AB47BC, stop:1 #8E24AA);
+        color: white;
+        border: none;
+        padding: 10px 18px;
+        border-radius: 10px;
+        font-weight: bold;
+        font-size: 12px;
+    }
+    QPushButton:hover {
+        background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #8E24AA, stop:1 #6A1B9A);
+    }
+    QPushButton:disabled {
+        background: #9E9E9E;
+        color: #757575;
+    }
+    QListWidget {
+        background: rgba(255, 255, 255, 220);
+        border: 2px solid #BA68C8;
+        border-radius: 8px;
+        color: #4A148C;
+        font-weight: bold;
+        font-size: 11px;
+    }
+    QTextEdit {
+        background: rgba(255, 255, 255, 220);
+        border: 2px solid #BA68C8;
+        border-radius: 8px;
+        color: #4A148C;
+        font-weight: bold;
+        font-size: 11px;
+    }
+    QProgressBar {
+        border: 2px solid #7B1FA2;
+        border-radius: 8px;
+        text-align: center;
+        color: white;
+        font-weight: bold;
+        background: white;
+        height: 20px;
+    }
+    QProgressBar::chunk {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #AB47BC, stop:1 #8E24AA);
+        border-radius: 6px;
+    }
+    QLabel {
+        color: #4A148C;
+        font-weight: bold;
+    }
+    QLabel#title {
+        font-size: 26px;
+        color: white;
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #AB47BC, stop:1 #7B1FA2);
+        padding: 18px;
+        border-radius: 18px;
+        border: 3px solid #4A148C;
+    }
+    QLabel#gameTimer {
+        font-size: 18px;
+        color: #7B1FA2;
+    }
+    QLabel#gameTimer[warning="true"] {
+        color: #D32F2F;
+    }
+    QLabel#results {
+        background: rgba(255, 255, 255, 200);
+        padding: 12px;
+        border-radius: 10px;
+        font-size: 12px;
+        color: #4A148C;
+        border: 2px solid #BA68C8;
+    }
+    QLabel#gameState {
+        background: rgba(255, 255, 255, 200);
+        padding: 18px;
+        border-radius: 12px;
+        font-size: 13px;
+        color: #4A148C;
+        border: 2px solid #BA68C8;
+    }
+    QLabel#gameState[mood="turn"], QLabel#gameState[mood="win"] {
+        background: #E8F5E8;
+        color: #2E7D32;
+        border: 2px solid #4CAF50;
+    }
+    QLabel#gameState[mood="wait"], QLabel#gameState[mood="lose"] {
+        background: #FFF8E1;
+        color: #FF8F00;
+        border: 2px solid #FFB300;
+    }
+    QLabel#gameState[mood="win"], QLabel#gameState[mood="lose"] {
+        font-size: 14px;
+        border-width: 3px;
+    }
+    QLabel#letter {
+        font-size: 52px;
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #AB47BC, stop:1 #7B1FA2);
+        border-radius: 60px;
+        padding: 25px;
+        border: 4px solid #4A148C;
+        color: white;
+    }
+    QLabel#currentRoom {
+        color: #7B1FA2;
+        font-size: 12px;
+    }
+    QLabel#status {
+        color: #D32F2F;
+    }
+    QLabel#status[online="true"] {
+        color: #388E3C;
+    }
+    QLabel#clock {
+        color: #7B1FA2;
+    }
+"""
+
+
+def set_style_state(widget, name, value):
+    # смена динамического свойства требует повторной полировки стиля
+    widget.setProperty(name, value)
+    widget.style().unpolish(widget)
+    widget.style().polish(widget)
 
 
 class GameProtocol:
@@ -30,6 +196,7 @@ class GameProtocol:
 
 class NetworkClient(QObject):
     connected = pyqtSignal()
+    connection_failed = pyqtSignal()
     disconnected = pyqtSignal()
     message_received = pyqtSignal(dict)
 
@@ -56,6 +223,18 @@ class NetworkClient(QObject):
             print(f"Ошибка подключения: {e}")
             return False
 
+    def connect_async(self, host='localhost', port=8888):
+        # подключение в фоне, результат приходит сигналом connected или connection_failed
+        def run():
+            # прежний поток приема должен выйти до того, как появится новый сокет
+            previous = self.receive_thread
+            if previous and previous is not threading.current_thread():
+                previous.join()
+            if not self.connect_to_server(host, port):
+                self.connection_failed.emit()
+
+        threading.Thread(target=run, daemon=True).start()
+
     def send_message(self, message):
         if self.connected_flag and self.socket:
             try:
@@ -110,7 +289,6 @@ class CitiesClient(QMainWindow):
         self.player_name = ""
         self.current_room = ""
         self.joined = False
-        self.network_client = NetworkClient()
 
         # таймер
         self.game_timer = QTimer()
@@ -120,98 +298,40 @@ class CitiesClient(QMainWindow):
         # очки игроков
         self.player_scores = {}
 
+        # сессия для переподключения и последнее известное состояние комнаты
+        self.session_token = None
+        self.room_state = None
+
+        # переход в комнату другого узла федерации
+        self.redirect_token = None
+        self.redirecting = False
+
+        # второстепенные панели строятся после первого кадра или при первом обращении
+        self.panels = set()
+        self.controls_enabled = True    # панель комнат, построенная позже, получает это состояние
+        self.pending_chat = []
+        self.startup_marks = {}
+
+        # подключение идет параллельно с построением интерфейса: сигналы
+        # из фонового потока доставляются уже после выхода из __init__
+        self.network_client = NetworkClient()
+        self.network_client.connected.connect(self.on_connected)
+        self.network_client.connection_failed.connect(self.on_connection_failed)
+        self.network_client.disconnected.connect(self.on_disconnected)
+        self.network_client.message_received.connect(self.on_message_received)
+        self.connect_to_server()
+
         self.setup_ui()
         self.connect_signals()
+        self.mark_startup('window')
 
-        # запускаем подключение с задержкой
-        QTimer.singleShot(100, self.connect_to_server)
+    def mark_startup(self, stage):
+        self.startup_marks.setdefault(stage, (time.perf_counter() - STARTED) * 1000)
 
     def setup_ui(self):
         self.setWindowTitle("Города")
         self.setGeometry(100, 100, 1200, 800)
 
-        self.setStyleSheet("""
-            QMainWindow {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1, stop:0 #8B5FBF, stop:1 #6A1B9A);
-            }
-            QGroupBox {
-                background: rgba(255, 255, 255, 220);
-                border: 2px solid #7B1FA2;
-                border-radius: 12px;
-                margin-top: 12px;
-                padding-top: 12px;
-                font-weight: bold;
-                color: #4A148C;
-            }
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                left: 12px;
-                padding: 6px 12px;
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #7B1FA2, stop:1 #4A148C);
-                color: white;
-                border-radius: 8px;
-                font-weight: bold;
-            }
-            QLineEdit {
-                padding: 10px;
-                border: 2px solid #BA68C8;
-                border-radius: 10px;
-                background: white;
-                color: #4A148C;
-                font-size: 12px;
-                font-weight: bold;
-            }
-            QPushButton {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #AB47BC, stop:1 #8E24AA);
-                color: white;
-                border: none;
-                padding: 10px 18px;
-                border-radius: 10px;
-                font-weight: bold;
-                font-size: 12px;
-            }
-            QPushButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #8E24AA, stop:1 #6A1B9A);
-            }
-            QPushButton:disabled {
-                background: #9E9E9E;
-                color: #757575;
-            }
-            QListWidget {
-                background: rgba(255, 255, 255, 220);
-                border: 2px solid #BA68C8;
-                border-radius: 8px;
-                color: #4A148C;
-                font-weight: bold;
-                font-size: 11px;
-            }
-            QTextEdit {
-                background: rgba(255, 255, 255, 220);
-                border: 2px solid #BA68C8;
-                border-radius: 8px;
-                color: #4A148C;
-                font-weight: bold;
-                font-size: 11px;
-            }
-            QProgressBar {
-                border: 2px solid #7B1FA2;
-                border-radius: 8px;
-                text-align: center;
-                color: white;
-                font-weight: bold;
-                background: white;
-                height: 20px;
-            }
-            QProgressBar::chunk {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #AB47BC, stop:1 #8E24AA);
-                border-radius: 6px;
-            }
-            QLabel {
-                color: #4A148C;
-                font-weight: bold;
-            }
-        """)
-
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
 
@@ -224,16 +344,8 @@ class CitiesClient(QMainWindow):
 
         # заголовок
         title_label = QLabel("💜 ИГРА В ГОРОДА 💜")
+        title_label.setObjectName("title")
         title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        title_label.setStyleSheet("""
-            font-size: 26px; 
-            font-weight: bold; 
-            color: white; 
-            background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #AB47BC, stop:1 #7B1FA2);
-            padding: 18px;
-            border-radius: 18px;
-            border: 3px solid #4A148C;
-        """)
         left_panel.addWidget(title_label)
 
         # таймеры
@@ -243,7 +355,7 @@ class CitiesClient(QMainWindow):
         game_timer_layout = QHBoxLayout()
         game_timer_layout.addWidget(QLabel("🕐 Время игры:"))
         self.game_timer_label = QLabel("02:00")
-        self.game_timer_label.setStyleSheet("font-size: 18px; font-weight: bold; color: #7B1FA2;")
+        self.game_timer_label.setObjectName("gameTimer")
         game_timer_layout.addWidget(self.game_timer_label)
         game_timer_layout.addStretch()
 
@@ -257,51 +369,23 @@ class CitiesClient(QMainWindow):
         timers_group.setLayout(timers_layout)
         left_panel.addWidget(timers_group)
 
-        # результаты
-        results_group = QGroupBox("🏆 Текущие очки")
-        results_layout = QVBoxLayout()
-
-        self.results_label = QLabel("Ожидание начала игры...")
-        self.results_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.results_label.setStyleSheet("""
-            background: rgba(255, 255, 255, 200);
-            padding: 12px;
-            border-radius: 10px;
-            font-size: 12px;
-            color: #4A148C;
-            border: 2px solid #BA68C8;
-        """)
-        results_layout.addWidget(self.results_label)
-        results_group.setLayout(results_layout)
-        left_panel.addWidget(results_group)
+        # результаты (содержимое строится лениво)
+        self.results_group = QGroupBox("🏆 Текущие очки")
+        self.results_group.setLayout(QVBoxLayout())
+        left_panel.addWidget(self.results_group)
 
         # состояние игры
         state_group = QGroupBox("🎮 Игровое поле")
         state_layout = QVBoxLayout()
 
         self.game_state_label = QLabel("Добро пожаловать! Введите имя и присоединяйтесь к игре.")
+        self.game_state_label.setObjectName("gameState")
         self.game_state_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.game_state_label.setStyleSheet("""
-            background: rgba(255, 255, 255, 200);
-            padding: 18px;
-            border-radius: 12px;
-            font-size: 13px;
-            color: #4A148C;
-            border: 2px solid #BA68C8;
-        """)
         self.game_state_label.setMinimumHeight(120)
 
         self.letter_indicator = QLabel("🎯")
+        self.letter_indicator.setObjectName("letter")
         self.letter_indicator.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.letter_indicator.setStyleSheet("""
-            font-size: 52px;
-            font-weight: bold;
-            background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #AB47BC, stop:1 #7B1FA2);
-            border-radius: 60px;
-            padding: 25px;
-            border: 4px solid #4A148C;
-            color: white;
-        """)
         self.letter_indicator.setFixedSize(120, 120)
 
         letter_layout = QHBoxLayout()
@@ -374,9 +458,58 @@ class CitiesClient(QMainWindow):
         conn_group.setLayout(conn_layout)
         right_panel.addWidget(conn_group)
 
-        # комнаты
-        rooms_group = QGroupBox("🏯 Игровые комнаты")
-        rooms_layout = QVBoxLayout()
+        # комнаты (содержимое строится лениво)
+        self.rooms_group = QGroupBox("🏯 Игровые комнаты")
+        self.rooms_group.setLayout(QVBoxLayout())
+        right_panel.addWidget(self.rooms_group)
+
+        # игроки
+        players_group = QGroupBox("👥 Игроки в комнате")
+        players_layout = QVBoxLayout()
+
+        self.players_list = QListWidget()
+        players_layout.addWidget(self.players_list)
+        players_group.setLayout(players_layout)
+        right_panel.addWidget(players_group)
+
+        # чат (содержимое строится лениво)
+        self.chat_group = QGroupBox("💬 Игровой чат")
+        self.chat_group.setLayout(QVBoxLayout())
+        right_panel.addWidget(self.chat_group)
+
+        # статус
+        status_layout = QHBoxLayout()
+        self.status_label = QLabel("❌ Не подключено")
+        self.status_label.setObjectName("status")
+        self.time_label = QLabel("--:--:--")
+        self.time_label.setObjectName("clock")
+
+        status_layout.addWidget(self.status_label)
+        status_layout.addStretch()
+        status_layout.addWidget(self.time_label)
+        right_panel.addLayout(status_layout)
+
+        main_layout.addLayout(left_panel, 2)
+        main_layout.addLayout(right_panel, 1)
+
+    def ensure_panel(self, name):
+        if name not in self.panels:
+            self.panels.add(name)
+            getattr(self, f'build_{name}_panel')()
+
+    def build_deferred_panels(self):
+        for name in ('results', 'rooms', 'chat'):
+            self.ensure_panel(name)
+        self.mark_startup('panels')
+
+    def build_results_panel(self):
+        self.results_label = QLabel("Ожидание начала игры...")
+        self.results_label.setObjectName("results")
+        self.results_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.results_group.layout().addWidget(self.results_label)
+
+    def build_rooms_panel(self):
+        rooms_layout = self.rooms_group.layout()
 
         room_input_layout = QHBoxLayout()
         self.room_input = QLineEdit()
@@ -384,42 +517,36 @@ class CitiesClient(QMainWindow):
         self.create_room_btn = QPushButton("➕ Создать")
         self.join_room_btn = QPushButton("🚪 Войти")
         self.refresh_rooms_btn = QPushButton("🔄 Обновить")
+        self.queue_btn = QPushButton("🎲 Подбор")
 
         room_input_layout.addWidget(self.room_input)
         room_input_layout.addWidget(self.create_room_btn)
         room_input_layout.addWidget(self.join_room_btn)
         room_input_layout.addWidget(self.refresh_rooms_btn)
+        room_input_layout.addWidget(self.queue_btn)
 
         rooms_layout.addLayout(room_input_layout)
 
         self.rooms_list = QListWidget()
         rooms_layout.addWidget(self.rooms_list)
 
-        self.current_room_label = QLabel("Текущая комната: не выбрана")
-        self.current_room_label.setStyleSheet("color: #7B1FA2; font-weight: bold; font-size: 12px;")
+        self.current_room_label = QLabel(f"Текущая комната: {self.current_room or 'не выбрана'}")
+        self.current_room_label.setObjectName("currentRoom")
         rooms_layout.addWidget(self.current_room_label)
 
-        rooms_group.setLayout(rooms_layout)
-        right_panel.addWidget(rooms_group)
-
-        # игроки
-        players_group = QGroupBox("👥 Игроки в комнате")
-        players_layout = QVBoxLayout()
-
-        self.players_list = QListWidget()
-        players_layout.addWidget(self.players_list)
-        players_group.setLayout(players_layout)
-        right_panel.addWidget(players_group)
+        self.create_room_btn.clicked.connect(self.create_room)
+        self.join_room_btn.clicked.connect(self.join_room)
+        self.refresh_rooms_btn.clicked.connect(self.refresh_rooms)
+        self.queue_btn.clicked.connect(self.queue_for_match)
+        self.set_room_controls_enabled(self.controls_enabled)
 
-        # чат
-        chat_group = QGroupBox("💬 Игровой чат")
-        chat_layout = QVBoxLayout()
+    def build_chat_panel(self):
+        chat_layout = self.chat_group.layout()
 
         self.chat_display = QTextEdit()
         self.chat_display.setReadOnly(True)
         chat_layout.addWidget(self.chat_display)
 
-
         chat_input_layout = QHBoxLayout()
         self.chat_input = QLineEdit()
         self.chat_input.setPlaceholderText("💬 Введите сообщение...")
@@ -429,43 +556,29 @@ class CitiesClient(QMainWindow):
         chat_input_layout.addWidget(self.chat_send_btn)
         chat_layout.addLayout(chat_input_layout)
 
-        chat_group.setLayout(chat_layout)
-        right_panel.addWidget(chat_group)
-
-        # статус
-        status_layout = QHBoxLayout()
-        self.status_label = QLabel("❌ Не подключено")
-        self.status_label.setStyleSheet("color: #D32F2F; font-weight: bold;")
-        self.time_label = QLabel("--:--:--")
-        self.time_label.setStyleSheet("color: #7B1FA2; font-weight: bold;")
+        self.chat_send_btn.clicked.connect(self.send_chat_message)
+        self.chat_input.returnPressed.connect(self.send_chat_message)
 
-        status_layout.addWidget(self.status_label)
-        status_layout.addStretch()
-        status_layout.addWidget(self.time_label)
-        right_panel.addLayout(status_layout)
+        # сообщения, пришедшие до построения панели
+        for line in self.pending_chat:
+            self.chat_display.append(line)
+        self.pending_chat = []
 
-        main_layout.addLayout(left_panel, 2)
-        main_layout.addLayout(right_panel, 1)
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if 'first_frame' not in self.startup_marks:
+            self.mark_startup('first_frame')
+            QTimer.singleShot(0, self.build_deferred_panels)
 
     def connect_signals(self):
-        # подключение всех сигналов к слотам
-        self.network_client.connected.connect(self.on_connected)
-        self.network_client.disconnected.connect(self.on_disconnected)
-        self.network_client.message_received.connect(self.on_message_received)
-
+        # сигналы сети подключены в __init__, кнопки ленивых панелей - при их построении
         self.join_btn.clicked.connect(self.join_game)
         self.reconnect_btn.clicked.connect(self.reconnect)
         self.leave_btn.clicked.connect(self.leave_game)
-        self.create_room_btn.clicked.connect(self.create_room)
-        self.join_room_btn.clicked.connect(self.join_room)
-        self.refresh_rooms_btn.clicked.connect(self.refresh_rooms)
         self.submit_btn.clicked.connect(self.submit_city)
         self.start_btn.clicked.connect(self.start_game)
         self.reset_btn.clicked.connect(self.reset_game)
 
-        self.chat_send_btn.clicked.connect(self.send_chat_message)
-        self.chat_input.returnPressed.connect(self.send_chat_message)
-
         self.city_input.returnPressed.connect(self.submit_city)
         self.name_input.returnPressed.connect(self.join_game)
 
@@ -497,7 +610,7 @@ class CitiesClient(QMainWindow):
             self.game_timer_label.setText(f"{minutes:02d}:{seconds:02d}")
 
             if self.game_time_left <= 30:
-                self.game_timer_label.setStyleSheet("font-size: 18px; font-weight: bold; color: #D32F2F;")
+                set_style_state(self.game_timer_label, 'warning', True)
         else:
             self.end_game()
 
@@ -508,20 +621,43 @@ class CitiesClient(QMainWindow):
 
     def connect_to_server(self):
         self.add_chat_message("💜 СИСТЕМА", "Подключаемся к серверу...")
-        if not self.network_client.connect_to_server():
-            self.add_chat_message("❌ ОШИБКА", "Не удалось подключиться к серверу!")
-            self.status_label.setText("❌ Не подключено")
+        self.network_client.connect_async()
+
+    def on_connection_failed(self):
+        self.redirecting = False
+        self.add_chat_message("❌ ОШИБКА", "Не удалось подключиться к серверу!")
+        self.status_label.setText("❌ Не подключено")
 
     def on_connected(self):
+        self.mark_startup('connected')
         self.add_chat_message("💜 СИСТЕМА", "Успешно подключено к серверу!")
         self.status_label.setText("✅ Подключено")
-        self.status_label.setStyleSheet("color: #388E3C; font-weight: bold;")
-        self.refresh_rooms()
+        set_style_state(self.status_label, 'online', True)
+
+        if self.redirect_token:
+            message = GameProtocol.create_message('command',
+                                                  command='join',
+                                                  player_name=self.player_name,
+                                                  redirect_token=self.redirect_token)
+            self.redirect_token = None
+            self.network_client.send_message(message)
+        elif self.session_token:
+            version = self.room_state.get('version') if self.room_state else None
+            message = GameProtocol.create_message('command',
+                                                  command='resume',
+                                                  session_token=self.session_token,
+                                                  room_name=self.current_room,
+                                                  version=version)
+            self.network_client.send_message(message)
+        else:
+            self.refresh_rooms()
 
     def on_disconnected(self):
+        if self.redirecting:
+            return
         self.add_chat_message("❌ ОШИБКА", "Отключено от сервера!")
         self.status_label.setText("❌ Отключено")
-        self.status_label.setStyleSheet("color: #D32F2F; font-weight: bold;")
+        set_style_state(self.status_label, 'online', False)
         self.set_controls_enabled(False)
         self.joined = False
         self.stop_timers()
@@ -533,6 +669,7 @@ class CitiesClient(QMainWindow):
             msg = message.get('message', '')
             self.add_chat_message("✅ УСПЕХ", msg)
 
+            self.redirecting = False
             if not self.joined:
                 self.joined = True
                 self.name_input.setEnabled(False)
@@ -541,15 +678,56 @@ class CitiesClient(QMainWindow):
 
             if 'room_name' in message:
                 self.current_room = message['room_name']
-                self.current_room_label.setText(f"Текущая комната: {self.current_room}")
+                self.show_current_room()
+
+            if 'session_token' in message:
+                self.session_token = message['session_token']
+
+        elif msg_type == 'resume':
+            self.add_chat_message("💜 СИСТЕМА", "Сессия восстановлена")
+            self.joined = True
+            self.name_input.setEnabled(False)
+            self.join_btn.setEnabled(False)
+            self.set_controls_enabled(True)
+
+            self.current_room = message.get('room_name') or ""
+            self.show_current_room()
+
+            # снимок приходит отдельным room_state, дельты применяем к сохраненному состоянию
+            deltas = message.get('deltas')
+            if deltas and self.room_state:
+                for delta in deltas:
+                    apply_room_delta(self.room_state, delta)
+                self.update_room_state(self.room_state)
+            self.refresh_rooms()
+
+        elif msg_type == 'redirect':
+            self.follow_redirect(message)
 
         elif msg_type == 'error':
             msg = message.get('message', '')
             self.add_chat_message("❌ ОШИБКА", msg)
 
         elif msg_type == 'room_state':
+            self.room_state = message
             self.update_room_state(message)
 
+        elif msg_type == 'match_found':
+            self.current_room = message.get('room_name', '')
+            self.show_current_room()
+            self.add_chat_message("🎲 ПОДБОР", f"Соперники найдены! Комната: {self.current_room}")
+
+        elif msg_type == 'game_over':
+            self.player_scores = message.get('scores', {})
+            if self.game_active:
+                self.end_game()
+
+        elif msg_type == 'tournament_standings':
+            lines = [f"{i}. {row['player']}: {row['points']:g} ({row['cities']} городов)"
+                     for i, row in enumerate(message.get('standings', []), 1)]
+            status = "итоги" if message.get('finished') else f"после тура {message.get('round')}"
+            self.add_chat_message("🏆 ТУРНИР", f"{message.get('tournament')} — {status}:\n" + "\n".join(lines))
+
         elif msg_type == 'rooms_list':
             self.update_rooms_list(message.get('rooms', []))
 
@@ -559,12 +737,20 @@ class CitiesClient(QMainWindow):
             timestamp = message.get('timestamp', '')
 
             if timestamp:
-                self.chat_display.append(f"[{timestamp}] {sender}: {msg_text}")
+                self.append_chat(f"[{timestamp}] {sender}: {msg_text}")
             else:
-                self.chat_display.append(f"{sender}: {msg_text}")
-
-            scrollbar = self.chat_display.verticalScrollBar()
-            scrollbar.setValue(scrollbar.maximum())
+                self.append_chat(f"{sender}: {msg_text}")
+
+    def follow_redirect(self, message):
+        # комната на другом узле: старая сессия закрыта сервером, входим туда по токену
+        self.add_chat_message("🌐 ПЕРЕХОД", f"Комната {message.get('room_name')} на узле {message.get('node')}")
+        self.redirecting = True
+        self.redirect_token = message['redirect_token']
+        self.session_token = None
+        self.room_state = None
+        self.stop_timers()
+        self.network_client.disconnect()
+        self.network_client.connect_async(message['host'], message['port'])
 
     def join_game(self):
         name = self.name_input.text().strip()
@@ -590,6 +776,8 @@ class CitiesClient(QMainWindow):
                                                   player_name=self.player_name)
             self.network_client.send_message(message)
             self.joined = False
+            self.session_token = None
+            self.room_state = None
             self.set_controls_enabled(False)
             self.name_input.setEnabled(True)
             self.join_btn.setEnabled(True)
@@ -638,6 +826,16 @@ class CitiesClient(QMainWindow):
                                               player_name=self.player_name)
         self.network_client.send_message(message)
 
+    def queue_for_match(self):
+        if not self.joined:
+            QMessageBox.warning(self, "❌ Ошибка", "Сначала присоединитесь к игре!")
+            return
+
+        message = GameProtocol.create_message('command',
+                                              command='queue',
+                                              player_name=self.player_name)
+        self.network_client.send_message(message)
+
     def start_game(self):
         if not self.joined:
             QMessageBox.warning(self, "❌ Ошибка", "Сначала присоединитесь к игре!")
@@ -689,6 +887,7 @@ class CitiesClient(QMainWindow):
         self.game_progress.setValue(120)
         self.game_active = False
         self.player_scores.clear()
+        self.ensure_panel('results')
         self.results_label.setText("Ожидание начала игры...")
 
     def reconnect(self):
@@ -713,6 +912,8 @@ class CitiesClient(QMainWindow):
         self.chat_input.clear()
 
     def update_room_state(self, state):
+        self.ensure_panel('results')
+
         # Обновляем очки игроков
         scores = state.get('scores', {})
         if scores:
@@ -731,6 +932,9 @@ class CitiesClient(QMainWindow):
             if player == self.player_name:
                 item_text += " 👑 (вы)"
             self.players_list.addItem(item_text)
+        # отключившиеся: место за ними держится, пока они не вернутся
+        for player in state.get('reserved', []):
+            self.players_list.addItem(f"⏳ {player} - {self.player_scores.get(player, 0)} очков (отключился)")
 
         self.cities_list.clear()
         for city in state.get('used_cities', []):
@@ -762,71 +966,73 @@ class CitiesClient(QMainWindow):
 
             if current_player == self.player_name:
                 state_text += "✅ Ваш ход! Введите город."
-                self.game_state_label.setStyleSheet("""
-                    background: #E8F5E8;
-                    padding: 18px;
-                    border-radius: 12px;
-                    font-size: 13px;
-                    color: #2E7D32;
-                    border: 2px solid #4CAF50;
-                """)
+                set_style_state(self.game_state_label, 'mood', 'turn')
             else:
                 state_text += f"⏳ Ожидаем ход {current_player}"
-                self.game_state_label.setStyleSheet("""
-                    background: #FFF8E1;
-                    padding: 18px;
-                    border-radius: 12px;
-                    font-size: 13px;
-                    color: #FF8F00;
-                    border: 2px solid #FFB300;
-                """)
+                set_style_state(self.game_state_label, 'mood', 'wait')
         else:
             state_text = "Добро пожаловать! Начните игру, введя город."
-            self.game_state_label.setStyleSheet("""
-                background: rgba(255, 255, 255, 200);
-                padding: 18px;
-                border-radius: 12px;
-                font-size: 13px;
-                color: #4A148C;
-                border: 2px solid #BA68C8;
-            """)
+            set_style_state(self.game_state_label, 'mood', None)
             self.letter_indicator.setText("🎯")
 
         self.game_state_label.setText(state_text)
 
     def update_rooms_list(self, rooms):
+        self.ensure_panel('rooms')
         self.rooms_list.clear()
         for room in rooms:
-            room_text = f"🏠 {room['name']} ({room['players']} игроков)"
+            seats = f"{room['players']}/{room['capacity']}" if room.get('capacity') else room['players']
+            room_text = f"🏠 {room['name']} ({seats} игроков)"
             if room['game_started']:
                 room_text += " 🎮"
+            if room.get('dictionary', 'ru/classic') != 'ru/classic':
+                room_text += f" 📖 {room['dictionary']}"
+            if room.get('node'):
+                room_text += f" 🌐 {room['node']}"
             self.rooms_list.addItem(room_text)
 
     def add_chat_message(self, sender, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.chat_display.append(f"[{timestamp}] {sender}: {message}")
+        self.append_chat(f"[{timestamp}] {sender}: {message}")
+
+    def append_chat(self, line):
+        if 'chat' not in self.panels:
+            self.pending_chat.append(line)
+            return
 
+        self.chat_display.append(line)
         scrollbar = self.chat_display.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
 
+    def show_current_room(self):
+        if 'rooms' in self.panels:
+            self.current_room_label.setText(f"Текущая комната: {self.current_room or 'не выбрана'}")
+
     def update_time(self):
         current_time = datetime.now().strftime("%H:%M:%S")
         self.time_label.setText(current_time)
 
     def set_controls_enabled(self, enabled):
-        self.room_input.setEnabled(enabled)
-        self.create_room_btn.setEnabled(enabled)
-        self.join_room_btn.setEnabled(enabled)
-        self.refresh_rooms_btn.setEnabled(enabled)
+        self.controls_enabled = enabled
+        if 'rooms' in self.panels:
+            self.set_room_controls_enabled(enabled)
         self.city_input.setEnabled(enabled)
         self.submit_btn.setEnabled(enabled)
         self.start_btn.setEnabled(enabled)
         self.reset_btn.setEnabled(enabled)
         self.leave_btn.setEnabled(enabled)
 
+    def set_room_controls_enabled(self, enabled):
+        self.room_input.setEnabled(enabled)
+        self.create_room_btn.setEnabled(enabled)
+        self.join_room_btn.setEnabled(enabled)
+        self.refresh_rooms_btn.setEnabled(enabled)
+        self.queue_btn.setEnabled(enabled)
+
     def end_game(self):
         self.stop_timers()
         self.game_active = False
+        self.ensure_panel('results')
 
         # определение победителя
         if self.player_scores:
@@ -846,27 +1052,11 @@ class CitiesClient(QMainWindow):
             if winner == self.player_name:
                 congrats = f"🎉 ПОЗДРАВЛЯЕМ! ВЫ ПОБЕДИЛИ! 🎉\nСчет: {winner_score} очков"
                 self.game_state_label.setText(congrats)
-                self.game_state_label.setStyleSheet("""
-                    background: #E8F5E8;
-                    padding: 18px;
-                    border-radius: 12px;
-                    font-size: 14px;
-                    color: #2E7D32;
-                    border: 3px solid #4CAF50;
-                    font-weight: bold;
-                """)
+                set_style_state(self.game_state_label, 'mood', 'win')
             else:
                 congrats = f"🏆 Победитель: {winner}\nСчет: {winner_score} очков"
                 self.game_state_label.setText(congrats)
-                self.game_state_label.setStyleSheet("""
-                    background: #FFF8E1;
-                    padding: 18px;
-                    border-radius: 12px;
-                    font-size: 14px;
-                    color: #FF8F00;
-                    border: 3px solid #FFB300;
-                    font-weight: bold;
-                """)
+                set_style_state(self.game_state_label, 'mood', 'lose')
 
             self.add_chat_message("🏆 СИСТЕМА", f"Игра завершена! Победитель: {winner} с {winner_score} очками!")
 
@@ -888,15 +1078,41 @@ class CitiesClient(QMainWindow):
         event.accept()
 
 
+def report_startup(client, app):
+    marks = client.startup_marks
+    print("⏱️ Запуск клиента, мс от старта процесса:")
+    for stage in ('imports', 'window', 'first_frame', 'panels', 'connected'):
+        if stage in marks:
+            print(f"  {stage}: {marks[stage]:.0f}")
+
+    first_frame = marks.get('first_frame')
+    within_budget = first_frame is not None and first_frame <= STARTUP_BUDGET_MS
+    print(f"{'✅' if within_budget else '❌'} Первый кадр: "
+          f"{'нет' if first_frame is None else f'{first_frame:.0f} мс'}, бюджет {STARTUP_BUDGET_MS} мс")
+    app.exit(0 if within_budget else 1)
+
+
 def main():
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Клиент игры в города")
+    parser.add_argument('--startup-benchmark', action='store_true',
+                        help="замерить время до первого кадра и выйти")
+    args, qt_args = parser.parse_known_args()
+    imported = (time.perf_counter() - STARTED) * 1000
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    app.setStyleSheet(APP_STYLESHEET)
 
     font = QFont("Arial", 10)
     app.setFont(font)
 
     client = CitiesClient()
+    client.startup_marks['imports'] = imported
     client.show()
 
+    if args.startup_benchmark:
+        # отчет после первого кадра и ленивых панелей, подключение ждем не дольше секунды
+        QTimer.singleShot(1000, lambda: report_startup(client, app))
+
     sys.exit(app.exec())
 
 
@@ -0,0 +1,135 @@
+import json
+
+MAX_MESSAGE_SIZE = 8192     # байт в одной строке протокола
+# список игроков турнира: до 4096 имен, кириллица в JSON экранируется по 6 байт на букву
+TOURNAMENT_MESSAGE_SIZE = 1024 * 1024
+NAME_LENGTH = 32
+ROOM_NAME_LENGTH = 64
+
+STRING = (str,)
+INTEGER = (int,)
+NUMBER = (int, float)
+LIST = (list,)
+
+
+def error_message(text):
+    return json.dumps({'type': 'error', 'message': text}) + '\n'
+
+
+# частые ошибки кодируются один раз при загрузке модуля
+ERRORS = {
+    'format': error_message('Неверный формат сообщения'),
+    'unknown': error_message('Неизвестная команда'),
+    'too_large': error_message('Сообщение слишком большое'),
+    'rate_limited': error_message('Слишком много команд, подождите немного'),
+    'server_full': error_message('Сервер переполнен, попробуйте позже'),
+    'too_many_connections': error_message('Слишком много подключений с вашего адреса'),
+    'not_joined': error_message('Сначала присоединитесь к игре'),
+}
+
+
+class CommandSpec:
+    """Обработчик команды и схема ее полей.
+
+    Поле описывается кортежем (имя, типы, макс. длина, обязательное,
+    значение по умолчанию); значения передаются обработчику в том же
+    порядке, а с pass_socket последним аргументом идет сокет клиента.
+    max_size - предел длины строки команды, если ей мало MAX_MESSAGE_SIZE.
+    С as_player первым аргументом идет игрок, вошедший с этого подключения:
+    player_name из команды таким обработчикам не передается.
+    """
+
+    __slots__ = ('name', 'handler', 'fields', 'pass_socket', 'max_size', 'as_player', 'errors')
+
+    def __init__(self, name, handler, fields=(), pass_socket=False, max_size=MAX_MESSAGE_SIZE, as_player=False):
+        self.name = name
+        self.handler = handler
+        self.fields = tuple(fields)
+        self.pass_socket = pass_socket
+        self.max_size = max_size
+        self.as_player = as_player
+        self.errors = {field[0]: error_message(f"Неверное поле '{field[0]}'") for field in self.fields}
+
+    def parse_args(self, message):
+        # (аргументы, None) или (None, готовая ошибка)
+        args = []
+        for name, types, max_length, required, default in self.fields:
+            value = message.get(name)
+            if value is None:
+                if required:
+                    return None, self.errors[name]
+                args.append(default)
+                continue
+
+            # type(), а не isinstance: bool не должен проходить как int
+            if type(value) not in types or (max_length is not None and len(value) > max_length):
+                return None, self.errors[name]
+            args.append(value)
+        return args, None
+
+
+def _field(name, types, max_length=None, required=False, default=None):
+    return name, types, max_length, required, default
+
+
+PLAYER = _field('player_name', STRING, NAME_LENGTH, required=True)     # только для join: имя, под которым входят
+# сжатие кадров: способ и id словаря, который у клиента уже есть
+COMPRESSION = _field('compression', STRING, 16)
+DICTIONARY = _field('dictionary', STRING, 16)
+ROOM = _field('room_name', STRING, ROOM_NAME_LENGTH)
+CITY = _field('city', STRING, 64, required=True)
+
+COMMANDS = {spec.name: spec for spec in (
+    CommandSpec('join', 'handle_join', [
+        PLAYER,
+        _field('redirect_token', STRING, 1024),     # выдан другим узлом федерации
+        COMPRESSION,
+        DICTIONARY,
+    ], pass_socket=True),
+    CommandSpec('resume', 'handle_resume', [
+        _field('session_token', STRING, 64, required=True),
+        _field('version', INTEGER),
+        ROOM,
+        COMPRESSION,
+        DICTIONARY,
+    ], pass_socket=True),
+    CommandSpec('join_room', 'handle_join_room', [ROOM], as_player=True),
+    CommandSpec('create_room', 'handle_create_room', [
+        ROOM,
+        _field('dictionary', STRING, 32),       # 'ru', 'en', 'latin' или загруженный с диска
+        _field('rules', STRING, 16),            # 'classic', 'strict', 'long'
+        _field('skip_letters', STRING, 16),     # свои буквы, пропускаемые в конце названия
+        _field('min_length', INTEGER),
+        _field('capacity', INTEGER),            # мест в комнате, не больше ROOM_CAPACITY сервера
+    ], as_player=True),
+    CommandSpec('list_rooms', 'handle_list_rooms'),
+    CommandSpec('spectate', 'handle_spectate', [_field('room_name', STRING, ROOM_NAME_LENGTH, required=True)],
+                pass_socket=True),
+    CommandSpec('start', 'handle_start', [CITY], as_player=True),
+    CommandSpec('add_city', 'handle_add_city', [CITY], as_player=True),
+    CommandSpec('reset', 'handle_reset', as_player=True),
+    CommandSpec('leave', 'handle_leave', as_player=True),
+    CommandSpec('chat', 'handle_chat', [_field('message', STRING, 500, default='')], as_player=True),
+    CommandSpec('queue', 'handle_queue', [_field('skill', NUMBER)], as_player=True),
+    CommandSpec('leave_queue', 'handle_leave_queue', as_player=True),
+    CommandSpec('tournament_start', 'handle_tournament_start', [
+        _field('tournament', STRING, ROOM_NAME_LENGTH, required=True),
+        _field('players', LIST, 4096, required=True),
+        _field('system', STRING, 16, default='swiss'),
+        _field('rounds', INTEGER, default=3),
+        _field('duration', NUMBER, default=120),
+        _field('admin_token', STRING, 128),     # без него турнир начинает только его участник
+    ], pass_socket=True, max_size=TOURNAMENT_MESSAGE_SIZE),
+    CommandSpec('tournament_standings', 'handle_tournament_standings', [
+        _field('tournament', STRING, ROOM_NAME_LENGTH, required=True),
+    ]),
+    CommandSpec('leaderboard', 'handle_leaderboard', [_field('limit', INTEGER, default=10)]),
+    CommandSpec('player_stats', 'handle_player_stats', [
+        _field('target', STRING, NAME_LENGTH),     # без него - статистика игрока этого подключения
+    ], pass_socket=True),
+    CommandSpec('add_bot', 'handle_add_bot', [_field('difficulty', STRING, 16, default='medium')], as_player=True),
+    CommandSpec('latency', 'handle_latency', [ROOM]),     # без комнаты - все комнаты сервера
+)}
+
+# столько читатель копит до перевода строки; остальные команды проверяются по своему max_size
+MAX_LINE_SIZE = max(spec.max_size for spec in COMMANDS.values())
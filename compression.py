@@ -0,0 +1,206 @@
+"""Сжатие больших кадров протокола: поток deflate на подключение с общим словарем.
+
+Клиент просит сжатие в команде join (поле compression='deflate'), сервер
+отвечает id словаря и, если у клиента его нет, самим словарем. После этого
+кадры длиннее порога уходят как маркер (1 байт) + длина (4 байта) + данные
+deflate; короткие кадры идут обычной строкой JSON, оба вида чередуются.
+Все сжатые кадры подключения - один поток deflate, поэтому очередной снимок
+комнаты ссылается на предыдущий и занимает несколько десятков байт. Маркер
+STREAM_START говорит клиенту начать поток заново (первый кадр, новый
+процесс сервера после перезапуска).
+
+    python compression.py --bench --synthetic 200
+    python compression.py --bench replays/*.cgr
+"""
+import argparse
+import base64
+import glob
+import hashlib
+import json
+import struct
+import threading
+import time
+import zlib
+
+COMPRESSION = 'deflate'
+COMPRESS_THRESHOLD = 128    # байт; короче кадр идет как есть
+COMPRESS_LEVEL = 6
+STREAM_CONTINUE = b'\x00'
+STREAM_START = b'\x01'
+FRAME_HEADER = struct.Struct('>cI')
+# окно 4 КБ и memLevel 5: около 40 КБ памяти на подключение вместо 260 КБ по умолчанию
+WBITS = -12
+MEM_LEVEL = 5
+SYNC_TAIL = b'\x00\x00\xff\xff'     # конец каждого Z_SYNC_FLUSH, не передается (как в permessage-deflate)
+
+
+def build_dictionary(city_names, samples=()):
+    """Словарь из названий городов в том виде, как их пишет json.dumps, и образцов сообщений.
+
+    Поток видит только последние 4 КБ словаря, и deflate лучше находит
+    совпадения ближе к концу, поэтому образцы сообщений идут последними.
+    """
+    parts = [json.dumps(name) for name in city_names]
+    parts.extend(samples)
+    return ', '.join(parts).encode('utf-8')[-(1 << -WBITS):]
+
+
+def dictionary_id(zdict):
+    return hashlib.sha1(zdict).hexdigest()[:12]
+
+
+def pack_dictionary(zdict):
+    # для ответа на join: сам словарь тоже сжат
+    return base64.b64encode(zlib.compress(zdict, 9)).decode('ascii')
+
+
+def unpack_dictionary(text):
+    return zlib.decompress(base64.b64decode(text))
+
+
+class StreamCompressor:
+    """Сжатие исходящих кадров одного подключения.
+
+    Сжатие и отправка идут под одной блокировкой: кадры должны уйти в
+    сокет в том же порядке, в каком прошли через поток deflate.
+    """
+
+    __slots__ = ('zdict', 'threshold', 'level', 'compressor', 'lock', 'bytes_in', 'bytes_out')
+
+    def __init__(self, zdict, threshold=COMPRESS_THRESHOLD, level=COMPRESS_LEVEL):
+        self.zdict = zdict
+        self.threshold = threshold
+        self.level = level
+        self.compressor = None
+        self.lock = threading.Lock()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def encode(self, data):
+        if len(data) < self.threshold:
+            return data
+        marker = STREAM_CONTINUE
+        if self.compressor is None:
+            self.compressor = zlib.compressobj(self.level, zlib.DEFLATED, WBITS, MEM_LEVEL, zdict=self.zdict)
+            marker = STREAM_START
+        payload = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        payload = payload[:-len(SYNC_TAIL)]
+        self.bytes_in += len(data)
+        self.bytes_out += FRAME_HEADER.size + len(payload)
+        return FRAME_HEADER.pack(marker, len(payload)) + payload
+
+    def send(self, client_socket, data):
+        with self.lock:
+            # частично отправленный кадр сломал бы поток deflate у клиента
+            client_socket.sendall(self.encode(data))
+
+
+class StreamDecompressor:
+    __slots__ = ('zdict', 'decompressor')
+
+    def __init__(self, zdict):
+        self.zdict = zdict
+        self.decompressor = None
+
+    def decode(self, marker, payload):
+        if marker == STREAM_START or self.decompressor is None:
+            self.decompressor = zlib.decompressobj(WBITS, zdict=self.zdict)
+        return self.decompressor.decompress(payload + SYNC_TAIL)
+
+
+# замер: байты против процессора на записанных партиях
+
+def trace_frames(replays, chat_burst=20):
+    """Кадры, которые получил бы игрок: снимок после каждой команды и пачка чата на партию"""
+    from replay import replay_game
+    from server import GameProtocol
+
+    frames = []
+    for replay in replays:
+        replay_game(replay, on_step=lambda room: frames.append(room.get_snapshot()))
+        for i in range(chat_burst):
+            frames.append(GameProtocol.create_message('chat_message', sender=replay.names[i % len(replay.names)],
+                                                      message=f"Сообщение номер {i}, хороший ход!",
+                                                      timestamp="12:00:00").encode('utf-8'))
+    return frames
+
+
+def measure(frames, threshold, level, zdict, stream, wbits=WBITS, mem_level=MEM_LEVEL):
+    # (байт после сжатия, мкс сжатия на кадр, мкс распаковки на кадр)
+    options = {'zdict': zdict} if zdict else {}
+    total = 0
+    payloads = []
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits, mem_level, **options)
+
+    started = time.perf_counter()
+    for data in frames:
+        if len(data) < threshold:
+            total += len(data)
+            continue
+        if not stream:
+            # отдельный контекст на каждый кадр: словарь загружается каждый раз
+            compressor = zlib.compressobj(level, zlib.DEFLATED, wbits, mem_level, **options)
+        payload = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        total += FRAME_HEADER.size + len(payload) - len(SYNC_TAIL)
+        payloads.append(payload)
+    compress_time = time.perf_counter() - started
+
+    decompressor = zlib.decompressobj(wbits, **options)
+    started = time.perf_counter()
+    for payload in payloads:
+        if not stream:
+            decompressor = zlib.decompressobj(wbits, **options)
+        decompressor.decompress(payload)
+    decompress_time = time.perf_counter() - started
+
+    return total, compress_time * 1e6 / len(frames), decompress_time * 1e6 / len(frames)
+
+
+def run_benchmark(replays):
+    from server import CITIES, GameRoom
+
+    zdict = build_dictionary(CITIES, [GameRoom("Основная").get_snapshot().decode('utf-8')])
+    frames = trace_frames(replays)
+    raw = sum(len(frame) for frame in frames)
+    sizes = sorted(len(frame) for frame in frames)
+    print(f"📦 Партий: {len(replays)}, кадров: {len(frames)}, {raw / 1024:.0f} КБ без сжатия, "
+          f"медиана кадра {sizes[len(sizes) // 2]} Б, максимум {sizes[-1]} Б, словарь {len(zdict)} Б")
+
+    measure(frames, 0, COMPRESS_LEVEL, zdict, False)     # прогрев
+
+    def row(title, threshold=0, level=COMPRESS_LEVEL, use_dict=True, stream=True, **window):
+        total, compress_us, decompress_us = measure(frames, threshold, level, zdict if use_dict else None,
+                                                    stream, **window)
+        print(f"  {title:36} {total / raw * 100:5.1f}% байт  сжатие {compress_us:5.1f} мкс/кадр  "
+              f"распаковка {decompress_us:4.1f} мкс/кадр")
+
+    row("без сжатия", threshold=float('inf'))
+    row("кадр отдельно, без словаря", use_dict=False, stream=False)
+    row("кадр отдельно, словарь", stream=False)
+    row("поток, без словаря", use_dict=False)
+    for level in (1, 6, 9):
+        row(f"поток, словарь, уровень {level}", level=level)
+    row("поток, окно 32 КБ, memLevel 8", wbits=-15, mem_level=8)
+    for threshold in (128, 256, 512, 1024):
+        row(f"поток, словарь, порог {threshold}", threshold=threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сжатие кадров: замер на записанных партиях")
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--synthetic', type=int, default=0, help="добавить столько партий ботов")
+    args = parser.parse_args()
+
+    from replay import load_replay, synthetic_replays
+
+    replays = [load_replay(path) for pattern in args.files for path in glob.glob(pattern)]
+    if args.synthetic:
+        replays += synthetic_replays(args.synthetic, seed=1)
+    if not args.bench or not replays:
+        parser.error("нужны --bench и партии (файлы .cgr или --synthetic N)")
+    run_benchmark(replays)
+
+
+if __name__ == "__main__":
+    main()
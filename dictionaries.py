@@ -0,0 +1,193 @@
+"""Словари городов на разных языках и профили правил для комнат.
+
+Комната выбирает словарь ('ru', 'en', 'latin' или загруженный с диска) и
+профиль правил; каждое сочетание компилируется в CityDictionary один раз и
+дальше общее для всех комнат с ним. Варианты со своими правилами клиента
+живут в ограниченном кэше и при вытеснении собираются заново.
+"""
+import threading
+from collections import OrderedDict
+
+from city_index import CLASSIC_RULES, CityDictionary, RuleProfile
+
+RULE_PROFILES = {
+    'classic': CLASSIC_RULES,                           # ь, ъ, ы в конце пропускаются
+    'strict': RuleProfile('strict', ()),                # всегда последняя буква
+    'long': RuleProfile('long', CLASSIC_RULES.skip_letters, min_length=5),
+}
+
+# свои правила комнаты задает клиент, поэтому их разброс и число вариантов в памяти ограничены
+MAX_MIN_LENGTH = 10
+MAX_SKIP_LETTERS = 5
+MAX_VARIANTS = 64
+
+RUSSIAN_CITIES = ["Абакан", "Абу-Даби", "Абуджа", "Авиньон", "Агадир", "Адамстаун", "Аддис-Абеба", "Аден",
+    "Акапулько", "Аккра", "Актобе", "Аланья", "Алжир", "Амман", "Амстердам",
+    "Анадырь", "Анкара", "Анталья", "Антананариву", "Апиа", "Астана", "Асунсьон",
+    "Афины", "Ашхабад", "Баймак", "Багдад", "Бангкок", "Банги", "Банжул", "Барнаул",
+    "Бейрут", "Белград", "Берлин", "Берн", "Бисау", "Бишкек", "Богота",
+    "Бразилиа", "Братислава", "Брюссель", "Будапешт", "Буэнос-Айрес", "Бужумбура",
+    "Вадуц", "Ватикан", "Вашингтон", "Вена", "Венеция", "Вильнюс", "Виндхук",
+    "Варшава", "Вроцлав", "Волгоград", "Вологда", "Воронеж", "Валлетта", "Гавана", "Гамбург", "Гватемала",
+    "Гибралтар", "Гонконг", "Грозный", "Гуанчжоу", "Дакар", "Дакка", "Дели",
+    "Джакарта", "Джидда", "Джорджтаун", "Джуба", "Дублин", "Душанбе", "Дюссельдорф",
+    "Екатеринбург", "Елгава", "Ереван", "Женева", "Житомир", "Загреб", "Занзибар",
+    "Иваново", "Иерусалим", "Ижевск", "Иркутск", "Исламабад", "Стамбул",
+    "Йоханнесбург", "Йошкар-Ола", "Кабул", "Казань", "Каир", "Канберра", "Каракас",
+    "Касабланка", "Катманду", "Киев", "Кишинёв", "Кингстон", "Киншаса",
+    "Копенгаген", "Краков", "Куала-Лумпур", "Лагос", "Лас-Вегас", "Лиссабон",
+    "Лима", "Лондон", "Лос-Анджелес", "Луанда", "Любляна", "Люксембург", "Львов",
+    "Мадрид", "Мале", "Манагуа", "Манила", "Мапуту", "Марракеш", "Маскат",
+    "Мехико", "Милан", "Минск", "Могадишо", "Монако", "Москва", "Мумбаи", "Мюнхен",
+    "Найроби", "Накхичевань", "Нанкин", "Нижний Новогород","Нью-Дели", "Нью-Йорк", "Никосия",
+    "Ниамей", "Норильск", "Нур-Султан", "Одесса", "Окленд", "Омск", "Орландо",
+    "Осло", "Осака", "Ош", "Париж", "Пекин", "Прага", "Пхеньян", "Пномпень",
+    "Порто-Ново", "Порту", "Псков", "Пятигорск", "Рейкьявик", "Рига", "Рим",
+    "Рио-де-Жанейро", "Ростов-на-Дону", "Сан-Марино", "Сан-Паулу", "Сан-Хосе",
+    "Сантьяго", "Самара", "Сеул", "Сингапур", "София", "Стамбул", "Стокгольм",
+    "Сукхум", "Сидней", "Таллин", "Ташкент", "Тбилиси", "Тегеран", "Тирана",
+    "Токио", "Торонто", "Тула", "Тунис", "Улан-Батор", "Ульяновск", "Уфа",
+    "Фамагуста", "Флоренция", "Франкфурт", "Фритаун", "Фукуока", "Хабаровск",
+    "Хартум", "Хельсинки", "Хониара", "Хошимин", "Цюрих", "Чебоксары", "Чикаго",
+    "Чита", "Шанхай", "Шарм-эш-Шейх", "Штутгарт", "Шэньчжэнь", "Эдинбург",
+    "Эль-Кувейт", "Южно-Сахалинск", "Ялта", "Ямусукро", "Янгон", "Ярославль"
+]
+
+ENGLISH_CITIES = [
+    "Aberdeen", "Abu Dhabi", "Accra", "Adelaide", "Amsterdam", "Anchorage", "Ankara", "Antwerp", "Athens",
+    "Atlanta", "Auckland", "Austin", "Baghdad", "Baltimore", "Bangkok", "Barcelona", "Basel", "Beijing",
+    "Beirut", "Belfast", "Belgrade", "Berlin", "Bern", "Birmingham", "Bogota", "Bologna", "Bordeaux",
+    "Boston", "Bratislava", "Brisbane", "Bristol", "Brussels", "Bucharest", "Budapest", "Buenos Aires",
+    "Cairo", "Calgary", "Cambridge", "Canberra", "Cape Town", "Caracas", "Cardiff", "Casablanca",
+    "Chicago", "Copenhagen", "Cork", "Dakar", "Dallas", "Damascus", "Delhi", "Denver", "Detroit", "Dhaka",
+    "Doha", "Dortmund", "Dresden", "Dubai", "Dublin", "Dundee", "Durban", "Edinburgh", "Edmonton",
+    "Eindhoven", "El Paso", "Essen", "Florence", "Frankfurt", "Fresno", "Geneva", "Genoa", "Glasgow",
+    "Gothenburg", "Granada", "Graz", "Guadalajara", "Hamburg", "Hanoi", "Havana", "Helsinki", "Hobart",
+    "Hong Kong", "Honolulu", "Houston", "Istanbul", "Izmir", "Jakarta", "Jerusalem", "Johannesburg",
+    "Kabul", "Karachi", "Kathmandu", "Kiev", "Kingston", "Kinshasa", "Kolkata", "Krakow", "Kuala Lumpur",
+    "Kyoto", "Lagos", "Las Vegas", "Leeds", "Leipzig", "Lima", "Lisbon", "Liverpool", "London",
+    "Los Angeles", "Lyon", "Madrid", "Malaga", "Manchester", "Manila", "Marseille", "Melbourne",
+    "Memphis", "Mexico City", "Miami", "Milan", "Minsk", "Monaco", "Montreal", "Moscow", "Mumbai",
+    "Munich", "Nagoya", "Nairobi", "Nantes", "Naples", "Nashville", "New Orleans", "New York", "Nice",
+    "Oakland", "Odessa", "Omaha", "Orlando", "Osaka", "Oslo", "Ottawa", "Oxford", "Palermo", "Paris",
+    "Perth", "Philadelphia", "Phoenix", "Porto", "Prague", "Quebec", "Quito", "Rabat", "Riga",
+    "Rio de Janeiro", "Riyadh", "Rome", "Rotterdam", "Salzburg", "San Diego", "San Francisco",
+    "Santiago", "Sao Paulo", "Sarajevo", "Seattle", "Seoul", "Seville", "Shanghai", "Singapore", "Sofia",
+    "Stockholm", "Stuttgart", "Sydney", "Taipei", "Tallinn", "Tampa", "Tashkent", "Tbilisi", "Tehran",
+    "Tel Aviv", "Tirana", "Tokyo", "Toronto", "Toulouse", "Tripoli", "Tunis", "Turin", "Utrecht",
+    "Valencia", "Vancouver", "Venice", "Verona", "Vienna", "Vilnius", "Warsaw", "Washington",
+    "Wellington", "Winnipeg", "Wroclaw", "Xiamen", "Yalta", "Yangon", "Yerevan", "Yokohama", "York",
+    "Zagreb", "Zanzibar", "Zurich",
+]
+
+# упрощенная латиница без диакритики; ь и ъ не пишутся
+TRANSLITERATION = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+    'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y',
+    'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+
+def transliterate(text):
+    result = []
+    for char in text:
+        latin = TRANSLITERATION.get(char.lower())
+        if latin is None:
+            result.append(char)
+        elif char.isupper():
+            result.append(latin.capitalize())
+        else:
+            result.append(latin)
+    return ''.join(result)
+
+
+def load_city_file(path):
+    # один город в строке, пустые строки и строки с # пропускаются
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+class DictionaryRegistry:
+    def __init__(self):
+        self.sources = {}       # имя словаря -> (список городов, профиль по умолчанию)
+        self.compiled = {}      # (имя, ключ правил) -> CityDictionary для именованных профилей
+        self.variants = OrderedDict()   # то же для своих правил, не больше MAX_VARIANTS
+        self.loaded = set()     # словари из файлов (--dictionary), их переносит горячий перезапуск
+        self.lock = threading.Lock()
+
+    def register(self, name, cities, default_rules='strict'):
+        with self.lock:
+            self.sources[name] = (list(cities), default_rules)
+            # перерегистрация заменяет уже собранные варианты
+            self.compiled = {key: dictionary for key, dictionary in self.compiled.items() if key[0] != name}
+            self.variants = OrderedDict((key, dictionary) for key, dictionary in self.variants.items()
+                                        if key[0] != name)
+
+    def load(self, name, path, default_rules='strict'):
+        self.register(name, load_city_file(path), default_rules)
+        self.loaded.add(name)
+
+    def export_loaded(self):
+        # сами списки, а не пути: номера городов в сохраненных комнатах зависят от порядка строк
+        return {name: list(self.sources[name]) for name in sorted(self.loaded)}
+
+    def restore_loaded(self, loaded):
+        for name, (cities, default_rules) in loaded.items():
+            self.register(name, cities, default_rules)
+            self.loaded.add(name)
+
+    def names(self):
+        return sorted(self.sources)
+
+    def rules(self, name, profile=None, skip_letters=None, min_length=None):
+        """Профиль правил: именованный, при необходимости с измененными буквами или длиной"""
+        if name not in self.sources:
+            raise KeyError(f"Неизвестный словарь: {name}")
+        profile = profile or self.sources[name][1]
+        if profile not in RULE_PROFILES:
+            raise KeyError(f"Неизвестные правила: {profile}")
+        rules = RULE_PROFILES[profile]
+        if skip_letters is not None:
+            skip_letters = skip_letters.lower()
+            if len(set(skip_letters)) > MAX_SKIP_LETTERS or not all(letter.isalpha() for letter in skip_letters):
+                raise ValueError(f"Пропускать можно до {MAX_SKIP_LETTERS} букв")
+        if min_length is not None and not 1 <= min_length <= MAX_MIN_LENGTH:
+            raise ValueError(f"Минимальная длина названия - от 1 до {MAX_MIN_LENGTH}")
+        if (skip_letters is None or frozenset(skip_letters) == rules.skip_letters) and \
+                (min_length is None or min_length == rules.min_length):
+            return rules
+        return RuleProfile(f"{profile}*",
+                           rules.skip_letters if skip_letters is None else skip_letters,
+                           rules.min_length if min_length is None else min_length)
+
+    def get(self, name, profile=None, skip_letters=None, min_length=None):
+        rules = self.rules(name, profile, skip_letters, min_length)
+        key = (name,) + rules.key
+        dictionary = self.compiled.get(key)
+        if dictionary is not None:
+            return dictionary
+
+        with self.lock:
+            named = rules is RULE_PROFILES.get(rules.name)
+            cache = self.compiled if named else self.variants
+            dictionary = cache.get(key)
+            if dictionary is not None:
+                if not named:
+                    self.variants.move_to_end(key)
+                return dictionary
+
+            cities, _ = self.sources[name]
+            dictionary = CityDictionary(cities, rules, name)
+            # пустой вариант комнате не достанется, хранить его незачем
+            if len(dictionary):
+                cache[key] = dictionary
+                if not named and len(self.variants) > MAX_VARIANTS:
+                    self.variants.popitem(last=False)
+        return dictionary
+
+
+DICTIONARIES = DictionaryRegistry()
+DICTIONARIES.register('ru', RUSSIAN_CITIES, 'classic')
+DICTIONARIES.register('en', ENGLISH_CITIES, 'strict')
+DICTIONARIES.register('latin', [transliterate(city) for city in RUSSIAN_CITIES], 'strict')
@@ -0,0 +1,131 @@
+"""Шина событий комнат: игровая логика публикует, подписчики разбирают пачками.
+
+publish только кладет событие в очереди подписчиков и никогда не ждет их,
+поэтому медленная рассылка или запись не задерживают проверку хода. Каждый
+подписчик работает в своем потоке и получает события списком; при
+переполнении очереди выбрасываются самые старые события. Подписчик с
+coalesce держит только последнее событие каждой комнаты: его очередь не
+длиннее числа комнат, и последнее изменение комнаты не теряется.
+"""
+import threading
+import time
+from collections import deque
+
+ROOM_EVENTS = ('player_joined', 'player_left', 'seat_reserved', 'seat_reclaimed', 'game_started',
+               'city_played', 'turn_skipped', 'turn_changed', 'game_over', 'reset')
+
+
+class RoomEvent:
+    __slots__ = ('type', 'room', 'version', 'data', 'at')
+
+    def __init__(self, event_type, room, version, data, at):
+        self.type = event_type
+        self.room = room
+        self.version = version
+        self.data = data
+        self.at = at            # когда изменение произошло (часы сервера), подписчик разбирает его позже
+
+    def __repr__(self):
+        return f"RoomEvent({self.type!r}, {self.room!r}, v{self.version})"
+
+
+class Subscriber:
+    __slots__ = ('name', 'callback', 'types', 'queue', 'latest', 'lock', 'max_batch', 'max_delay', 'max_queue',
+                 'dropped', 'delivered', 'wakeup', 'thread')
+
+    def __init__(self, name, callback, types, max_batch, max_delay, max_queue, coalesce=False):
+        self.name = name
+        self.callback = callback
+        self.types = frozenset(types) if types is not None else None
+        self.queue = deque()        # события, а с coalesce - комнаты в порядке первого изменения
+        self.latest = {} if coalesce else None     # комната -> ее последнее событие
+        self.lock = threading.Lock()
+        self.max_batch = max_batch
+        self.max_delay = max_delay      # сколько подождать, чтобы пачка набралась
+        self.max_queue = max_queue
+        self.dropped = 0
+        self.delivered = 0
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def push(self, event):
+        if self.latest is not None:
+            with self.lock:
+                if event.room not in self.latest:
+                    self.queue.append(event.room)
+                self.latest[event.room] = event
+        else:
+            if len(self.queue) >= self.max_queue:
+                self.queue.popleft()
+                self.dropped += 1
+            self.queue.append(event)
+        if self.thread is not None and not self.wakeup.is_set():
+            self.wakeup.set()
+
+    def deliver(self):
+        # забирает все, что накопилось, и отдает пачками по max_batch
+        queue = self.queue
+        while queue:
+            batch = []
+            while queue and len(batch) < self.max_batch:
+                batch.append(self._take())
+            try:
+                self.callback(batch)
+            except Exception as e:
+                print(f"Ошибка подписчика {self.name}: {e}")
+            self.delivered += len(batch)
+
+    def _take(self):
+        if self.latest is None:
+            return self.queue.popleft()
+        # комната и ее событие снимаются вместе, иначе новое событие осталось бы без места в очереди
+        with self.lock:
+            return self.latest.pop(self.queue.popleft())
+
+
+class EventBus:
+    def __init__(self, threaded=True):
+        # без потоков события доставляются только вызовом flush (для harness)
+        self.threaded = threaded
+        self.subscribers = []
+        self.running = True
+
+    def subscribe(self, name, callback, types=None, max_batch=256, max_delay=0.0, max_queue=10000,
+                  coalesce=False):
+        subscriber = Subscriber(name, callback, types, max_batch, max_delay, max_queue, coalesce)
+        if self.threaded:
+            subscriber.thread = threading.Thread(target=self._run, args=(subscriber,), daemon=True,
+                                                 name=f"events-{name}")
+            subscriber.thread.start()
+        # копия списка, чтобы publish мог идти без блокировки
+        self.subscribers = self.subscribers + [subscriber]
+        return subscriber
+
+    def publish(self, event):
+        for subscriber in self.subscribers:
+            if subscriber.types is None or event.type in subscriber.types:
+                subscriber.push(event)
+
+    def _run(self, subscriber):
+        while self.running:
+            subscriber.wakeup.wait(1.0)
+            subscriber.wakeup.clear()
+            if subscriber.max_delay and subscriber.queue:
+                time.sleep(subscriber.max_delay)
+            subscriber.deliver()
+
+    def flush(self):
+        # доставить все сейчас в вызывающем потоке, включая события, порожденные подписчиками
+        while any(subscriber.queue for subscriber in self.subscribers):
+            for subscriber in self.subscribers:
+                subscriber.deliver()
+
+    def close(self):
+        self.running = False
+        for subscriber in self.subscribers:
+            subscriber.wakeup.set()
+
+    def stats(self):
+        return {subscriber.name: {'queued': len(subscriber.queue), 'delivered': subscriber.delivered,
+                                  'dropped': subscriber.dropped}
+                for subscriber in self.subscribers}
@@ -0,0 +1,379 @@
+"""Федерация серверов: общий список комнат нескольких узлов.
+
+Каждый узел раз в interval секунд рассылает соседям сообщение gossip:
+счетчики жизни (beats) всех известных узлов и описания комнат тех узлов,
+которые изменились с прошлой отправки этому соседу. Соседи пересылают
+чужие описания дальше, поэтому узлы не обязаны быть связаны все со всеми.
+Узел, чей счетчик не растет node_timeout секунд, считается выбывшим.
+
+Вход в комнату другого узла отвечает клиенту сообщением redirect с
+адресом узла и подписанным токеном, с которым клиент заходит туда сам.
+Токены и каждая строка gossip подписываются общим секретом узлов
+(--federation-secret или CITIES_FEDERATION_SECRET), без него узел не
+запускается; gossip без верной подписи отбрасывается.
+
+    python server.py --port 8888 --node-id a --gossip-port 9888 --peers localhost:9889
+    python server.py --port 8889 --node-id b --gossip-port 9889 --peers localhost:9888
+    python federation.py --bench --nodes 4 --rooms 10,100,1000
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import socket
+import threading
+import time
+
+GOSSIP_INTERVAL = 0.5
+NODE_TIMEOUT = 5.0
+TOKEN_TTL = 30
+SECRET_ENV = 'CITIES_FEDERATION_SECRET'
+MAX_GOSSIP_MESSAGE = 8 * 1024 * 1024    # байт в одной строке gossip; сосед, приславший больше, отключается
+
+
+class NodeState:
+    __slots__ = ('node', 'seq', 'address', 'rooms', 'beat', 'seen')
+
+    def __init__(self, node):
+        self.node = node
+        self.seq = 0            # растет при каждом изменении списка комнат узла
+        self.address = None     # (хост, порт) для игроков
+        self.rooms = []         # [название, игроков, идет ли игра]
+        self.beat = 0
+        self.seen = 0.0
+
+
+class Federation:
+    def __init__(self, server, node_id, host='localhost', port=9888, peers=(), public_address=None,
+                 secret=None, interval=GOSSIP_INTERVAL, node_timeout=NODE_TIMEOUT,
+                 clock=time.monotonic):
+        # без общего секрета любой мог бы выписать токен перехода в чужую комнату
+        secret = secret or os.environ.get(SECRET_ENV)
+        if not secret:
+            raise ValueError(f"Нужен общий секрет федерации: --federation-secret или {SECRET_ENV}")
+        self.server = server
+        self.node_id = node_id
+        self.host = host
+        self.port = port
+        self.peers = [tuple(peer) for peer in peers]
+        self.public_address = public_address or (server.host, server.port)
+        self.secret = secret.encode('utf-8')
+        self.secret_text = secret
+        self.interval = interval
+        self.node_timeout = node_timeout
+        self.clock = clock
+
+        self.nodes = {}             # узел -> NodeState
+        self.own = self.nodes[node_id] = NodeState(node_id)
+        self.own.address = list(self.public_address)
+        # отсчет от времени запуска: после перезапуска узла соседи примут его описания как более новые
+        self.own.seq = self.own.beat = int(time.time() * 1000)
+        self.sent = {}              # сосед -> {узел: seq, отправленный ему}
+        self.connections = {}       # сосед -> исходящий сокет
+        self.lock = threading.Lock()
+        self.running = False
+        self.listener = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    # рассылка
+
+    def start(self):
+        self.running = True
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((self.host, self.port))
+        self.listener.listen(16)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._gossip_loop, daemon=True).start()
+        print(f"🌐 Узел {self.node_id}: gossip на {self.host}:{self.port}, соседей {len(self.peers)}")
+
+    def stop(self):
+        self.running = False
+        for connection in list(self.connections.values()):
+            connection.close()
+        if self.listener:
+            try:
+                self.listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.listener.close()
+
+    def config(self):
+        # параметры для нового процесса при горячем перезапуске
+        return {'node_id': self.node_id, 'host': self.host, 'port': self.port, 'peers': self.peers,
+                'public_address': list(self.public_address), 'secret': self.secret_text, 'interval': self.interval}
+
+    def _gossip_loop(self):
+        while self.running:
+            time.sleep(self.interval)
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Ошибка gossip: {e}")
+
+    def local_rooms(self):
+        with self.server.lock:
+            rooms = list(self.server.rooms.items())
+        # состояние комнаты читает ее поток-владелец, если комнаты в пуле
+        return [[name, *self.server.in_room(room, room.summary)] for name, room in rooms]
+
+    def tick(self):
+        rooms = self.local_rooms()
+        now = self.clock()
+        with self.lock:
+            own = self.own
+            if rooms != own.rooms:
+                own.rooms = rooms
+                own.seq += 1
+            own.beat += 1
+            own.seen = now
+            beats = {node: state.beat for node, state in self.nodes.items() if self._alive(state, now)}
+
+            messages = {}
+            for peer in self.peers:
+                sent = self.sent.setdefault(peer, {})
+                states = []
+                for node, state in self.nodes.items():
+                    if state.seq > sent.get(node, 0) and self._alive(state, now):
+                        states.append({'node': node, 'seq': state.seq, 'address': state.address,
+                                       'rooms': state.rooms})
+                        sent[node] = state.seq
+                messages[peer] = json.dumps({'type': 'gossip', 'from': self.node_id, 'beats': beats,
+                                             'states': states}, ensure_ascii=False).encode('utf-8')
+
+        for peer, message in messages.items():
+            self._send(peer, self.seal(message))
+
+    def _send(self, peer, data):
+        connection = self.connections.get(peer)
+        try:
+            if connection is None:
+                connection = socket.create_connection(peer, timeout=self.interval)
+                self.connections[peer] = connection
+            connection.sendall(data)
+            self.bytes_sent += len(data)
+        except OSError:
+            # сосед недоступен: после переподключения он получит все описания заново
+            if connection is not None:
+                connection.close()
+            self.connections.pop(peer, None)
+            with self.lock:
+                self.sent.pop(peer, None)
+
+    # прием
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._read_loop, args=(connection,), daemon=True).start()
+
+    def _read_loop(self, connection):
+        buffer = b""
+        try:
+            while self.running:
+                data = connection.recv(65536)
+                if not data:
+                    break
+                self.bytes_received += len(data)
+                buffer += data
+                while b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    message = self.unseal(line)
+                    if message is None:
+                        print("Сообщение gossip без верной подписи отброшено")
+                        continue
+                    try:
+                        self.receive(json.loads(message))
+                    except (ValueError, KeyError, TypeError, AttributeError) as e:
+                        print(f"Неверное сообщение gossip: {e}")
+                if len(buffer) > MAX_GOSSIP_MESSAGE:
+                    print(f"Сообщение gossip длиннее {MAX_GOSSIP_MESSAGE} байт, соединение закрыто")
+                    break
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+    def receive(self, message):
+        if not isinstance(message, dict) or message.get('type') != 'gossip':
+            return
+        now = self.clock()
+        with self.lock:
+            for node, beat in message['beats'].items():
+                if node == self.node_id:
+                    continue
+                state = self.nodes.get(node)
+                if state is None:
+                    state = self.nodes[node] = NodeState(node)
+                if beat > state.beat:
+                    state.beat = beat
+                    state.seen = now
+
+            for entry in message['states']:
+                node = entry['node']
+                if node == self.node_id:
+                    continue
+                state = self.nodes.get(node)
+                if state is None:
+                    state = self.nodes[node] = NodeState(node)
+                    state.seen = now
+                if entry['seq'] > state.seq:
+                    state.seq = entry['seq']
+                    state.address = entry['address']
+                    state.rooms = entry['rooms']
+
+    def _alive(self, state, now):
+        return state.node == self.node_id or now - state.seen <= self.node_timeout
+
+    # лобби
+
+    def remote_rooms(self):
+        now = self.clock()
+        with self.lock:
+            return [(state.node, room) for state in self.nodes.values()
+                    if state.node != self.node_id and self._alive(state, now)
+                    for room in state.rooms]
+
+    def locate(self, room_name):
+        # (узел, адрес) удаленной комнаты или None
+        now = self.clock()
+        with self.lock:
+            for state in self.nodes.values():
+                if state.node == self.node_id or not self._alive(state, now):
+                    continue
+                for name, _, _ in state.rooms:
+                    if name == room_name:
+                        return state.node, state.address
+        return None
+
+    # подписи
+
+    def seal(self, body):
+        # строка gossip: HMAC тела, пробел, тело
+        return hmac.new(self.secret, body, hashlib.sha256).hexdigest().encode('ascii') + b' ' + body + b'\n'
+
+    def unseal(self, line):
+        # тело строки, если подпись сходится, иначе None
+        signature, _, body = line.partition(b' ')
+        expected = hmac.new(self.secret, body, hashlib.sha256).hexdigest().encode('ascii')
+        if not hmac.compare_digest(signature, expected):
+            return None
+        return body
+
+    # токены перехода
+
+    def _sign(self, payload):
+        return hmac.new(self.secret, payload, hashlib.sha256).hexdigest()[:32]
+
+    def make_token(self, player_name, room_name, node):
+        payload = json.dumps({'p': player_name, 'r': room_name, 'n': node,
+                              'e': int(time.time()) + TOKEN_TTL}).encode('utf-8')
+        return base64.urlsafe_b64encode(payload).decode('ascii') + '.' + self._sign(payload)
+
+    def verify_token(self, token, player_name):
+        # название комнаты, если токен выписан этому игроку для этого узла и не истек
+        try:
+            encoded, signature = token.rsplit('.', 1)
+            payload = base64.urlsafe_b64decode(encoded.encode('ascii'))
+        except (ValueError, TypeError):
+            return None
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        data = json.loads(payload)
+        if data['p'] != player_name or data['n'] != self.node_id or data['e'] < time.time():
+            return None
+        return data['r']
+
+
+def parse_peers(text):
+    peers = []
+    for item in filter(None, (text or '').split(',')):
+        host, _, port = item.strip().rpartition(':')
+        peers.append((host or 'localhost', int(port)))
+    return peers
+
+
+# замер сходимости лобби и трафика gossip
+
+def run_benchmark(nodes, room_counts, interval, base_port):
+    from server import CitiesGameServer
+
+    secret = secrets.token_hex(16)
+    servers = []
+    for i in range(nodes):
+        server = CitiesGameServer(port=18000 + i, stats_path=None, replay_dir=None, analytics_dir=None)
+        # кольцо: каждый узел знает только следующего, описания доходят пересылкой
+        server.federation = Federation(server, f"node{i}", port=base_port + i,
+                                       peers=[('localhost', base_port + (i + 1) % nodes)], secret=secret,
+                                       interval=interval)
+        servers.append(server)
+    for server in servers:
+        server.federation.start()
+    time.sleep(interval * 2)
+
+    print(f"🌐 Узлов: {nodes}, кольцо, интервал {interval * 1000:.0f} мс")
+    created = 0
+    player = 0
+    for count in room_counts:
+        origin = servers[0]
+        for i in range(created, count):
+            origin.create_room(f"Комната {i}")
+        created = max(created, count)
+
+        started = time.perf_counter()
+        expected = len(origin.rooms)
+        while True:
+            if all(sum(1 for node, _ in server.federation.remote_rooms() if node == 'node0') == expected
+                   for server in servers[1:]):
+                break
+            if time.perf_counter() - started > 30:
+                print("  ❌ не сошлось за 30 с")
+                break
+            time.sleep(0.005)
+        converged = time.perf_counter() - started
+
+        # трафик в покое (только счетчики жизни) и при постоянных изменениях;
+        # сначала даем описаниям обойти кольцо до конца
+        time.sleep(interval * nodes)
+        before = sum(server.federation.bytes_sent for server in servers)
+        time.sleep(interval * 4)
+        idle = (sum(server.federation.bytes_sent for server in servers) - before) / (interval * 4)
+
+        before = sum(server.federation.bytes_sent for server in servers)
+        window_end = time.perf_counter() + interval * 4
+        while time.perf_counter() < window_end:
+            player += 1
+            origin.rooms[f"Комната {player % count}"].add_player(f"Игрок {player}")
+            time.sleep(interval / 2)
+        busy = (sum(server.federation.bytes_sent for server in servers) - before) / (interval * 4)
+
+        print(f"  комнат {count:5}: сходимость {converged * 1000:6.0f} мс, "
+              f"трафик в покое {idle / 1024:6.1f} КБ/с, при изменениях {busy / 1024:7.1f} КБ/с")
+
+    for server in servers:
+        server.federation.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Федерация серверов: замер сходимости лобби")
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--nodes', type=int, default=4)
+    parser.add_argument('--rooms', default='10,100,1000')
+    parser.add_argument('--interval', type=float, default=GOSSIP_INTERVAL)
+    parser.add_argument('--base-port', type=int, default=19000)
+    args = parser.parse_args()
+
+    if not args.bench:
+        parser.error("узел федерации запускается через server.py --node-id, здесь только --bench")
+    run_benchmark(args.nodes, [int(count) for count in args.rooms.split(',')], args.interval, args.base_port)
+
+
+if __name__ == "__main__":
+    main()
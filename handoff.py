@@ -0,0 +1,177 @@
+"""Передача работающего сервера новому процессу без разрыва соединений.
+
+Старый процесс замораживает комнаты, сохраняет их, сессии, очередь подбора,
+турниры и настройки в JSON и запускает `server.py --handoff файл`, передавая ему
+слушающий сокет и сокеты клиентов (pass_fds). Новый процесс поднимает
+состояние и пишет один байт в канал готовности, после чего старый выходит.
+"""
+import json
+import os
+import select
+import socket
+import subprocess
+import sys
+import tempfile
+
+from compression import StreamCompressor
+from dictionaries import DICTIONARIES
+from tournament import Tournament
+
+READY_TIMEOUT = 10.0
+
+
+def server_options(server):
+    # настройки из командной строки: новый процесс запускается только с --handoff
+    return {
+        'stats_path': server.stats_path,
+        'replay_dir': server.replay_dir,
+        'analytics_dir': server.analytics_dir,
+        'backlog': server.backlog,
+        'max_connections': server.admission.max_connections,
+        'max_connections_per_ip': server.admission.max_per_ip,
+        'command_rate': server.command_rate,
+        'command_burst': server.command_burst,
+        'room_workers': server.workers.count if server.workers else 0,
+        'room_capacity': server.room_capacity,
+        'admin_token': server.admin_token,
+    }
+
+
+def export_state(server, detached):
+    # detached: сокет -> (адрес, недочитанные байты) остановленных потоков чтения
+    now = server.clock()
+    with server.lock:
+        clients = []
+        for client_socket, (address, buffer) in detached.items():
+            clients.append({
+                'fd': client_socket.fileno(),
+                'address': list(address),
+                'player': server.socket_players.get(client_socket),
+                'buffer': buffer.decode('latin-1'),
+                'compressed': client_socket in server.compressors,
+            })
+
+        sessions = [{
+            'token': session.token,
+            'player': session.player_name,
+            'away': None if session.disconnected_at is None else now - session.disconnected_at,
+        } for session in server.player_sessions.values()]
+
+        return {
+            'listen_fd': server.server_socket.fileno(),
+            'host': server.host,
+            'port': server.port,
+            'options': server_options(server),
+            'dictionaries': DICTIONARIES.export_loaded(),
+            'rooms': [server.in_room(room, room.export) for room in server.rooms.values()],
+            'player_rooms': server.player_rooms,
+            'sessions': sessions,
+            'clients': clients,
+            'deadlines': [[room_name, deadline - now] for deadline, room_name in server.deadlines],
+            'tournaments': [tournament.export() for tournament in server.tournaments.values()],
+            'tournament_rooms': sorted(server.tournament_rooms),
+            'match_rooms': sorted(server.match_rooms),
+            'queue': server.matchmaker.export(),
+            'bot_counter': server.bot_counter,
+            'match_counter': server.match_counter,
+            'federation': server.federation.config() if server.federation else None,
+            'tracing': {'sample_every': server.tracer.sample_every, 'slow_ms': server.tracer.slow_ms,
+                        'slow_log_path': server.tracer.slow_log_path} if server.tracer else None,
+        }
+
+
+def restore_state(server, state):
+    """Поднимает состояние в свежем CitiesGameServer, возвращает [(сокет, адрес, буфер)]"""
+    from server import Session
+
+    now = server.clock()
+    # словари из --dictionary: в аргументах нового процесса их нет
+    DICTIONARIES.restore_loaded(state.get('dictionaries', {}))
+    server.server_socket.close()
+    server.server_socket = socket.socket(fileno=state['listen_fd'])
+    server.inherited_socket = True
+
+    with server.lock:
+        server.rooms = {}
+        for room_state in state['rooms']:
+            room = server.new_room(room_state['name'], DICTIONARIES.get(*room_state['dictionary']))
+            room.restore(room_state)
+            if room.recorder:
+                room.recorder.new_game(room.table.names(), list(room.table.reserved))
+
+        server.player_rooms = dict(state['player_rooms'])
+        for entry in state['sessions']:
+            session = Session(entry['player'])
+            session.token = entry['token']
+            session.disconnected_at = None if entry['away'] is None else now - entry['away']
+            server.sessions[session.token] = session
+            server.player_sessions[session.player_name] = session
+
+        readers = []
+        for entry in state['clients']:
+            client_socket = socket.socket(fileno=entry['fd'])
+            if entry.get('compressed'):
+                # поток deflate не переносится: первый кадр нового процесса начнет его заново
+                server.compressors[client_socket] = StreamCompressor(server.frame_dictionary)
+            if entry['player'] is not None:
+                server.clients[entry['player']] = (client_socket, 'unknown')
+                server.socket_players[client_socket] = entry['player']
+            readers.append((client_socket, tuple(entry['address']), entry['buffer'].encode('latin-1')))
+
+        server.deadlines = [(now + remaining, room_name) for room_name, remaining in state['deadlines']]
+        server.deadlines.sort()
+        server.tournament_rooms = set(state['tournament_rooms'])
+        server.match_rooms = set(state.get('match_rooms', ()))
+        server.bot_counter = state['bot_counter']
+        server.match_counter = state['match_counter']
+
+        for tournament_state in state['tournaments']:
+            tournament = Tournament.restore(server, tournament_state)
+            server.tournaments[tournament.name] = tournament
+            if not tournament.finished:
+                server.game_over_listeners.append(tournament.on_game_over)
+
+    server.matchmaker.restore(state['queue'])
+    return readers
+
+
+def spawn_successor(state, timeout=READY_TIMEOUT):
+    """Запускает новый процесс сервера и ждет, пока он поднимет состояние"""
+    fds = [state['listen_fd']] + [client['fd'] for client in state['clients']]
+    ready_read, ready_write = os.pipe()
+    state['ready_fd'] = ready_write
+    fds.append(ready_write)
+
+    fd, path = tempfile.mkstemp(prefix='cities-handoff-', suffix='.json')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+    process = subprocess.Popen([sys.executable, script, '--handoff', path], pass_fds=fds)
+    os.close(ready_write)
+
+    try:
+        ready, _, _ = select.select([ready_read], [], [], timeout)
+        ok = bool(ready) and os.read(ready_read, 1) == b'1'
+    finally:
+        os.close(ready_read)
+
+    if not ok:
+        process.kill()
+        if os.path.exists(path):
+            os.unlink(path)
+    return ok
+
+
+def load_handoff(path):
+    with open(path, encoding='utf-8') as f:
+        state = json.load(f)
+    os.unlink(path)
+    return state
+
+
+def signal_ready(state):
+    fd = state.get('ready_fd')
+    if fd is not None:
+        os.write(fd, b'1')
+        os.close(fd)
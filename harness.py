@@ -0,0 +1,214 @@
+"""Сервер в одном потоке без сокетов: виртуальные клиенты и управляемые часы.
+
+Все, что сервер отправляет клиенту, складывается в его входящие, а
+таймеры (дедлайны, истечение сессий, подбор игроков) срабатывают только
+при harness.advance(). Шина событий работает без потоков и разбирается
+после каждой команды.
+
+    python harness.py --clients 2000 --room-size 4
+"""
+import argparse
+import json
+import random
+import time
+from collections import deque
+
+from server import CitiesGameServer, GameProtocol
+
+
+class FakeClock:
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeSocket:
+    """Клиентский сокет в памяти: send копит отправленные сервером кадры.
+
+    Хранятся только последние max_frames отправок, чтобы тысячи клиентов
+    в одной комнате не съедали память; счетчики ведутся по всем.
+    """
+
+    def __init__(self, address, max_frames=100):
+        self.address = address
+        self.inbox = deque(maxlen=max_frames)
+        self.frames_received = 0
+        self.bytes_received = 0
+        self.closed = False
+
+    def send(self, data):
+        if self.closed:
+            raise OSError("Сокет закрыт")
+        self.inbox.append(data)
+        self.frames_received += 1
+        self.bytes_received += len(data)
+        return len(data)
+
+    def sendall(self, data):
+        self.send(data)
+
+    def getpeername(self):
+        return self.address
+
+    def close(self):
+        self.closed = True
+
+
+class VirtualClient:
+    def __init__(self, harness, name):
+        self.harness = harness
+        self.name = name
+        self.socket = FakeSocket(('127.0.0.1', 40000 + len(harness.clients)), harness.max_frames)
+        self.frames = deque(maxlen=harness.max_frames)     # общие с сервером байты, JSON разбирается по запросу
+        self.session_token = None
+
+    def send(self, command, **fields):
+        # ответ - последний кадр, отправленный во время handle_line; рассылки
+        # шины событий доставляются после него, разбираем только ответ
+        line = GameProtocol.create_message('command', command=command, player_name=self.name, **fields)
+        sent = self.socket.frames_received
+        self.harness.server.handle_line(line.rstrip('\n'), self.socket)
+        reply = self.socket.inbox[-1] if self.socket.frames_received > sent else None
+        self.harness.server.bus.flush()
+        self.drain()
+        if reply is None:
+            return None
+
+        response = json.loads(reply.splitlines()[-1])
+        if 'session_token' in response:
+            self.session_token = response['session_token']
+        return response
+
+    def drain(self):
+        self.frames.extend(self.socket.inbox)
+        self.socket.inbox.clear()
+
+    def _parsed(self):
+        return [json.loads(line) for frame in self.frames for line in frame.splitlines()]
+
+    def messages(self, message_type=None):
+        self.drain()
+        parsed = self._parsed()
+        if message_type is None:
+            return parsed
+        return [message for message in parsed if message.get('type') == message_type]
+
+    def last(self, message_type):
+        self.drain()
+        for message in reversed(self._parsed()):
+            if message.get('type') == message_type:
+                return message
+        return None
+
+    def join(self):
+        return self.send('join')
+
+    def disconnect(self):
+        self.harness.server.disconnect_client(self.socket)
+        self.harness.server.bus.flush()
+        self.socket.close()
+
+    def reconnect(self, version=None, room_name=None):
+        self.socket = FakeSocket(self.socket.address, self.harness.max_frames)
+        return self.send('resume', session_token=self.session_token, version=version, room_name=room_name)
+
+
+class Harness:
+    def __init__(self, max_frames=100, **server_options):
+        server_options.setdefault('stats_path', None)
+        server_options.setdefault('replay_dir', None)
+        server_options.setdefault('analytics_dir', None)
+        server_options.setdefault('threaded_events', False)
+        self.clock = FakeClock()
+        self.server = CitiesGameServer(**server_options)
+        self.server.clock = self.clock
+        self.server.matchmaker.clock = self.clock
+        self.clients = []
+        self.max_frames = max_frames
+
+    def client(self, name):
+        client = VirtualClient(self, name)
+        self.clients.append(client)
+        return client
+
+    def advance(self, seconds):
+        self.clock.advance(seconds)
+        self.server.check_deadlines()
+        self.server.expire_sessions()
+        self.server.matchmaker.tick()
+        self.server.bus.flush()
+
+    def drain_all(self):
+        for client in self.clients:
+            client.drain()
+
+
+def run_scenario(clients, room_size, moves, seed=None):
+    rng = random.Random(seed)
+    harness = Harness()
+    harness.server.matchmaker.room_size = room_size
+    timings = {}
+
+    started = time.perf_counter()
+    players = [harness.client(f"Игрок {i}") for i in range(clients)]
+    for player in players:
+        player.join()
+        player.send('queue')
+    timings['join + queue'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    harness.advance(1.0)
+    timings['matchmaking'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    accepted = 0
+    by_name = {player.name: player for player in players}
+    rooms = [room for room in harness.server.rooms.values() if room.player_count() >= 2]
+    for room in rooms:
+        first = by_name[room.table.name_at(0)]
+        city = room.dictionary.names[rng.randrange(len(room.dictionary))]
+        first.send('start', city=city)
+        for _ in range(moves):
+            player = by_name.get(room.get_current_player())
+            candidates = room.index.candidates(room.last_letter)
+            if player is None or not candidates:
+                break
+            city_id = rng.choice(tuple(candidates))
+            response = player.send('add_city', city=room.dictionary.names[city_id])
+            accepted += response['type'] == 'success'
+    timings['moves'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for player in players[::2]:
+        player.disconnect()
+    for player in players[::2]:
+        player.reconnect(version=0, room_name=harness.server.player_rooms.get(player.name))
+    timings['reconnect half'] = time.perf_counter() - started
+
+    harness.drain_all()
+    return harness, accepted, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный сценарий без сокетов")
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--room-size', type=int, default=4)
+    parser.add_argument('--moves', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    harness, accepted, timings = run_scenario(args.clients, args.room_size, args.moves, args.seed)
+    delivered = sum(client.socket.bytes_received for client in harness.clients)
+    print(f"🧪 Клиентов: {len(harness.clients)}, комнат: {len(harness.server.rooms)}, принято ходов: {accepted}")
+    print(f"  доставлено клиентам: {delivered / 1e6:.1f} МБ")
+    for stage, seconds in timings.items():
+        print(f"  {stage}: {seconds * 1000:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
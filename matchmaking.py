@@ -0,0 +1,165 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class Matchmaker:
+    """Очередь игроков, которые ждут автоматического подбора комнаты.
+
+    Игроки делятся на корзины по уровню игры. Раз в tick секунд из каждой
+    корзины собираются комнаты по room_size человек, а те, кто ждет дольше
+    max_wait, объединяются с долго ждущими только из соседней корзины и могут
+    попасть в неполную комнату (не меньше min_room_size).
+    """
+
+    def __init__(self, on_match, room_size=4, min_room_size=2, bucket_width=None,
+                 max_wait=30.0, tick=0.5, clock=time.monotonic):
+        self.on_match = on_match
+        self.room_size = room_size
+        self.min_room_size = min_room_size
+        self.bucket_width = bucket_width
+        self.max_wait = max_wait
+        self.tick_interval = tick
+        self.clock = clock
+
+        self.queues = {}     # корзина -> куча (время постановки, номер, игрок)
+        self.sizes = {}      # корзина -> сколько в ней живых записей
+        self.waiting = {}    # игрок -> (корзина, номер); отмена ленивая, запись в куче пропускается
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.running = False
+
+    def bucket_for(self, skill):
+        if self.bucket_width is None or skill is None:
+            return 0
+        return int(skill // self.bucket_width)
+
+    def enqueue(self, player_name, skill=None):
+        with self.lock:
+            if player_name in self.waiting:
+                return False
+
+            bucket = self.bucket_for(skill)
+            seq = next(self.counter)
+            heapq.heappush(self.queues.setdefault(bucket, []), (self.clock(), seq, player_name))
+            self.sizes[bucket] = self.sizes.get(bucket, 0) + 1
+            self.waiting[player_name] = (bucket, seq)
+            return True
+
+    def cancel(self, player_name):
+        with self.lock:
+            entry = self.waiting.pop(player_name, None)
+            if entry is None:
+                return False
+            self.sizes[entry[0]] -= 1
+            return True
+
+    def __len__(self):
+        return len(self.waiting)
+
+    def _pop(self, bucket):
+        # следующая живая запись корзины, отмененные выбрасываются по пути
+        heap = self.queues[bucket]
+        while heap:
+            enqueued_at, seq, player_name = heapq.heappop(heap)
+            if self.waiting.get(player_name) == (bucket, seq):
+                del self.waiting[player_name]
+                self.sizes[bucket] -= 1
+                return enqueued_at, player_name
+        return None
+
+    def _head(self, bucket):
+        heap = self.queues[bucket]
+        while heap:
+            enqueued_at, seq, player_name = heap[0]
+            if self.waiting.get(player_name) == (bucket, seq):
+                return enqueued_at
+            heapq.heappop(heap)
+        return None
+
+    def tick(self):
+        groups = []
+        now = self.clock()
+
+        with self.lock:
+            overdue = {}     # корзина -> [(корзина, игрок)]
+            for bucket in sorted(self.queues):
+                while self.sizes[bucket] >= self.room_size:
+                    groups.append([self._pop(bucket)[1] for _ in range(self.room_size)])
+
+                deadline = now - self.max_wait
+                while True:
+                    head = self._head(bucket)
+                    if head is None or head > deadline:
+                        break
+                    overdue.setdefault(bucket, []).append((bucket, self._pop(bucket)[1]))
+
+            # остаток долго ждущих корзины переходит только в следующую соседнюю
+            carry = []
+            for bucket in sorted(overdue):
+                players = overdue[bucket]
+                if carry and carry[-1][0] == bucket - 1:
+                    players = carry + players
+                elif carry:
+                    self._settle(carry, groups, now)
+
+                full = len(players) - len(players) % self.room_size
+                for start in range(0, full, self.room_size):
+                    groups.append([player_name for _, player_name in players[start:start + self.room_size]])
+                carry = players[full:]
+                if carry and carry[0][0] != bucket:
+                    # в остатке игроки прошлой корзины: дальше их везти нельзя
+                    self._settle(carry, groups, now)
+                    carry = []
+            if carry:
+                self._settle(carry, groups, now)
+
+            for bucket in [bucket for bucket, heap in self.queues.items() if not heap]:
+                del self.queues[bucket]
+                del self.sizes[bucket]
+
+        if groups:
+            self.on_match(groups)
+        return groups
+
+    def _settle(self, rest, groups, now):
+        # неполная комната, если хватает игроков, иначе обратно в свои корзины
+        if len(rest) >= self.min_room_size:
+            groups.append([player_name for _, player_name in rest])
+            return
+        for bucket, player_name in rest:
+            seq = next(self.counter)
+            heapq.heappush(self.queues.setdefault(bucket, []), (now - self.max_wait, seq, player_name))
+            self.sizes[bucket] = self.sizes.get(bucket, 0) + 1
+            self.waiting[player_name] = (bucket, seq)
+
+    def export(self):
+        # (игрок, корзина, сколько секунд уже ждет) для передачи новому процессу
+        now = self.clock()
+        with self.lock:
+            return [[player_name, bucket, now - enqueued_at]
+                    for bucket, heap in self.queues.items()
+                    for enqueued_at, seq, player_name in heap
+                    if self.waiting.get(player_name) == (bucket, seq)]
+
+    def restore(self, entries):
+        now = self.clock()
+        with self.lock:
+            for player_name, bucket, waited in entries:
+                seq = next(self.counter)
+                heapq.heappush(self.queues.setdefault(bucket, []), (now - waited, seq, player_name))
+                self.sizes[bucket] = self.sizes.get(bucket, 0) + 1
+                self.waiting[player_name] = (bucket, seq)
+
+    def run(self):
+        self.running = True
+        while self.running:
+            time.sleep(self.tick_interval)
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Ошибка подбора игроков: {e}")
+
+    def stop(self):
+        self.running = False
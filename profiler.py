@@ -0,0 +1,168 @@
+"""Профилирование работающего сервера: выборка стеков и время на блокировках.
+
+Пока профилирование выключено, сервер не делает ничего, кроме проверки
+self.profiler на None. Включенный профилировщик раз в interval секунд
+снимает стеки потоков, которые выполняют команду, и считает ожидание и
+удержание обернутых блокировок с именем команды-владельца. Результат
+пишется в формате collapsed stacks (строка "кадр;кадр;... число"),
+который понимают flamegraph.pl и speedscope.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class TracedLock:
+    """Обертка над Lock/RLock, которая пишет ожидание и удержание в профилировщик.
+
+    Оборачивается тот же объект блокировки, поэтому обертку можно ставить и
+    снимать на ходу: поток, захвативший блокировку через обертку, отпустит
+    ту же самую блокировку.
+    """
+
+    __slots__ = ('lock', 'name', 'profiler', 'held')
+
+    def __init__(self, lock, name, profiler):
+        self.lock = lock
+        self.name = name
+        self.profiler = profiler
+        self.held = {}      # поток -> [глубина захвата, время захвата] для RLock
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        if acquired:
+            now = time.perf_counter()
+            ident = threading.get_ident()
+            entry = self.held.get(ident)
+            if entry is None:
+                self.held[ident] = [1, now]
+                self.profiler.record_lock(self.name, 'wait', now - started)
+            else:
+                entry[0] += 1
+        return acquired
+
+    def release(self):
+        ident = threading.get_ident()
+        entry = self.held.get(ident)
+        if entry is not None:
+            entry[0] -= 1
+            if not entry[0]:
+                del self.held[ident]
+                self.profiler.record_lock(self.name, 'hold', time.perf_counter() - entry[1])
+        self.lock.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Profiler:
+    def __init__(self, interval=0.01, all_threads=False):
+        self.interval = interval
+        self.all_threads = all_threads
+        self.commands = {}          # поток -> команда, которую он сейчас выполняет
+        self.samples = Counter()    # свернутый стек -> число попаданий
+        self.lock_times = Counter() # (блокировка, wait/hold, команда) -> микросекунды
+        self.lock_counts = Counter()
+        self.lock_max = {}
+        self.running = False
+        self.sampler = None
+        self.stats_lock = threading.Lock()
+
+    def start(self):
+        self.running = True
+        self.sampler = threading.Thread(target=self._sample_loop, daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.running = False
+        if self.sampler:
+            self.sampler.join()
+            self.sampler = None
+
+    def enter(self, command):
+        self.commands[threading.get_ident()] = command
+
+    def leave(self):
+        self.commands.pop(threading.get_ident(), None)
+
+    def wrap_lock(self, lock, name):
+        return lock if isinstance(lock, TracedLock) else TracedLock(lock, name, self)
+
+    def record_lock(self, name, kind, seconds):
+        key = (name, kind, self.commands.get(threading.get_ident(), '-'))
+        micros = int(seconds * 1e6)
+        with self.stats_lock:
+            self.lock_times[key] += micros
+            self.lock_counts[key] += 1
+            if micros > self.lock_max.get(key, -1):
+                self.lock_max[key] = micros
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while self.running:
+            time.sleep(self.interval)
+            commands = self.commands
+            frames = sys._current_frames()
+            stacks = []
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                command = commands.get(ident)
+                if command is None:
+                    if not self.all_threads:
+                        continue
+                    if ident not in names:
+                        thread = threading._active.get(ident)
+                        names[ident] = f"[{thread.name if thread else ident}]"
+                    command = names[ident]
+                stacks.append(self._collapse(command, frame))
+            del frames
+
+            with self.stats_lock:
+                for stack in stacks:
+                    self.samples[stack] += 1
+
+    @staticmethod
+    def _collapse(root, frame):
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        parts.append(root)
+        parts.reverse()
+        return ';'.join(parts)
+
+    def collapsed(self):
+        with self.stats_lock:
+            lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+            # ожидание блокировок в микросекундах, тем же форматом отдельным деревом
+            for (name, kind, command), micros in self.lock_times.most_common():
+                lines.append(f"{kind}:{name};{command} {micros}")
+        return lines
+
+    def lock_report(self):
+        with self.stats_lock:
+            rows = []
+            for key, micros in self.lock_times.most_common():
+                name, kind, command = key
+                count = self.lock_counts[key]
+                rows.append(f"{name:8} {kind:5} {command:22} n={count:<8} "
+                            f"сумма={micros / 1000:.1f}мс сред={micros / count:.0f}мкс макс={self.lock_max[key]}мкс")
+        return rows
+
+    def dump(self, prefix):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        stacks_path = f"{prefix}-{stamp}.folded"
+        locks_path = f"{prefix}-{stamp}-locks.txt"
+        with open(stacks_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.collapsed()) + '\n')
+        with open(locks_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.lock_report()) + '\n')
+        return stacks_path, locks_path
@@ -0,0 +1,304 @@
+"""Запись принятых команд комнаты и их воспроизведение через GameRoom.
+
+Каждая партия хранится в отдельном файле .cgr: заголовок с названием
+комнаты и таблицей имен, затем записи фиксированного размера
+(номер, миллисекунды от начала, операция, игрок, id города).
+
+    python replay.py replays/*.cgr              # проверка, как можно быстрее
+    python replay.py --realtime game.cgr        # с исходными паузами
+    python replay.py --bench --synthetic 2000   # замер на партиях ботов
+"""
+import argparse
+import glob
+import os
+import queue
+import struct
+import threading
+import time
+
+(OP_JOIN, OP_LEAVE, OP_START, OP_CITY, OP_SKIP, OP_SERVER_START, OP_FINISH, OP_RESET,
+ OP_RESERVE, OP_RECLAIM) = range(10)
+NO_PLAYER = 0xFFFF
+NO_CITY = 0xFFFF
+
+MAGIC = b'CGR1'
+HEADER = struct.Struct('<4sdHI')    # магия, время начала, число имен, число записей
+RECORD = struct.Struct('<IIBHH')    # номер, мс от начала, операция, игрок, город
+ROTATE_RECORDS = 10000      # запись без ходов длиннее этого начинается заново с текущих игроков
+MAX_RECORDS = 200000        # больше записей в одной партии не хранится, файл обрывается
+
+
+class ReplayWriter:
+    """Поток записи файлов партий: flush под блокировкой комнаты только ставит байты в очередь."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, path, data):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._write_loop, daemon=True)
+                self.thread.start()
+        self.queue.put((path, data))
+
+    def _write_loop(self):
+        while True:
+            path, data = self.queue.get()
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(data)
+            except OSError as e:
+                print(f"Ошибка записи партии {path}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def wait(self):
+        # перед выходом процесса: все поставленные файлы дописаны
+        self.queue.join()
+
+
+WRITER = ReplayWriter()
+
+
+class ReplayRecorder:
+    """Запись одной комнаты, новая партия начинается после каждого сброса.
+
+    Без directory записи остаются только в памяти. Комната, где давно
+    не играли (лобби), копит только приходы и уходы: такую запись комната
+    начинает заново (should_rotate), а партия длиннее MAX_RECORDS
+    обрывается, чтобы память на комнату была ограничена.
+    """
+
+    def __init__(self, directory, room_name, clock=time.monotonic, writer=WRITER):
+        self.directory = directory
+        self.room_name = room_name
+        self.clock = clock
+        self.writer = writer
+        self.game_number = 0
+        self._start_game([])
+
+    def _start_game(self, seated, reserved=()):
+        self.game_number += 1
+        self.started_at = time.time()
+        self.started = self.clock()
+        self.names = []
+        self.name_ids = {}
+        self.records = bytearray()
+        self.seq = 0
+        self.moves = 0
+        self.dropped = 0
+        self.path = None
+        # сидящие за столом игроки переходят в новую партию как присоединившиеся
+        for name in seated:
+            self.record(OP_JOIN, name)
+        for name in reserved:
+            self.record(OP_JOIN, name)
+            self.record(OP_RESERVE, name)
+
+    def record(self, op, player=None, city_id=NO_CITY):
+        if self.seq >= MAX_RECORDS:
+            self.dropped += 1
+            return
+        if player is None:
+            player_id = NO_PLAYER
+        else:
+            player_id = self.name_ids.get(player)
+            if player_id is None:
+                player_id = self.name_ids[player] = len(self.names)
+                self.names.append(player)
+
+        elapsed = int((self.clock() - self.started) * 1000)
+        self.records += RECORD.pack(self.seq, elapsed, op, player_id, city_id)
+        self.seq += 1
+        if op in (OP_START, OP_CITY, OP_SERVER_START):
+            self.moves += 1
+
+    def flush(self):
+        if not self.moves or self.directory is None:
+            return None
+
+        if self.path is None:
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+            self.path = os.path.join(self.directory, f"{stamp}-{id(self):x}-{self.game_number}.cgr")
+
+        room_name = self.room_name.encode('utf-8')
+        data = bytearray(HEADER.pack(MAGIC, self.started_at, len(self.names), self.seq))
+        data += struct.pack('<H', len(room_name)) + room_name
+        for name in self.names:
+            encoded = name.encode('utf-8')
+            data += struct.pack('<H', len(encoded)) + encoded
+        data += self.records
+
+        self.writer.submit(self.path, bytes(data))
+        return self.path
+
+    def should_rotate(self):
+        # без ходов в записи только приходы и уходы, терять нечего
+        return not self.moves and self.seq >= ROTATE_RECORDS
+
+    def new_game(self, seated, reserved=()):
+        self.flush()
+        self._start_game(seated, reserved)
+
+
+class Replay:
+    __slots__ = ('room_name', 'started_at', 'names', 'records')
+
+    def __init__(self, room_name, started_at, names, records):
+        self.room_name = room_name
+        self.started_at = started_at
+        self.names = names
+        self.records = records      # список кортежей (номер, мс, операция, игрок, город)
+
+    @property
+    def moves(self):
+        return sum(1 for record in self.records if record[2] in (OP_START, OP_CITY, OP_SERVER_START))
+
+
+def load_replay(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, started_at, name_count, record_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: не файл записи партии")
+
+    offset = HEADER.size
+    strings = []
+    for _ in range(name_count + 1):
+        (length,) = struct.unpack_from('<H', data, offset)
+        offset += 2
+        strings.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+
+    records = list(RECORD.iter_unpack(data[offset:offset + record_count * RECORD.size]))
+    return Replay(strings[0], started_at, strings[1:], records)
+
+
+def replay_game(replay, room=None, realtime=False, on_step=None):
+    """Прогоняет записанные команды через GameRoom, возвращает (комната, расхождения).
+
+    on_step(room) вызывается после каждой команды.
+    """
+    from server import GameRoom
+
+    if room is None:
+        room = GameRoom(replay.room_name)
+
+    names = replay.names
+    cities = room.dictionary.names
+    mismatches = 0
+    started = time.monotonic()
+
+    for seq, elapsed, op, player, city_id in replay.records:
+        if realtime:
+            delay = elapsed / 1000 - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+        name = names[player] if player != NO_PLAYER else None
+        if op == OP_CITY:
+            ok = room.add_city(name, cities[city_id])[0]
+        elif op == OP_JOIN:
+            ok = room.add_player(name)
+        elif op == OP_LEAVE:
+            ok = room.remove_player(name)
+        elif op == OP_START:
+            ok = room.start_game(name, cities[city_id])[0]
+        elif op == OP_SKIP:
+            ok = room.skip_turn(name)[0]
+        elif op == OP_SERVER_START:
+            ok = room.start_server_game(city_id)
+        elif op == OP_FINISH:
+            room.finish_game()
+            ok = True
+        elif op == OP_RESERVE:
+            ok = room.reserve_seat(name)
+        elif op == OP_RECLAIM:
+            ok = room.reclaim_seat(name)
+        else:
+            room.reset_game()
+            ok = True
+
+        if not ok:
+            mismatches += 1
+        if on_step:
+            on_step(room)
+    return room, mismatches
+
+
+def synthetic_replays(games, players=2, seed=None):
+    # партии ботов, записанные в память без файлов
+    import random
+    from bots import BotPlayer
+    from server import GameRoom
+
+    rng = random.Random(seed)
+    replays = []
+    for _ in range(games):
+        room = GameRoom("Синтетика")
+        recorder = ReplayRecorder(None, room.name)
+        room.recorder = recorder
+        bots = [BotPlayer(f"Бот {i}", 'hard', rng) for i in range(players)]
+        for bot in bots:
+            room.add_bot(bot)
+
+        room.start_server_game(rng.randrange(len(room.dictionary)))
+        passes = 0
+        while passes < players:
+            bot = room.current_bot()
+            city = bot.choose_city(room)
+            if city is None:
+                room.skip_turn(bot.name)
+                passes += 1
+            else:
+                room.add_city(bot.name, city)
+                passes = 0
+        room.finish_game()
+
+        replays.append(Replay(room.name, recorder.started_at, recorder.names,
+                              list(RECORD.iter_unpack(bytes(recorder.records)))))
+    return replays
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных партий")
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--realtime', action='store_true')
+    parser.add_argument('--bench', action='store_true', help="замер ходов в секунду")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--synthetic', type=int, default=0, help="сгенерировать столько партий ботов")
+    args = parser.parse_args()
+
+    paths = [path for pattern in args.files for path in glob.glob(pattern)]
+    replays = [load_replay(path) for path in paths]
+    if args.synthetic:
+        replays += synthetic_replays(args.synthetic)
+
+    if not replays:
+        parser.error("нет партий для воспроизведения")
+
+    from server import GameRoom
+
+    # комнаты собираются до замера: считаем воспроизведение ходов, а не построение индекса словаря
+    runs = [(replay, GameRoom(replay.room_name)) for _ in range(args.repeat) for replay in replays]
+    total_moves = sum(replay.moves for replay, _ in runs)
+    total_records = sum(len(replay.records) for replay, _ in runs)
+    total_mismatches = 0
+    started = time.perf_counter()
+    for replay, room in runs:
+        _, mismatches = replay_game(replay, room, realtime=args.realtime and not args.bench)
+        total_mismatches += mismatches
+    elapsed = time.perf_counter() - started
+
+    print(f"🎞️ Партий: {len(runs)}, ходов: {total_moves}, команд: {total_records}, "
+          f"расхождений: {total_mismatches}")
+    if args.bench:
+        print(f"⚡ {total_moves / elapsed:.0f} ходов/с, {total_records / elapsed:.0f} команд/с ({elapsed:.2f} с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+from array import array
+
+DEPARTED_LIMIT = 1000   # сколько вышедших с очками помнит комната до сброса игры
+
+
+class CitySet:
+    """Использованные города комнаты: порядок ходов и битовая маска по id словаря"""
+
+    __slots__ = ('ids', 'bits')
+
+    def __init__(self, size):
+        self.ids = array('H')
+        self.bits = bytearray((size + 7) // 8)
+
+    def add(self, city_id):
+        self.ids.append(city_id)
+        self.bits[city_id >> 3] |= 1 << (city_id & 7)
+
+    def __contains__(self, city_id):
+        return bool(self.bits[city_id >> 3] & (1 << (city_id & 7)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def clear(self):
+        self.ids = array('H')
+        self.bits = bytearray(len(self.bits))
+
+
+class Player:
+    __slots__ = ('name', 'slot', 'prev', 'next', 'reserved')
+
+    def __init__(self, name, slot):
+        self.name = name
+        self.slot = slot        # номер ячейки в массиве очков
+        self.prev = None        # соседи по кругу хода, None - игрок не за столом
+        self.next = None
+        self.reserved = False   # место держится за отключившимся игроком
+
+
+class PlayerTable:
+    """Игроки комнаты по кругу хода и их очки.
+
+    Круг - двусвязное кольцо: вход, выход и передача хода не зависят от
+    числа игроков. Новый игрок садится в конец круга (перед первым).
+    Отключившийся игрок выходит из круга, но его место остается занятым
+    (reserve), пока он не вернется (reclaim) или не выйдет совсем.
+    Очки вышедших игроков хранятся до сброса игры, но не больше
+    DEPARTED_LIMIT последних; вышедшие без очков забываются сразу, их
+    ячейки в массиве очков достаются следующим игрокам.
+    """
+
+    __slots__ = ('by_name', 'scores', 'head', 'current', 'size', 'reserved', 'departed', 'free', 'capacity')
+
+    def __init__(self, capacity=None):
+        self.by_name = {}
+        self.scores = array('I')
+        self.head = None        # первый по порядку входа, с него идет список игроков
+        self.current = None     # чей сейчас ход
+        self.size = 0
+        self.reserved = {}      # имя -> Player для отключившихся
+        self.departed = {}      # имя -> Player для вышедших с очками, в порядке выхода
+        self.free = []          # свободные ячейки массива очков
+        self.capacity = capacity    # None - без ограничения
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        # за столом или с удержанным местом
+        player = self.by_name.get(name)
+        return player is not None and (player.next is not None or player.reserved)
+
+    def occupied(self):
+        return self.size + len(self.reserved)
+
+    def is_full(self):
+        return self.capacity is not None and self.occupied() >= self.capacity
+
+    def is_seated(self, name):
+        player = self.by_name.get(name)
+        return player is not None and player.next is not None
+
+    def add(self, name):
+        player = self.by_name.get(name)
+        if player is not None and (player.next is not None or player.reserved):
+            return False
+        if self.is_full():
+            return False
+        if player is None:
+            if self.free:
+                player = Player(name, self.free.pop())
+            else:
+                player = Player(name, len(self.scores))
+                self.scores.append(0)
+            self.by_name[name] = player
+        else:
+            del self.departed[name]
+        self._link(player, self.head)
+        return True
+
+    def remove(self, name):
+        player = self.by_name.get(name)
+        if player is None:
+            return False
+        if player.reserved:
+            player.reserved = False
+            del self.reserved[name]
+        elif player.next is None:
+            return False
+        else:
+            self._unlink(player)
+        self._depart(player)
+        return True
+
+    def _depart(self, player):
+        # очки вышедшего нужны итогам партии; без очков или сверх лимита запись удаляется
+        if self.scores[player.slot]:
+            self.departed[player.name] = player
+            if len(self.departed) <= DEPARTED_LIMIT:
+                return
+            player = self.departed.pop(next(iter(self.departed)))
+        del self.by_name[player.name]
+        self.scores[player.slot] = 0
+        self.free.append(player.slot)
+
+    def reserve(self, name):
+        player = self.by_name.get(name)
+        if player is None or player.next is None:
+            return False
+        self._unlink(player)
+        player.reserved = True
+        self.reserved[name] = player
+        return True
+
+    def reclaim(self, name):
+        # вернувшийся игрок ходит последним в текущем круге
+        player = self.reserved.pop(name, None)
+        if player is None:
+            return False
+        player.reserved = False
+        self._link(player, self.current)
+        return True
+
+    def _link(self, player, before):
+        if before is None:
+            player.prev = player.next = player
+            self.head = self.current = player
+        else:
+            player.prev = before.prev
+            player.next = before
+            before.prev.next = player
+            before.prev = player
+        self.size += 1
+
+    def _unlink(self, player):
+        following = player.next
+        if following is player:
+            self.head = self.current = None
+        else:
+            if self.head is player:
+                self.head = following
+            if self.current is player:
+                # ход уходит следующему, как если бы вышедший его пропустил
+                self.current = following
+            player.prev.next = following
+            following.prev = player.prev
+        player.prev = player.next = None
+        self.size -= 1
+
+    def advance(self):
+        if self.current is not None:
+            self.current = self.current.next
+
+    def start_after(self, name):
+        # первым ходит сосед игрока, открывшего партию
+        self.current = self.by_name[name].next
+
+    def rewind(self):
+        self.current = self.head
+
+    def current_name(self):
+        return None if self.current is None else self.current.name
+
+    def name_at(self, seat):
+        # обход от первого игрока, только для инструментов
+        player = self.head
+        for _ in range(seat % self.size):
+            player = player.next
+        return player.name
+
+    def add_score(self, name, points=1):
+        self.scores[self.by_name[name].slot] += points
+
+    def names(self):
+        result = []
+        player = self.head
+        for _ in range(self.size):
+            result.append(player.name)
+            player = player.next
+        return result
+
+    def current_index(self):
+        names = self.names()
+        return names.index(self.current.name) if self.current is not None else 0
+
+    def score_dict(self):
+        scores = self.scores
+        return {name: scores[player.slot] for name, player in self.by_name.items() if scores[player.slot]}
+
+    def export(self):
+        # имена с их очками, круг от первого игрока и удержанные места
+        names = list(self.by_name)
+        return names, [self.scores[self.by_name[name].slot] for name in names], self.names(), list(self.reserved)
+
+    @classmethod
+    def restore(cls, names, scores, seated, reserved=(), current=0, capacity=None):
+        table = cls(capacity)
+        for name, score in zip(names, scores):
+            table.by_name[name] = Player(name, len(table.scores))
+            table.scores.append(score)
+        for name in seated:
+            table._link(table.by_name[name], table.head)
+        for name in reserved:
+            player = table.by_name[name]
+            player.reserved = True
+            table.reserved[name] = player
+        for player in list(table.by_name.values()):
+            if player.next is None and not player.reserved:
+                table._depart(player)
+        if table.size:
+            table.current = table.by_name[table.name_at(current)]
+        return table
+
+    def reset_scores(self):
+        # круг и ячейки оставшихся не меняются: забываются вышедшие, очки обнуляются
+        for name, player in self.departed.items():
+            del self.by_name[name]
+            self.free.append(player.slot)
+        self.departed = {}
+        self.scores = array('I', bytes(len(self.scores) * self.scores.itemsize))
+        self.current = self.head
@@ -0,0 +1,212 @@
+"""Комнаты как акторы: каждая комната закреплена за одним потоком из пула.
+
+Все действия с комнатой выполняет поток-владелец, остальные кладут их в
+его очередь и ждут результат. Комната меняется только одним потоком,
+поэтому блокировка комнаты не нужна (вместо нее NullLock). Потоки пула
+никогда не берут блокировку сервера: ожидать ответа от них можно и
+держа ее.
+
+На сборке без GIL (3.13t и новее) разные комнаты идут на разных ядрах; на
+обычной сборке пул дает только накладные расходы передачи между потоками,
+поэтому по умолчанию он выключен.
+
+    python server.py --room-workers 4
+    python room_workers.py --bench --workers 0,1,2,4,8 --python python3.13t
+"""
+import argparse
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+
+
+class NullLock:
+    """Блокировка-заглушка для комнат, которые меняет только поток-владелец"""
+
+    __slots__ = ()
+
+    def acquire(self, blocking=True, timeout=-1):
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return True
+
+    def __exit__(self, *exc):
+        return False
+
+
+class RoomWorkers:
+    def __init__(self, count):
+        self.count = count
+        self.mailboxes = [queue.SimpleQueue() for _ in range(count)]
+        self.local = threading.local()     # номер пула в потоке-владельце
+        self.threads = []
+        for index in range(count):
+            thread = threading.Thread(target=self._run, args=(index,), daemon=True, name=f"room-worker-{index}")
+            thread.start()
+            self.threads.append(thread)
+
+    def owner(self, room_name):
+        # crc32, а не hash(): владелец не зависит от PYTHONHASHSEED и одинаков после перезапуска
+        return zlib.crc32(room_name.encode('utf-8')) % self.count
+
+    def call(self, room_name, fn, *args):
+        """Выполняет fn(*args) в потоке-владельце комнаты и возвращает результат"""
+        index = self.owner(room_name)
+        if getattr(self.local, 'index', None) == index:
+            return fn(*args)
+        future = Future()
+        self.mailboxes[index].put((future, fn, args))
+        return future.result()
+
+    def _run(self, index):
+        self.local.index = index
+        mailbox = self.mailboxes[index]
+        while True:
+            item = mailbox.get()
+            if item is None:
+                break
+            future, fn, args = item
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def stop(self):
+        # задачи, уже лежащие в очередях, выполняются до конца
+        for mailbox in self.mailboxes:
+            mailbox.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+# замер: ходы в секунду при разном числе потоков комнат
+
+def gil_status():
+    check = getattr(sys, '_is_gil_enabled', None)
+    if check is None:
+        return "GIL"
+    return "GIL" if check() else "без GIL"
+
+
+class RoomDriver:
+    """Два игрока в одной комнате, которые ходят по очереди до конца словаря"""
+
+    def __init__(self, server, room_name, address):
+        from harness import FakeSocket
+
+        self.server = server
+        self.room_name = room_name
+        self.sockets = []
+        self.names = [f"{room_name}/{side}" for side in ('А', 'Б')]
+        for offset, name in enumerate(self.names):
+            client_socket = FakeSocket(('127.0.0.1', address + offset), max_frames=4)
+            self.sockets.append(client_socket)
+            self.command(client_socket, 'join', name)
+            self.command(client_socket, 'join_room', name, room_name=room_name)
+        self.dictionary = server.rooms[room_name].dictionary
+        self.moves = 0
+        self.new_game()
+
+    def command(self, client_socket, command, player_name, **fields):
+        from server import GameProtocol
+
+        line = GameProtocol.create_message('command', command=command, player_name=player_name, **fields)
+        self.server.handle_line(line.rstrip('\n'), client_socket)
+
+    def new_game(self):
+        # ход и последняя буква ведутся здесь же, комната не читается из чужого потока
+        self.used = set()
+        self.turn = 0
+        self.play('start', 0)
+
+    def play(self, command, city_id):
+        self.used.add(city_id)
+        self.command(self.sockets[self.turn], command, self.names[self.turn],
+                     city=self.dictionary.names[city_id])
+        self.letter = self.dictionary.last_letters[city_id]
+        self.turn = 1 - self.turn
+        self.moves += 1
+
+    def step(self):
+        for city_id in self.dictionary.by_letter.get(self.letter, ()):
+            if city_id not in self.used:
+                self.play('add_city', city_id)
+                return
+        self.command(self.sockets[0], 'reset', self.names[0])
+        self.new_game()
+
+
+def measure(workers, rooms, drivers, seconds):
+    from server import CitiesGameServer
+
+    server = CitiesGameServer(port=0, stats_path=None, replay_dir=None, analytics_dir=None, command_rate=None,
+                              room_workers=workers)
+    room_drivers = [RoomDriver(server, f"Стол {i}", 20000 + 2 * i) for i in range(rooms)]
+    stop = threading.Event()
+
+    def drive(own):
+        while not stop.is_set():
+            for driver in own:
+                driver.step()
+
+    threads = [threading.Thread(target=drive, args=(room_drivers[i::drivers],)) for i in range(drivers)]
+    before = sum(driver.moves for driver in room_drivers)
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    moves = sum(driver.moves for driver in room_drivers) - before
+
+    server.bus.close()
+    if server.workers:
+        server.workers.stop()
+    return moves / elapsed
+
+
+def run_benchmark(worker_counts, rooms, drivers, seconds):
+    print(f"🧵 Python {sys.version.split()[0]} ({gil_status()}), ядер {os.cpu_count()}, "
+          f"комнат {rooms}, потоков клиентов {drivers}")
+    baseline = None
+    for workers in worker_counts:
+        rate = measure(workers, rooms, drivers, seconds)
+        baseline = baseline or rate
+        title = "без пула (блокировки комнат)" if workers == 0 else f"потоков комнат {workers}"
+        print(f"  {title:30} {rate:9.0f} ходов/с  x{rate / baseline:4.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Комнаты в пуле потоков: замер ходов в секунду")
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--workers', default='0,1,2,4,8')
+    parser.add_argument('--rooms', type=int, default=64)
+    parser.add_argument('--drivers', type=int, default=8, help="потоков, которые шлют команды")
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--python', action='append', default=[],
+                        help="повторить замер другим интерпретатором (например python3.13t)")
+    args = parser.parse_args()
+
+    if not args.bench:
+        parser.error("пул включается через server.py --room-workers N, здесь только --bench")
+    run_benchmark([int(count) for count in args.workers.split(',')], args.rooms, args.drivers, args.seconds)
+    for python in args.python:
+        print()
+        subprocess.run([python, __file__, '--bench', '--workers', args.workers, '--rooms', str(args.rooms),
+                        '--drivers', str(args.drivers), '--seconds', str(args.seconds)])
+
+
+if __name__ == "__main__":
+    main()
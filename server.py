@@ -1,8 +1,67 @@
+import argparse
+import heapq
+import select
+import signal
 import socket
 import threading
 import json
+import math
+import os
+import random
+import secrets
 import time
 
+from admission import AdmissionControl, TokenBucket
+from analytics import ANALYTICS_EVENTS, AnalyticsExporter, AnalyticsWriter
+from bots import BotPlayer, BOT_DIFFICULTIES
+from city_index import AvailabilityIndex
+from commands import COMMANDS, ERRORS, MAX_LINE_SIZE
+from compression import COMPRESSION, StreamCompressor, build_dictionary, dictionary_id, pack_dictionary
+from dictionaries import DICTIONARIES, RUSSIAN_CITIES as CITIES
+from event_bus import EventBus, RoomEvent
+from federation import SECRET_ENV, Federation, parse_peers
+import handoff
+from matchmaking import Matchmaker
+from profiler import Profiler, TracedLock
+from room_workers import NullLock, RoomWorkers
+from replay import (ReplayRecorder, WRITER as REPLAY_WRITER, OP_JOIN, OP_LEAVE, OP_START, OP_CITY, OP_SKIP,
+                    OP_SERVER_START, OP_FINISH, OP_RESET, OP_RESERVE, OP_RECLAIM)
+from stats_store import StatsStore
+from tournament import Tournament
+from room_state import CitySet, PlayerTable
+import tracing
+from tracing import Tracer
+
+DEFAULT_DICTIONARY = DICTIONARIES.get('ru')
+
+ROOM_EVENT_LOG = 64     # сколько последних изменений комнаты хранится для докачки
+SESSION_GRACE = 120     # секунд на переподключение, после этого игрок выходит из комнаты
+MATCH_ROOM_SIZE = 4     # размер комнат, которые собирает очередь подбора
+MATCH_BUCKET_WIDTH = 100     # разброс уровня игры внутри одной корзины подбора
+ROOM_CAPACITY = 1000    # мест в комнате по умолчанию; "Основная" без ограничения
+STATS_PATH = 'cities_stats.db'
+REPLAY_DIR = 'replays'
+ANALYTICS_DIR = 'analytics'
+LISTEN_BACKLOG = 128            # очередь еще не принятых подключений
+MAX_CONNECTIONS = 1000
+MAX_CONNECTIONS_PER_IP = 16
+COMMAND_RATE = 20               # команд в секунду на подключение
+COMMAND_BURST = 40
+POLL_INTERVAL = 0.5              # как часто потоки чтения и приема проверяют остановку
+LARGE_ROOM = 50                 # с этого числа игроков снимок комнаты дорого рассылать всем
+LOBBY_SNAPSHOT_INTERVAL = 1.0   # входы и выходы в большой комнате рассылаются не чаще, секунд
+MEMBERSHIP_EVENTS = frozenset(('player_joined', 'player_left', 'seat_reserved', 'seat_reclaimed'))
+
+
+def wait_readable(sock, timeout):
+    # select() не принимает дескрипторы больше FD_SETSIZE (1024), а poll() без этого предела
+    if hasattr(select, 'poll'):
+        poller = select.poll()
+        poller.register(sock, select.POLLIN)
+        return bool(poller.poll(timeout * 1000))
+    ready, _, _ = select.select([sock], [], [], timeout)
+    return bool(ready)
+
 
 class GameProtocol:
     @staticmethod
@@ -20,96 +79,205 @@ class GameProtocol:
 
 
 class GameRoom:
-    def __init__(self, room_name):
+    def __init__(self, room_name, dictionary=DEFAULT_DICTIONARY, capacity=None):
         self.name = room_name
-        self.players = []
-        self.used_cities = []
+        self.dictionary = dictionary
+        self.table = PlayerTable(capacity)
+        self.used = CitySet(len(dictionary))
         self.last_letter = None
         self.game_started = False
-        self.current_player_index = 0
         self.lock = threading.Lock()
-        self.player_scores = {}
-
-        self.cities = ["Абакан", "Абу-Даби", "Абуджа", "Авиньон", "Агадир", "Адамстаун", "Аддис-Абеба", "Аден",
-            "Акапулько", "Аккра", "Актобе", "Аланья", "Алжир", "Амман", "Амстердам",
-            "Анадырь", "Анкара", "Анталья", "Антананариву", "Апиа", "Астана", "Асунсьон",
-            "Афины", "Ашхабад", "Баймак", "Багдад", "Бангкок", "Банги", "Банжул", "Барнаул",
-            "Бейрут", "Белград", "Берлин", "Берн", "Бисау", "Бишкек", "Богота",
-            "Бразилиа", "Братислава", "Брюссель", "Будапешт", "Буэнос-Айрес", "Бужумбура",
-            "Вадуц", "Ватикан", "Вашингтон", "Вена", "Венеция", "Вильнюс", "Виндхук",
-            "Варшава", "Вроцлав", "Волгоград", "Вологда", "Воронеж", "Валлетта", "Гавана", "Гамбург", "Гватемала",
-            "Гибралтар", "Гонконг", "Грозный", "Гуанчжоу", "Дакар", "Дакка", "Дели",
-            "Джакарта", "Джидда", "Джорджтаун", "Джуба", "Дублин", "Душанбе", "Дюссельдорф",
-            "Екатеринбург", "Елгава", "Ереван", "Женева", "Житомир", "Загреб", "Занзибар",
-            "Иваново", "Иерусалим", "Ижевск", "Иркутск", "Исламабад", "Стамбул",
-            "Йоханнесбург", "Йошкар-Ола", "Кабул", "Казань", "Каир", "Канберра", "Каракас",
-            "Касабланка", "Катманду", "Киев", "Кишинёв", "Кингстон", "Киншаса",
-            "Копенгаген", "Краков", "Куала-Лумпур", "Лагос", "Лас-Вегас", "Лиссабон",
-            "Лима", "Лондон", "Лос-Анджелес", "Луанда", "Любляна", "Люксембург", "Львов",
-            "Мадрид", "Мале", "Манагуа", "Манила", "Мапуту", "Марракеш", "Маскат",
-            "Мехико", "Милан", "Минск", "Могадишо", "Монако", "Москва", "Мумбаи", "Мюнхен",
-            "Найроби", "Накхичевань", "Нанкин", "Нижний Новогород","Нью-Дели", "Нью-Йорк", "Никосия",
-            "Ниамей", "Норильск", "Нур-Султан", "Одесса", "Окленд", "Омск", "Орландо",
-            "Осло", "Осака", "Ош", "Париж", "Пекин", "Прага", "Пхеньян", "Пномпень",
-            "Порто-Ново", "Порту", "Псков", "Пятигорск", "Рейкьявик", "Рига", "Рим",
-            "Рио-де-Жанейро", "Ростов-на-Дону", "Сан-Марино", "Сан-Паулу", "Сан-Хосе",
-            "Сантьяго", "Самара", "Сеул", "Сингапур", "София", "Стамбул", "Стокгольм",
-            "Сукхум", "Сидней", "Таллин", "Ташкент", "Тбилиси", "Тегеран", "Тирана",
-            "Токио", "Торонто", "Тула", "Тунис", "Улан-Батор", "Ульяновск", "Уфа",
-            "Фамагуста", "Флоренция", "Франкфурт", "Фритаун", "Фукуока", "Хабаровск",
-            "Хартум", "Хельсинки", "Хониара", "Хошимин", "Цюрих", "Чебоксары", "Чикаго",
-            "Чита", "Шанхай", "Шарм-эш-Шейх", "Штутгарт", "Шэньчжэнь", "Эдинбург",
-            "Эль-Кувейт", "Южно-Сахалинск", "Ялта", "Ямусукро", "Янгон", "Ярославль"
-        ]
-
-
-    def get_valid_last_letter(self, city):
-        invalid_letters = {'ь', 'ъ', 'ы'}
-        for letter in reversed(city.lower()):
-            if letter not in invalid_letters:
-                return letter
-        return city[-1].lower()
+        self.bots = {}
+        self._index = None
+        self.recorder = None    # ReplayRecorder, если партии записываются
+        self.bus = None         # EventBus сервера, комнаты без него (replay, simulator) не публикуют
+        self.clock = time.monotonic     # время событий шины, сервер подставляет свои часы
+        self._published_turn = None
+
+        # версия растет при каждом изменении, снимок кодируется заново только при ее смене
+        self.version = 0
+        self._snapshot = None
+        self._snapshot_version = -1
+        self.events = []
+
+    # имена материализуются только при сериализации состояния
+    @property
+    def players(self):
+        return self.table.names()
+
+    @property
+    def used_cities(self):
+        names = self.dictionary.names
+        return [names[city_id] for city_id in self.used.ids]
+
+    @property
+    def player_scores(self):
+        return self.table.score_dict()
+
+    @property
+    def index(self):
+        # индекс доступных городов нужен только ботам, строим его по требованию
+        if self._index is None:
+            index = AvailabilityIndex(self.dictionary)
+            for city_id in self.used.ids:
+                index.use(city_id)
+            self._index = index
+        return self._index
+
+    def player_count(self):
+        return len(self.table)
+
+    def summary(self):
+        # для списков комнат из чужих потоков: читается через in_room
+        with self.lock:
+            return len(self.table), self.game_started
+
+    @property
+    def capacity(self):
+        return self.table.capacity
+
+    def is_full(self):
+        return self.table.is_full()
+
+    def _changed(self, event, **fields):
+        # каждое изменение сохраняется дельтой для переподключившихся,
+        # в JSON она кодируется при первом запросе, а не на каждом ходе
+        if tracing.in_flight:
+            tracing.mark('validate')
+        self.version += 1
+        fields['event'] = event
+        fields['version'] = self.version
+        self.events.append(fields)
+        if len(self.events) > 2 * ROOM_EVENT_LOG:
+            del self.events[:-ROOM_EVENT_LOG]
+
+        if self.bus is not None:
+            at = self.clock()
+            self.bus.publish(RoomEvent(event, self.name, self.version, fields, at))
+            current = fields.get('current_player', self._published_turn)
+            if current != self._published_turn:
+                self._published_turn = current
+                self.bus.publish(RoomEvent('turn_changed', self.name, self.version,
+                                           {'current_player': current}, at))
+            if tracing.in_flight:
+                tracing.mark('enqueue')
+
+    def events_since(self, version):
+        # дельты после version или None, если столько уже не хранится
+        with self.lock:
+            if version == self.version:
+                return []
+            first = self.version - len(self.events) + 1
+            if version > self.version or version < first - 1:
+                return None
+
+            start = version - first + 1
+            for i in range(start, len(self.events)):
+                if isinstance(self.events[i], dict):
+                    self.events[i] = json.dumps(self.events[i])
+            return self.events[start:]
 
     def add_player(self, player_name):
         with self.lock:
-            if player_name not in self.players:
-                self.players.append(player_name)
-                return True
-            return False
+            if self.recorder and self.recorder.should_rotate():
+                self.recorder.new_game(self.table.names(), list(self.table.reserved))
+            if not self.table.add(player_name):
+                return False
+            if self.recorder:
+                self.recorder.record(OP_JOIN, player_name)
+            self._changed('player_joined', player=player_name)
+            return True
+
+    def add_bot(self, bot):
+        with self.lock:
+            if not self.table.add(bot.name):
+                return False
+            if self.recorder:
+                self.recorder.record(OP_JOIN, bot.name)
+            self.bots[bot.name] = bot
+            self._changed('player_joined', player=bot.name)
+            return True
+
+    def current_bot(self):
+        with self.lock:
+            return self.bots.get(self.get_current_player())
+
+    def has_humans(self):
+        # отключившиеся игроки с удержанным местом тоже считаются
+        with self.lock:
+            return self.table.occupied() > len(self.bots)
 
     def remove_player(self, player_name):
         with self.lock:
-            if player_name in self.players:
-                if self.game_started and self.players.index(player_name) == self.current_player_index:
-                    self.next_player()
-                self.players.remove(player_name)
-                if not self.players:
-                    self.reset_game()
+            if player_name in self.table:
+                if self.recorder:
+                    self.recorder.record(OP_LEAVE, player_name)
+                # если ходил вышедший, ход переходит к следующему за ним
+                self.table.remove(player_name)
+                self.bots.pop(player_name, None)
+                if not self.table.occupied():
+                    self._reset_state()
+                self._changed('player_left', player=player_name, current_player=self.get_current_player())
                 return True
             return False
 
+    def reserve_seat(self, player_name):
+        # игрок отключился: круг идет без него, место за ним до конца SESSION_GRACE
+        with self.lock:
+            if not self.table.reserve(player_name):
+                return False
+            if self.recorder:
+                self.recorder.record(OP_RESERVE, player_name)
+            self._changed('seat_reserved', player=player_name, current_player=self.get_current_player())
+            return True
+
+    def reclaim_seat(self, player_name):
+        with self.lock:
+            if not self.table.reclaim(player_name):
+                return False
+            if self.recorder:
+                self.recorder.record(OP_RECLAIM, player_name)
+            self._changed('seat_reclaimed', player=player_name, current_player=self.get_current_player())
+            return True
+
+    def _use_city(self, city_id):
+        self.used.add(city_id)
+        if self._index is not None:
+            self._index.use(city_id)
+        self.last_letter = self.dictionary.last_letters[city_id]
+
     def start_game(self, player_name, city):
         with self.lock:
+            if tracing.in_flight:
+                tracing.mark('lock_wait')
             if self.game_started:
                 return False, "Игра уже начата"
 
-            city_lower = city.lower()
-            if city_lower not in {c.lower() for c in self.cities}:
+            if not self.table.is_seated(player_name):
+                return False, "Вы не в комнате"
+
+            city_id = self.dictionary.lookup(city)
+            if city_id is None:
                 return False, "Город не найден в базе"
 
-            if city_lower in {c.lower() for c in self.used_cities}:
+            if city_id in self.used:
                 return False, "Город уже использован"
 
-            self.used_cities.append(city)
-            self.last_letter = self.get_valid_last_letter(city)
+            if self.recorder:
+                self.recorder.record(OP_START, player_name, city_id)
+            self._use_city(city_id)
             self.game_started = True
-            self.current_player_index = (self.players.index(player_name) + 1) % len(self.players)
-            self.player_scores[player_name] = self.player_scores.get(player_name, 0) + 1
+            self.table.start_after(player_name)
+            self.table.add_score(player_name)
+            self._changed('game_started', player=player_name, city=self.dictionary.names[city_id],
+                          last_letter=self.last_letter, current_player=self.get_current_player())
 
             return True, f"Игра началась! Следующий ход: {self.get_current_player()}. Буква: '{self.last_letter.upper()}'"
 
     def add_city(self, player_name, city):
         with self.lock:
+            if tracing.in_flight:
+                tracing.mark('lock_wait')
             if not self.game_started:
                 return False, "Игра еще не началась"
 
@@ -117,72 +285,294 @@ class GameRoom:
             if player_name != current_player:
                 return False, f"Сейчас ход игрока {current_player}"
 
-            city_lower = city.lower()
-            if city_lower not in {c.lower() for c in self.cities}:
+            city_id = self.dictionary.lookup(city)
+            if city_id is None:
                 return False, "Город не найден в базе"
 
-            if city_lower in {c.lower() for c in self.used_cities}:
+            if city_id in self.used:
                 return False, "Город уже использован"
 
-            if city[0].lower() != self.last_letter:
+            if self.dictionary.first_letters[city_id] != self.last_letter:
                 return False, f"Город должен начинаться на букву '{self.last_letter.upper()}'"
 
-            self.used_cities.append(city)
-            self.last_letter = self.get_valid_last_letter(city)
+            if self.recorder:
+                self.recorder.record(OP_CITY, player_name, city_id)
+            self._use_city(city_id)
             self.next_player()
-            self.player_scores[player_name] = self.player_scores.get(player_name, 0) + 1
-
+            self.table.add_score(player_name)
             next_player = self.get_current_player()
+            self._changed('city_played', player=player_name, city=self.dictionary.names[city_id],
+                          last_letter=self.last_letter, current_player=next_player)
+
             return True, f"Принято! Следующий ход: {next_player}. Буква: '{self.last_letter.upper()}'"
 
+    def start_server_game(self, city_id):
+        # партию открывает сервер (турниры), первым ходит игрок за первым местом
+        with self.lock:
+            if self.game_started or not self.table:
+                return False
+
+            if self.recorder:
+                self.recorder.record(OP_SERVER_START, None, city_id)
+            self._use_city(city_id)
+            self.game_started = True
+            self.table.rewind()
+            self._changed('game_started', player=None, city=self.dictionary.names[city_id],
+                          last_letter=self.last_letter, current_player=self.get_current_player())
+            return True
+
+    def finish_game(self):
+        # итоговые очки, включая игроков без единого хода
+        with self.lock:
+            scores = {name: 0 for name in self.table.names()}
+            scores.update(self.table.score_dict())
+            self.game_started = False
+            if self.recorder:
+                self.recorder.record(OP_FINISH)
+                self.recorder.flush()
+            self._changed('game_over', scores=scores, current_player=self.get_current_player())
+            return scores
+
+    def skip_turn(self, player_name):
+        with self.lock:
+            if not self.game_started:
+                return False, "Игра еще не началась"
+
+            if player_name != self.get_current_player():
+                return False, f"Сейчас ход игрока {self.get_current_player()}"
+
+            if self.recorder:
+                self.recorder.record(OP_SKIP, player_name)
+            self.next_player()
+            self._changed('turn_skipped', player=player_name, current_player=self.get_current_player())
+            return True, f"{player_name} пропускает ход. Следующий ход: {self.get_current_player()}"
+
     def next_player(self):
-        self.current_player_index = (self.current_player_index + 1) % len(self.players)
+        self.table.advance()
 
     def get_current_player(self):
-        if not self.players:
-            return None
-        return self.players[self.current_player_index]
+        return self.table.current_name()
 
     def get_game_state(self):
         with self.lock:
+            return self._build_state()
+
+    def _build_state(self):
+        used_cities = self.used_cities
+        return {
+            'room_name': self.name,
+            'version': self.version,
+            'players': self.table.names(),
+            'reserved': list(self.table.reserved),
+            'capacity': self.table.capacity,
+            'used_cities': used_cities,
+            'last_letter': self.last_letter,
+            'game_started': self.game_started,
+            'current_player': self.get_current_player(),
+            'used_count': len(used_cities),
+            'scores': self.table.score_dict(),
+            'dictionary': self.dictionary.describe()
+        }
+
+    def get_snapshot(self):
+        # готовое сообщение room_state в байтах, общее для всех получателей
+        with self.lock:
+            if self._snapshot_version == self.version:
+                return self._snapshot
+            version = self.version
+            state = self._build_state()
+
+        snapshot = GameProtocol.create_message('room_state', **state).encode('utf-8')
+        with self.lock:
+            if version > self._snapshot_version:
+                self._snapshot = snapshot
+                self._snapshot_version = version
+        return snapshot
+
+    def export(self):
+        # состояние для передачи новому процессу; лог событий не переносится,
+        # отставшие клиенты после этого получат полный снимок
+        with self.lock:
+            names, scores, seated, reserved = self.table.export()
             return {
-                'room_name': self.name,
-                'players': self.players.copy(),
-                'used_cities': self.used_cities.copy(),
-                'last_letter': self.last_letter,
-                'game_started': self.game_started,
-                'current_player': self.get_current_player(),
-                'used_count': len(self.used_cities),
-                'scores': self.player_scores.copy()
+                'name': self.name, 'names': names, 'scores': scores, 'seated': seated,
+                'reserved': reserved, 'capacity': self.table.capacity,
+                'used': list(self.used.ids), 'last_letter': self.last_letter,
+                'game_started': self.game_started, 'current_player_index': self.table.current_index(),
+                'bots': {name: bot.difficulty for name, bot in self.bots.items()},
+                'version': self.version,
+                'dictionary': [self.dictionary.name, self.dictionary.rules.name.rstrip('*'),
+                               ''.join(sorted(self.dictionary.rules.skip_letters)), self.dictionary.rules.min_length],
             }
 
+    def restore(self, state):
+        with self.lock:
+            self.table = PlayerTable.restore(state['names'], state['scores'], state['seated'],
+                                             state.get('reserved', ()), state['current_player_index'],
+                                             state.get('capacity', self.table.capacity))
+            for city_id in state['used']:
+                self.used.add(city_id)
+            self.last_letter = state['last_letter']
+            self.game_started = state['game_started']
+            self.bots = {name: BotPlayer(name, difficulty) for name, difficulty in state['bots'].items()}
+            self.version = state['version']
+
     def reset_game(self):
         with self.lock:
-            self.used_cities = []
-            self.last_letter = None
-            self.game_started = False
-            self.current_player_index = 0
-            self.player_scores = {}
+            if self.recorder:
+                self.recorder.record(OP_RESET)
+            self._reset_state()
+
+    def _reset_state(self):
+        self.used.clear()
+        self._index = None
+        self.last_letter = None
+        self.game_started = False
+        self.table.reset_scores()
+        self.table.rewind()
+        if self.recorder:
+            self.recorder.new_game(self.table.names(), list(self.table.reserved))
+        self._changed('reset', current_player=self.get_current_player())
+
+
+class Session:
+    __slots__ = ('token', 'player_name', 'disconnected_at')
+
+    def __init__(self, player_name):
+        self.token = secrets.token_urlsafe(16)
+        self.player_name = player_name
+        self.disconnected_at = None
 
 
 class CitiesGameServer:
-    def __init__(self, host='localhost', port=8888):
+    def __init__(self, host='localhost', port=8888, stats_path=STATS_PATH, replay_dir=REPLAY_DIR,
+                 backlog=LISTEN_BACKLOG, max_connections=MAX_CONNECTIONS,
+                 max_connections_per_ip=MAX_CONNECTIONS_PER_IP, command_rate=COMMAND_RATE,
+                 command_burst=COMMAND_BURST, threaded_events=True, room_workers=0, room_capacity=ROOM_CAPACITY,
+                 analytics_dir=ANALYTICS_DIR, admin_token=None):
         self.host = host
         self.port = port
         self.rooms = {}
         self.player_rooms = {}
         self.clients = {}
+        self.sessions = {}
+        self.player_sessions = {}
+        self.socket_players = {}
         self.lock = threading.RLock()
+        self.bot_counter = 0
+        self.match_counter = 0
+        self.room_capacity = room_capacity or None     # 0 - комнаты без ограничения мест
+        self.clock = time.monotonic
+        self.deadlines = []             # куча (время, комната) для партий с серверным дедлайном
+        self.game_over_listeners = []   # вызываются как listener(room_name, scores)
+        self.tournaments = {}
+        self.tournament_rooms = set()
+        self.match_rooms = set()        # комнаты подбора, удаляются, когда пустеют
+        self.snapshot_sent = {}         # большая комната -> когда ее снимок ушел из-за входа или выхода
+        self.deferred_snapshots = set()     # большие комнаты, чей снимок ждет LOBBY_SNAPSHOT_INTERVAL
+        self.replay_dir = replay_dir
+        self.analytics_dir = analytics_dir
+        self.stats_path = stats_path
+        self.backlog = backlog
+        self.admission = AdmissionControl(max_connections, max_connections_per_ip)
+        self.command_rate = command_rate      # None отключает ограничение команд
+        self.command_burst = command_burst
+        self.admin_token = admin_token  # None - административных команд нет
+        self.buckets = {}               # сокет -> TokenBucket
+        self.readers = {}               # сокет -> адрес, пока его читает поток handle_client
+        self.detached = {}              # сокет -> (адрес, недочитанные байты) после заморозки
+        self.frozen = False             # состояние передается новому процессу
+        self.stop_reason = None         # 'drain' или 'restart', выставляется обработчиком сигнала
+        self.inherited_socket = False
+        self.profiler = None            # Profiler, пока включено профилирование
+        self.profile_hooks = []         # вызываются как hook(command, seconds) после каждой команды
+        self.tracer = None              # Tracer, пока включена трассировка команд
+        self.federation = None          # Federation, если узел делит лобби с другими
+        self.compressors = {}           # сокет -> StreamCompressor для клиентов, попросивших сжатие
+        self.write_locks = {}           # сокет -> Lock: кадры без сжатия из разных потоков не перемешиваются
+        # с пулом каждая комната меняется только своим потоком, без пула - под своей блокировкой
+        self.workers = RoomWorkers(room_workers) if room_workers else None
+        self.dispatch = {name: getattr(self, spec.handler) for name, spec in COMMANDS.items()}
+        self.errors = {key: error.encode('utf-8') for key, error in ERRORS.items()}
+
+        # без пути статистика не сохраняется
+        self.stats = StatsStore(stats_path) if stats_path else None
+        if self.stats:
+            self.game_over_listeners.append(self.record_stats)
+        self.matchmaker = Matchmaker(self.create_match_rooms, room_size=MATCH_ROOM_SIZE,
+                                     bucket_width=MATCH_BUCKET_WIDTH)
+
+        # рассылка состояния, боты и счетчики получают изменения комнат через шину
+        self.spectators = {}            # комната -> сокеты зрителей
+        self.spectating = {}            # сокет -> комната
+        self.event_counts = {}
+        self.bus = EventBus(threaded=threaded_events)
+        # сети и ботам хватает последнего события комнаты: финальный снимок и ход бота не теряются
+        self.bus.subscribe('network', self.on_room_events, max_delay=0.005, coalesce=True)
+        self.bus.subscribe('bots', self.on_turn_events, types=('turn_changed',), coalesce=True)
+        self.bus.subscribe('metrics', self.on_metric_events, max_delay=0.1)
+        # сыгранные партии для аналитики пишутся пачками раз в секунду, не на пути хода
+        self.analytics = None
+        if analytics_dir:
+            self.analytics = AnalyticsExporter(AnalyticsWriter(analytics_dir, clock=lambda: self.clock()),
+                                               self.describe_room, lambda: self.clock())
+            self.bus.subscribe('analytics', self.analytics.on_events, types=ANALYTICS_EVENTS, max_delay=1.0,
+                               max_queue=100000)
 
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
         self.create_room("Основная")
+        # словарь сжатия одинаков у всех процессов с тем же списком городов
+        self.frame_dictionary = build_dictionary(CITIES, [GameRoom("Основная").get_snapshot().decode('utf-8')])
+        self.frame_dictionary_id = dictionary_id(self.frame_dictionary)
+
+    def new_room(self, room_name, dictionary=DEFAULT_DICTIONARY, capacity=None):
+        # в общую комнату "Основная" попадают все при входе, у нее нет ограничения мест
+        if capacity is None and room_name != "Основная":
+            capacity = self.room_capacity
+        room = GameRoom(room_name, dictionary, capacity)
+        if self.workers:
+            room.lock = NullLock()
+        # записи хранят id городов основного словаря, другие словари не записываются
+        if self.replay_dir and dictionary is DEFAULT_DICTIONARY:
+            room.recorder = ReplayRecorder(self.replay_dir, room_name, self.clock)
+        if self.profiler:
+            room.lock = self.profiler.wrap_lock(room.lock, 'room')
+        room.bus = self.bus
+        # часы читаются при каждом событии: harness подменяет self.clock уже после создания комнат
+        room.clock = lambda: self.clock()
+        self.rooms[room_name] = room
+        return room
+
+    def in_room(self, room, fn, *args):
+        # fn меняет или читает только эту комнату и не берет self.lock
+        if tracing.in_flight:
+            return self.in_room_traced(room, fn, args)
+        if self.workers is None:
+            return fn(*args)
+        return self.workers.call(room.name, fn, *args)
+
+    def in_room_traced(self, room, fn, args):
+        # то же с отметками трассы; в пуле трасса переходит в поток комнаты
+        trace = tracing.current()
+        tracing.mark('dispatch')
+        if self.workers is None:
+            result = fn(*args)
+        elif trace is None:
+            result = self.workers.call(room.name, fn, *args)
+        else:
+            result = self.workers.call(room.name, tracing.run_traced, trace, fn, *args)
+        tracing.mark('room')
+        return result
+
+    def room_players(self, room):
+        return self.in_room(room, lambda: room.players)
 
-    def create_room(self, room_name):
+    def create_room(self, room_name, dictionary=DEFAULT_DICTIONARY, capacity=None):
         with self.lock:
             if room_name not in self.rooms:
-                self.rooms[room_name] = GameRoom(room_name)
+                self.new_room(room_name, dictionary, capacity)
                 print(f"🏠 Создана комната: {room_name}")
                 return True
             return False
@@ -192,109 +582,353 @@ class CitiesGameServer:
             if room_name not in self.rooms:
                 self.create_room(room_name)
 
+            room = self.rooms[room_name]
+            if self.in_room(room, room.is_full):
+                return False, "Комната заполнена"
+
             if player_name in self.player_rooms:
-                old_room = self.player_rooms[player_name]
-                self.rooms[old_room].remove_player(player_name)
-                self.broadcast_room_state(old_room)
+                old_room = self.rooms[self.player_rooms.pop(player_name)]
+                self.in_room(old_room, self.remove_from_room, old_room, player_name)
+                self.drop_empty_room(old_room.name)
 
-            success = self.rooms[room_name].add_player(player_name)
+            success = self.in_room(room, room.add_player, player_name)
             if success:
                 self.player_rooms[player_name] = room_name
-                self.broadcast_room_state(room_name)
                 return True, f"Присоединились к комнате '{room_name}'"
             return False, "Не удалось присоединиться к комнате"
 
+    def send_frame(self, client_socket, data):
+        compressor = self.compressors.get(client_socket)
+        if compressor is None:
+            lock = self.write_locks.get(client_socket) or self.write_locks.setdefault(client_socket,
+                                                                                      threading.Lock())
+            with lock:
+                client_socket.sendall(data)
+        else:
+            compressor.send(client_socket, data)
+
+    def send_to_players(self, players, data, extra_sockets=()):
+        # сокеты берутся под self.lock, а запись идет без него: медленный клиент не держит сервер
+        with self.lock:
+            sockets = [self.clients[player][0] for player in players if player in self.clients]
+            sockets.extend(extra_sockets)
+        for client_socket in sockets:
+            try:
+                self.send_frame(client_socket, data)
+            except:
+                pass
+
     def broadcast_room_state(self, room_name):
-        if room_name not in self.rooms:
+        room = self.rooms.get(room_name)
+        if room is None:
             return
 
-        room_state = self.rooms[room_name].get_game_state()
-        message = GameProtocol.create_message('room_state', **room_state)
+        message, players = self.in_room(room, lambda: (room.get_snapshot(), room.players))
+        with self.lock:
+            watchers = list(self.spectators.get(room_name, ()))
+        self.send_to_players(players, message, watchers)
+
+    def on_room_events(self, events):
+        # несколько изменений одной комнаты в пачке дают один снимок
+        now = self.clock()
+        for event in events:
+            if event.type in MEMBERSHIP_EVENTS and self.defer_snapshot(event.room, now):
+                continue
+            self.broadcast_room_state(event.room)
+
+    def defer_snapshot(self, room_name, now):
+        # поток входов в "Основную" иначе рассылал бы всем полный снимок на каждый вход
+        room = self.rooms.get(room_name)
+        if room is None or self.in_room(room, room.player_count) < LARGE_ROOM:
+            return False
+        with self.lock:
+            if now - self.snapshot_sent.get(room_name, float('-inf')) >= LOBBY_SNAPSHOT_INTERVAL:
+                self.snapshot_sent[room_name] = now
+                return False
+            self.deferred_snapshots.add(room_name)
+            return True
 
+    def send_deferred_snapshots(self, now):
         with self.lock:
-            for player in self.rooms[room_name].players:
-                if player in self.clients:
-                    try:
-                        self.clients[player][0].send(message.encode('utf-8'))
-                    except:
-                        pass
+            due = [room_name for room_name in self.deferred_snapshots
+                   if now - self.snapshot_sent.get(room_name, float('-inf')) >= LOBBY_SNAPSHOT_INTERVAL]
+            for room_name in due:
+                self.deferred_snapshots.discard(room_name)
+                self.snapshot_sent[room_name] = now
+        for room_name in due:
+            self.broadcast_room_state(room_name)
+
+    def on_turn_events(self, events):
+        # чей ход, проверяет play_bots в потоке комнаты: ботов отсюда не читаем
+        for room_name in dict.fromkeys(event.room for event in events):
+            self.run_bots(room_name)
 
-    def handle_client(self, client_socket, address):
-        player_name = None
+    def describe_room(self, room_name):
+        room = self.rooms.get(room_name)
+        return room.dictionary.describe() if room is not None else ''
 
+    def on_metric_events(self, events):
+        counts = self.event_counts
+        for event in events:
+            counts[event.type] = counts.get(event.type, 0) + 1
+
+    def handle_client(self, client_socket, address, buffer=b""):
+        with self.lock:
+            self.readers[client_socket] = address
+        detached = False
         try:
-            buffer = ""
+            skipping = False
             while True:
-                data = client_socket.recv(1024).decode('utf-8')
+                if self.frozen:
+                    # сокет и недочитанные байты достаются новому процессу
+                    with self.lock:
+                        self.detached[client_socket] = (address, buffer)
+                    detached = True
+                    return
+
+                if not wait_readable(client_socket, POLL_INTERVAL):
+                    continue
+                data = client_socket.recv(65536)
                 if not data:
                     break
+                received = time.perf_counter() if self.tracer else None
 
                 buffer += data
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    response = self.process_message(line, client_socket)
-                    if response:
-                        client_socket.send(response.encode('utf-8'))
+                # в хвосте буфера перевода строки нет, длинную строку не пересматриваем на каждом чтении
+                while b'\n' in data and b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    if skipping:
+                        skipping = False
+                        continue
+                    self.handle_line(line.decode('utf-8', errors='replace'), client_socket, received)
+
+                # строка длиннее лимита: отвечаем сразу и пропускаем ее до перевода строки
+                if len(buffer) > MAX_LINE_SIZE:
+                    buffer = b""
+                    if not skipping:
+                        skipping = True
+                        self.send_frame(client_socket, self.errors['too_large'])
 
         except Exception as e:
             print(f"Ошибка с клиентом {address}: {e}")
         finally:
-            if player_name:
-                self.leave_room(player_name)
-                with self.lock:
-                    if player_name in self.clients:
-                        del self.clients[player_name]
+            with self.lock:
+                self.readers.pop(client_socket, None)
+            if not detached:
+                self.disconnect_client(client_socket)
+                client_socket.close()
+                print(f"Отключен: {address}")
+
+    def handle_line(self, line, client_socket, received=None):
+        if len(line) > MAX_LINE_SIZE:
+            self.send_frame(client_socket, self.errors['too_large'])
+            return
 
-            client_socket.close()
-            print(f"Отключен: {address}")
+        if self.command_rate is not None:
+            bucket = self.buckets.get(client_socket)
+            if bucket is None:
+                bucket = self.buckets[client_socket] = TokenBucket(self.command_rate, self.command_burst,
+                                                                   self.clock())
+            if not bucket.take(self.clock()):
+                self.send_frame(client_socket, self.errors['rate_limited'])
+                return
+
+        tracer = self.tracer
+        if tracer is None:
+            response = self.process_message(line, client_socket)
+            if response:
+                self.send_frame(client_socket, response.encode('utf-8'))
+            return
 
-    def process_message(self, message_str, client_socket):
+        # process_message решает, попала ли команда в выборку; трасса живет в потоке до finish
+        response = self.process_message(line, client_socket, received or 0.0)
+        trace = tracing.current() if tracing.in_flight else None
         try:
-            message = GameProtocol.parse_message(message_str)
-            if not message:
-                return GameProtocol.create_message('error', message='Неверный формат сообщения')
-
-            command = message.get('command')
-            player_name = message.get('player_name')
-            room_name = message.get('room_name')
-            city = message.get('city')
-
-            if command == 'join':
-                return self.handle_join(player_name, client_socket)
-            elif command == 'join_room':
-                return self.handle_join_room(player_name, room_name)
-            elif command == 'create_room':
-                return self.handle_create_room(player_name, room_name)
-            elif command == 'list_rooms':
-                return self.handle_list_rooms()
-            elif command == 'start':
-                return self.handle_start(player_name, city)
-            elif command == 'add_city':
-                return self.handle_add_city(player_name, city)
-            elif command == 'reset':
-                return self.handle_reset(player_name)
-            elif command == 'leave':
-                return self.handle_leave(player_name)
-            elif command == 'chat':
-                return self.handle_chat(player_name, message.get('message', ''))
-            else:
-                return GameProtocol.create_message('error', message='Неизвестная команда')
-
+            if response:
+                if trace is not None:
+                    response = tracing.attach_trace_id(response, trace)
+                self.send_frame(client_socket, response.encode('utf-8'))
+        finally:
+            if trace is not None:
+                tracer.finish(trace)
+
+    def process_message(self, message_str, client_socket, received=None):
+        message = GameProtocol.parse_message(message_str)
+        if not isinstance(message, dict):
+            return ERRORS['format']
+
+        spec = COMMANDS.get(message.get('command'))
+        if spec is None:
+            return ERRORS['unknown']
+        if len(message_str) > spec.max_size:
+            return ERRORS['too_large']
+
+        # схема проверяется до вызова обработчика и до любых блокировок
+        args, error = spec.parse_args(message)
+        if error:
+            return error
+        # игрок определяется по подключению, имени в команде не верим
+        player = self.socket_players.get(client_socket)
+        if spec.as_player:
+            if player is None:
+                return ERRORS['not_joined']
+            args.insert(0, player)
+        if spec.pass_socket:
+            args.append(client_socket)
+        tracer = self.tracer
+        if received is not None and tracer is not None:
+            # received 0.0 - время получения неизвестно (команда не из сокета), считаем от разбора
+            # trace=true в команде просит трассу вне выборки
+            tracer.begin(received, spec.name, message, player, self.player_rooms)
+
+        started = time.perf_counter() if self.profile_hooks else None
+        profiler = self.profiler
+        if profiler:
+            profiler.enter(spec.name)
+        try:
+            return self.dispatch[spec.name](*args)
         except Exception as e:
             return GameProtocol.create_message('error', message=f'Ошибка обработки: {str(e)}')
-
-    def handle_join(self, player_name, client_socket):
+        finally:
+            if profiler:
+                profiler.leave()
+            if started is not None:
+                elapsed = time.perf_counter() - started
+                for hook in self.profile_hooks:
+                    hook(spec.name, elapsed)
+
+    def handle_join(self, player_name, redirect_token, compression, dictionary, client_socket):
         with self.lock:
-            if player_name in self.clients:
+            if client_socket in self.socket_players:
+                return GameProtocol.create_message('error', message='Вы уже в игре')
+            if player_name in self.clients or player_name in self.player_sessions:
                 return GameProtocol.create_message('error', message='Игрок с таким именем уже существует')
 
             self.clients[player_name] = (client_socket, 'unknown')
-            success, msg = self.join_room(player_name, "Основная")
+            self.socket_players[client_socket] = player_name
+            session = Session(player_name)
+            self.sessions[session.token] = session
+            self.player_sessions[player_name] = session
+            room_name = "Основная"
+            # игрок пришел с другого узла федерации сразу в выбранную там комнату
+            if redirect_token and self.federation:
+                target = self.federation.verify_token(redirect_token, player_name)
+                if target in self.rooms and not self.in_room(self.rooms[target], self.rooms[target].is_full):
+                    room_name = target
+            success, msg = self.join_room(player_name, room_name)
+
+            extra = {}
+            if compression == COMPRESSION:
+                extra['compression'] = self.frame_dictionary_id
+                if dictionary != self.frame_dictionary_id:
+                    extra['dictionary'] = pack_dictionary(self.frame_dictionary)
+
+            response = GameProtocol.create_message('success',
+                                                   message=f"Игрок {player_name} присоединился. {msg}",
+                                                   room_name=room_name,
+                                                   session_token=session.token,
+                                                   **extra
+                                                   )
+            if not extra:
+                return response
 
-            return GameProtocol.create_message('success',
-                                               message=f"Игрок {player_name} присоединился. {msg}",
-                                               room_name="Основная"
-                                               )
+            # ответ со словарем уходит несжатым раньше любой рассылки: сокет попадет в нее только
+            # после self.lock, а к тому времени сжатие уже включено
+            self.send_frame(client_socket, response.encode('utf-8'))
+            self.compressors[client_socket] = StreamCompressor(self.frame_dictionary)
+            return None
+
+    def handle_resume(self, token, version, room_name, compression, dictionary, client_socket):
+        with self.lock:
+            session = self.sessions.get(token)
+            if session is None:
+                return GameProtocol.create_message('error', message='Сессия не найдена или истекла')
+
+            player_name = session.player_name
+            old_client = self.clients.get(player_name)
+            if old_client and old_client[0] is not client_socket:
+                self.socket_players.pop(old_client[0], None)
+            self.clients[player_name] = (client_socket, 'unknown')
+            self.socket_players[client_socket] = player_name
+            session.disconnected_at = None
+            current_room = self.player_rooms.get(player_name)
+            if current_room is not None:
+                room = self.rooms[current_room]
+                self.in_room(room, room.reclaim_seat, player_name)
+            # словарь у клиента уже есть с прошлого подключения, иначе без сжатия
+            compressed = compression == COMPRESSION and dictionary == self.frame_dictionary_id
+            if compressed:
+                self.compressors[client_socket] = StreamCompressor(self.frame_dictionary)
+
+        ack = {'type': 'resume', 'player_name': player_name, 'room_name': current_room}
+        if compressed:
+            ack['compression'] = self.frame_dictionary_id
+        if current_room is None:
+            return json.dumps(ack) + '\n'
+
+        # пропущенные дельты, если клиент был в той же комнате и лог их еще хранит
+        room = self.rooms[current_room]
+        deltas = None
+        if room_name == current_room and isinstance(version, int):
+            deltas = self.in_room(room, room.events_since, version)
+
+        if deltas is None:
+            self.send_frame(client_socket, self.in_room(room, room.get_snapshot))
+            ack['snapshot'] = True
+            return json.dumps(ack) + '\n'
+
+        return json.dumps(ack)[:-1] + ', "deltas": [' + ', '.join(deltas) + ']}\n'
+
+    def disconnect_client(self, client_socket):
+        # место в комнате сохраняется, пока не истечет SESSION_GRACE
+        self.buckets.pop(client_socket, None)
+        self.compressors.pop(client_socket, None)
+        self.write_locks.pop(client_socket, None)
+        self.stop_spectating(client_socket)
+        with self.lock:
+            player_name = self.socket_players.pop(client_socket, None)
+            if player_name is None:
+                return
+
+            client = self.clients.get(player_name)
+            if client and client[0] is client_socket:
+                del self.clients[player_name]
+
+            session = self.player_sessions.get(player_name)
+            if session is not None:
+                session.disconnected_at = self.clock()
+                room_name = self.player_rooms.get(player_name)
+                if room_name is not None:
+                    room = self.rooms[room_name]
+                    self.in_room(room, room.reserve_seat, player_name)
+
+    def end_session(self, player_name):
+        self.matchmaker.cancel(player_name)
+        with self.lock:
+            session = self.player_sessions.pop(player_name, None)
+            if session is not None:
+                del self.sessions[session.token]
+
+            client = self.clients.get(player_name)
+            if client:
+                self.socket_players.pop(client[0], None)
+
+    def expire_sessions(self):
+        now = self.clock()
+        with self.lock:
+            expired = [session.player_name for session in self.player_sessions.values()
+                       if session.disconnected_at is not None
+                       and now - session.disconnected_at > SESSION_GRACE]
+
+        for player_name in expired:
+            self.leave_room(player_name)
+            self.end_session(player_name)
+
+    def expire_sessions_loop(self):
+        while True:
+            time.sleep(5)
+            if not self.frozen:
+                self.expire_sessions()
 
     def handle_chat(self, player_name, message_text):
         if player_name not in self.player_rooms:
@@ -307,13 +941,7 @@ class CitiesGameServer:
                                                message=message_text,
                                                timestamp=time.strftime("%H:%M:%S"))
 
-        with self.lock:
-            for player in self.rooms[room_name].players:
-                if player in self.clients:
-                    try:
-                        self.clients[player][0].send(chat_msg.encode('utf-8'))
-                    except:
-                        pass
+        self.send_to_players(self.room_players(self.rooms[room_name]), chat_msg.encode('utf-8'))
 
         return GameProtocol.create_message('success', message='Сообщение отправлено')
 
@@ -321,17 +949,49 @@ class CitiesGameServer:
         if not room_name:
             return GameProtocol.create_message('error', message='Укажите название комнаты')
 
+        if room_name not in self.rooms and self.federation:
+            located = self.federation.locate(room_name)
+            if located:
+                return self.redirect(player_name, room_name, *located)
+
         success, msg = self.join_room(player_name, room_name)
         if success:
             return GameProtocol.create_message('success', message=msg, room_name=room_name)
         else:
             return GameProtocol.create_message('error', message=msg)
 
-    def handle_create_room(self, player_name, room_name):
+    def redirect(self, player_name, room_name, node, address):
+        # комната на другом узле: игрок уходит отсюда и входит туда по токену
+        token = self.federation.make_token(player_name, room_name, node)
+        self.leave_room(player_name)
+        self.end_session(player_name)
+        with self.lock:
+            self.clients.pop(player_name, None)
+        print(f"🌐 {player_name} переходит в комнату '{room_name}' на узле {node}")
+        return GameProtocol.create_message('redirect',
+                                           host=address[0],
+                                           port=address[1],
+                                           room_name=room_name,
+                                           node=node,
+                                           redirect_token=token
+                                           )
+
+    def handle_create_room(self, player_name, room_name, dictionary_name, rules, skip_letters, min_length,
+                           capacity):
         if not room_name:
             return GameProtocol.create_message('error', message='Укажите название комнаты')
 
-        success = self.create_room(room_name)
+        if capacity is not None and (capacity < 2 or (self.room_capacity and capacity > self.room_capacity)):
+            return GameProtocol.create_message('error', message=f"Мест в комнате: от 2 до {self.room_capacity}")
+
+        try:
+            dictionary = DICTIONARIES.get(dictionary_name or DEFAULT_DICTIONARY.name, rules, skip_letters, min_length)
+        except (KeyError, ValueError) as e:
+            return GameProtocol.create_message('error', message=e.args[0])
+        if not len(dictionary):
+            return GameProtocol.create_message('error', message='В словаре нет городов по этим правилам')
+
+        success = self.create_room(room_name, dictionary, capacity)
         if success:
             join_success, join_msg = self.join_room(player_name, room_name)
             if join_success:
@@ -341,27 +1001,58 @@ class CitiesGameServer:
                                                    )
         return GameProtocol.create_message('error', message='Комната уже существует')
 
+    def handle_spectate(self, room_name, client_socket):
+        with self.lock:
+            room = self.rooms.get(room_name)
+            if room is None:
+                return GameProtocol.create_message('error', message='Комната не найдена')
+
+            self.stop_spectating(client_socket)
+            self.spectators.setdefault(room_name, set()).add(client_socket)
+            self.spectating[client_socket] = room_name
+
+        self.send_frame(client_socket, self.in_room(room, room.get_snapshot))
+        return GameProtocol.create_message('success', message=f"Вы наблюдаете за комнатой '{room_name}'")
+
+    def stop_spectating(self, client_socket):
+        with self.lock:
+            room_name = self.spectating.pop(client_socket, None)
+            if room_name is not None:
+                watchers = self.spectators[room_name]
+                watchers.discard(client_socket)
+                if not watchers:
+                    del self.spectators[room_name]
+
     def handle_list_rooms(self):
         with self.lock:
             rooms_info = []
             for name, room in self.rooms.items():
+                players, game_started = self.in_room(room, room.summary)
                 rooms_info.append({
                     'name': name,
-                    'players': len(room.players),
-                    'game_started': room.game_started
+                    'players': players,
+                    'game_started': game_started,
+                    'capacity': room.capacity,
+                    'dictionary': room.dictionary.describe()
                 })
 
-            return GameProtocol.create_message('rooms_list', rooms=rooms_info)
+        # комнаты других узлов, кроме одноименных местным (у каждого узла своя "Основная")
+        if self.federation:
+            for node, (name, players, game_started) in self.federation.remote_rooms():
+                if name not in self.rooms:
+                    rooms_info.append({'name': name, 'players': players, 'game_started': game_started,
+                                       'node': node})
+
+        return GameProtocol.create_message('rooms_list', rooms=rooms_info)
 
     def handle_start(self, player_name, city):
         if player_name not in self.player_rooms:
             return GameProtocol.create_message('error', message='Вы не в комнате')
 
-        room_name = self.player_rooms[player_name]
-        success, message = self.rooms[room_name].start_game(player_name, city)
+        room = self.rooms[self.player_rooms[player_name]]
+        success, message = self.in_room(room, room.start_game, player_name, city)
 
         if success:
-            self.broadcast_room_state(room_name)
             return GameProtocol.create_message('success', message=message)
         else:
             return GameProtocol.create_message('error', message=message)
@@ -370,38 +1061,310 @@ class CitiesGameServer:
         if player_name not in self.player_rooms:
             return GameProtocol.create_message('error', message='Вы не в комнате')
 
-        room_name = self.player_rooms[player_name]
-        success, message = self.rooms[room_name].add_city(player_name, city)
+        room = self.rooms[self.player_rooms[player_name]]
+        success, message = self.in_room(room, room.add_city, player_name, city)
 
         if success:
-            self.broadcast_room_state(room_name)
             return GameProtocol.create_message('success', message=message)
         else:
             return GameProtocol.create_message('error', message=message)
 
+    def handle_queue(self, player_name, skill):
+        if player_name not in self.player_sessions:
+            return GameProtocol.create_message('error', message='Сначала присоединитесь к игре')
+
+        if skill is not None and (not isinstance(skill, (int, float)) or not math.isfinite(skill)):
+            return GameProtocol.create_message('error', message='Неверный уровень игры')
+
+        if not self.matchmaker.enqueue(player_name, skill):
+            return GameProtocol.create_message('error', message='Вы уже в очереди')
+
+        return GameProtocol.create_message('success', message='Вы в очереди, подбираем соперников...')
+
+    def handle_leave_queue(self, player_name):
+        if not self.matchmaker.cancel(player_name):
+            return GameProtocol.create_message('error', message='Вы не в очереди')
+        return GameProtocol.create_message('success', message='Вы вышли из очереди')
+
+    def create_match_rooms(self, groups):
+        # комнаты для всей пачки создаются под одной блокировкой
+        created = []
+        with self.lock:
+            for players in groups:
+                players = [player for player in players if player in self.player_sessions]
+                if not players:
+                    continue
+
+                self.match_counter += 1
+                room_name = f"Матч #{self.match_counter}"
+                room = self.new_room(room_name)
+
+                for player in players:
+                    old_room = self.player_rooms.get(player)
+                    if old_room is not None:
+                        old_room = self.rooms[old_room]
+                        self.in_room(old_room, self.remove_from_room, old_room, player)
+                        self.drop_empty_room(old_room.name)
+                    self.in_room(room, room.add_player, player)
+                    self.player_rooms[player] = room_name
+                self.match_rooms.add(room_name)
+                created.append(room_name)
+
+        if created:
+            print(f"🎲 Подбор игроков: создано комнат {len(created)}")
+
+        for room_name in created:
+            notice = GameProtocol.create_message('match_found', room_name=room_name).encode('utf-8')
+            self.send_to_players(self.room_players(self.rooms[room_name]), notice)
+        return created
+
+    def start_tournament_games(self, tables, duration, rng=random):
+        # все партии тура создаются, запускаются и получают дедлайн за один проход
+        left_rooms = set()
+        deadline = self.clock() + duration
+        with self.lock:
+            for room_name, players in tables.items():
+                room = self.new_room(room_name)
+                for player in players:
+                    old_room = self.player_rooms.get(player)
+                    if old_room is not None:
+                        self.in_room(self.rooms[old_room], self.rooms[old_room].remove_player, player)
+                        left_rooms.add(old_room)
+                    self.in_room(room, room.add_player, player)
+                    self.player_rooms[player] = room_name
+                self.in_room(room, room.start_server_game, rng.randrange(len(room.dictionary)))
+                heapq.heappush(self.deadlines, (deadline, room_name))
+
+            # столы прошлого тура после пересадки пустеют, их можно убрать
+            for room_name in left_rooms:
+                self.drop_empty_room(room_name)
+            self.tournament_rooms.update(tables)
+
+    def end_game(self, room_name):
+        room = self.rooms.get(room_name)
+        if room is None:
+            return None
+
+        scores = self.in_room(room, room.finish_game)
+        self.broadcast_to_room(room_name, GameProtocol.create_message('game_over', room_name=room_name,
+                                                                      scores=scores))
+        for listener in self.game_over_listeners:
+            try:
+                listener(room_name, scores)
+            except Exception as e:
+                print(f"Ошибка обработчика конца игры: {e}")
+        return scores
+
+    def record_stats(self, room_name, scores):
+        room = self.rooms.get(room_name)
+        bots = self.in_room(room, lambda: set(room.bots)) if room is not None else ()
+        self.stats.record_game(scores, bots)
+
+    def check_deadlines(self):
+        now = self.clock()
+        due = []
+        with self.lock:
+            while self.deadlines and self.deadlines[0][0] <= now:
+                due.append(heapq.heappop(self.deadlines)[1])
+
+        for room_name in due:
+            self.end_game(room_name)
+        # отложенные снимки больших комнат и смена файла аналитики по времени - с тем же тиком
+        self.send_deferred_snapshots(now)
+        if self.analytics:
+            self.analytics.tick()
+        return due
+
+    def deadlines_loop(self):
+        while True:
+            time.sleep(0.2)
+            if not self.frozen:
+                self.check_deadlines()
+
+    def broadcast_to_room(self, room_name, message):
+        self.send_to_players(self.room_players(self.rooms[room_name]), message.encode('utf-8'))
+
+    def is_admin(self, token):
+        if self.admin_token is None or token is None:
+            return False
+        return secrets.compare_digest(token.encode('utf-8'), self.admin_token.encode('utf-8'))
+
+    def handle_tournament_start(self, name, players, system, rounds, duration, admin_token, client_socket):
+        if not name or not isinstance(players, list):
+            return GameProtocol.create_message('error', message='Укажите название турнира и список игроков')
+        if not all(isinstance(player, str) and player for player in players):
+            return GameProtocol.create_message('error', message='Игроки турнира указываются именами')
+        if len(set(players)) != len(players):
+            return GameProtocol.create_message('error', message='Игроки в списке турнира повторяются')
+
+        with self.lock:
+            requester = self.socket_players.get(client_socket)
+        # имя в команде не проверяется, поэтому участник определяется по подключению
+        if requester not in players and not self.is_admin(admin_token):
+            return GameProtocol.create_message('error',
+                                               message='Начать турнир может его участник или администратор')
+
+        with self.lock:
+            if name in self.tournaments and not self.tournaments[name].finished:
+                return GameProtocol.create_message('error', message='Турнир с таким названием уже идет')
+            missing = [player for player in players if player not in self.player_sessions]
+
+        if missing:
+            return GameProtocol.create_message('error', message=f"Игроки не в сети: {', '.join(missing)}")
+
+        try:
+            tournament = Tournament(self, name, players, system, rounds, duration)
+        except ValueError as e:
+            return GameProtocol.create_message('error', message=str(e))
+
+        with self.lock:
+            self.tournaments[name] = tournament
+        self.game_over_listeners.append(tournament.on_game_over)
+        tournament.start_round()
+        return GameProtocol.create_message('success', message=f"Турнир '{name}' начался")
+
+    def handle_tournament_standings(self, name):
+        tournament = self.tournaments.get(name)
+        if tournament is None:
+            return GameProtocol.create_message('error', message='Турнир не найден')
+
+        standings = [{'player': player, 'points': tournament.points[player],
+                      'cities': tournament.city_points[player]} for player in tournament.standings()]
+        return GameProtocol.create_message('tournament_standings', tournament=name, round=tournament.round,
+                                           finished=tournament.finished, standings=standings)
+
+    def announce_tournament_results(self, tournament):
+        if tournament.on_game_over in self.game_over_listeners:
+            self.game_over_listeners.remove(tournament.on_game_over)
+
+        message = self.handle_tournament_standings(tournament.name).encode('utf-8')
+        self.send_to_players(tournament.players, message)
+        print(f"🏆 Турнир '{tournament.name}' завершен, победитель: {tournament.standings()[0]}")
+
+    def handle_leaderboard(self, limit):
+        if not self.stats:
+            return GameProtocol.create_message('error', message='Статистика отключена')
+        if not 0 < limit <= 100:
+            return GameProtocol.create_message('error', message='Неверный размер таблицы')
+        return GameProtocol.create_message('leaderboard', players=self.stats.top(limit))
+
+    def handle_player_stats(self, target, client_socket):
+        if not self.stats:
+            return GameProtocol.create_message('error', message='Статистика отключена')
+        target = target or self.socket_players.get(client_socket)
+        if target is None:
+            return GameProtocol.create_message('error', message='Укажите игрока')
+        stats = self.stats.player(target)
+        if stats is None:
+            return GameProtocol.create_message('error', message='Игрок еще не сыграл ни одной игры')
+        return GameProtocol.create_message('player_stats', **stats)
+
+    def handle_latency(self, room_name):
+        if self.tracer is None:
+            return GameProtocol.create_message('error', message='Трассировка команд выключена')
+        report = self.tracer.report(room_name)
+        return GameProtocol.create_message('latency', room_name=room_name, sample_every=self.tracer.sample_every,
+                                           slow_ms=self.tracer.slow_ms, **report)
+
+    def handle_add_bot(self, player_name, difficulty):
+        if player_name not in self.player_rooms:
+            return GameProtocol.create_message('error', message='Вы не в комнате')
+
+        if difficulty not in BOT_DIFFICULTIES:
+            return GameProtocol.create_message('error', message='Неизвестная сложность бота')
+
+        room_name = self.player_rooms[player_name]
+        with self.lock:
+            self.bot_counter += 1
+            bot = BotPlayer(f"🤖 Бот {self.bot_counter}", difficulty)
+
+        room = self.rooms[room_name]
+        if not self.in_room(room, room.add_bot, bot):
+            return GameProtocol.create_message('error', message='Не удалось добавить бота')
+
+        return GameProtocol.create_message('success', message=f"{bot.name} ({difficulty}) в игре")
+
+    def run_bots(self, room_name):
+        # боты ходят, пока очередь не дойдет до человека
+        room = self.rooms.get(room_name)
+        if room is None:
+            return
+        self.in_room(room, self.play_bots, room)
+
+    def play_bots(self, room):
+        # пока все люди отключены, боты не играют сами с собой
+        passes = 0
+        while passes < room.player_count() and room.player_count() > len(room.bots):
+            bot = room.current_bot()
+            if bot is None:
+                break
+
+            city = bot.choose_city(room)
+            if city is None:
+                success, _ = room.skip_turn(bot.name)
+                passes += 1
+            else:
+                success, _ = room.add_city(bot.name, city)
+                passes = 0
+
+            if not success:
+                break
+
     def handle_reset(self, player_name):
         if player_name not in self.player_rooms:
             return GameProtocol.create_message('error', message='Вы не в комнате')
 
         room_name = self.player_rooms[player_name]
-        self.rooms[room_name].reset_game()
-        self.broadcast_room_state(room_name)
+        room = self.rooms[room_name]
+        # сброс идущей игры засчитывается как ее окончание
+        if self.in_room(room, lambda: room.game_started):
+            self.end_game(room_name)
+        self.in_room(room, room.reset_game)
 
         return GameProtocol.create_message('success', message='Игра сброшена')
 
     def leave_room(self, player_name):
         with self.lock:
             if player_name in self.player_rooms:
-                room_name = self.player_rooms[player_name]
-                self.rooms[room_name].remove_player(player_name)
-                del self.player_rooms[player_name]
-                self.broadcast_room_state(room_name)
+                room = self.rooms[self.player_rooms.pop(player_name)]
+                self.in_room(room, self.remove_from_room, room, player_name)
+                self.drop_empty_room(room.name)
                 return True
             return False
 
+    def drop_empty_room(self, room_name):
+        # под self.lock: опустевшие комнаты подбора и турнира не копятся, обычные живут дальше
+        if room_name not in self.match_rooms and room_name not in self.tournament_rooms:
+            return False
+        room = self.rooms.get(room_name)
+        if room is None or self.in_room(room, room.player_count):
+            return False
+        # партию тура, даже брошенную, завершает дедлайн, иначе турнир не дождется итогов
+        if room_name in self.tournament_rooms and self.in_room(room, lambda: room.game_started):
+            return False
+
+        if room.recorder:
+            self.in_room(room, room.recorder.flush)
+        del self.rooms[room_name]
+        if self.tracer:
+            self.tracer.forget_room(room_name)
+        self.snapshot_sent.pop(room_name, None)
+        self.deferred_snapshots.discard(room_name)
+        self.match_rooms.discard(room_name)
+        self.tournament_rooms.discard(room_name)
+        return True
+
+    def remove_from_room(self, room, player_name):
+        # боты без людей уходят вместе с последним игроком
+        room.remove_player(player_name)
+        if not room.has_humans():
+            for bot_name in list(room.bots):
+                room.remove_player(bot_name)
+
     def handle_leave(self, player_name):
         success = self.leave_room(player_name)
         if success:
+            self.end_session(player_name)
             with self.lock:
                 if player_name in self.clients:
                     del self.clients[player_name]
@@ -410,40 +1373,315 @@ class CitiesGameServer:
             return GameProtocol.create_message('error', message='Игрок не найден')
 
     def accept_connections(self):
-        while True:
+        while self.stop_reason is None:
             try:
+                if not wait_readable(self.server_socket, POLL_INTERVAL):
+                    continue
                 client_socket, address = self.server_socket.accept()
+                rejected = self.admission.admit(address[0])
+                if rejected:
+                    self.reject_connection(client_socket, rejected)
+                    continue
                 print(f"🔗 Новое подключение: {address}")
 
                 client_thread = threading.Thread(
-                    target=self.handle_client,
+                    target=self.serve_client,
                     args=(client_socket, address),
                     daemon=True
                 )
                 client_thread.start()
 
+            except InterruptedError:
+                continue
             except Exception as e:
                 print(f"Ошибка при приеме подключения: {e}")
                 break
 
-    def start(self):
+    def serve_client(self, client_socket, address, buffer=b""):
+        try:
+            self.handle_client(client_socket, address, buffer)
+        finally:
+            self.admission.release(address[0])
+
+    def reject_connection(self, client_socket, reason):
+        # отказ уходит сразу из потока приема, отдельный поток не создается
         try:
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            client_socket.settimeout(1.0)
+            client_socket.send(self.errors[reason])
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
+
+    def broadcast_all(self, message):
+        with self.lock:
+            players = list(self.clients)
+        self.send_to_players(players, message.encode('utf-8'))
+
+    def drain(self):
+        """Плавная остановка: новых подключений нет, начатые партии засчитываются"""
+        print("🧹 Завершаем работу: доигрываем партии и закрываем подключения")
+        self.stop_profiling()
+        self.stop_reason = self.stop_reason or 'drain'
+        if self.federation:
+            self.federation.stop()
+        self.matchmaker.stop()
+
+        # туры турниров не продолжаются, но очки партий попадают в статистику
+        with self.lock:
+            tournament_listeners = [tournament.on_game_over for tournament in self.tournaments.values()]
+            started = [name for name, room in self.rooms.items() if self.in_room(room, lambda: room.game_started)]
+        self.game_over_listeners = [listener for listener in self.game_over_listeners
+                                    if listener not in tournament_listeners]
+        for room_name in started:
+            self.end_game(room_name)
+        self.bus.flush()
+
+        self.broadcast_all(GameProtocol.create_message('server_shutdown', message='Сервер остановлен'))
+        with self.lock:
+            sockets = [client_socket for client_socket, _ in self.clients.values()]
+        for client_socket in sockets:
+            try:
+                client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        for room in list(self.rooms.values()):
+            if room.recorder:
+                self.in_room(room, room.recorder.flush)
+        REPLAY_WRITER.wait()
+        if self.stats:
+            self.stats.close()
+            self.stats = None
+        if self.analytics:
+            self.analytics.close()
+        self.bus.close()
+        if self.workers:
+            self.workers.stop()
+
+    def hot_restart(self, timeout=handoff.READY_TIMEOUT):
+        """Передает слушающий сокет, клиентов и состояние новому процессу.
+
+        Возвращает True, если новый процесс принял состояние; иначе работа
+        продолжается в этом процессе.
+        """
+        print("♻️ Перезапуск: передаем состояние новому процессу")
+        self.frozen = True
+        self.matchmaker.stop()
+
+        # дожидаемся, пока потоки чтения доработают текущие строки и отпустят сокеты
+        waited = 0.0
+        while self.readers and waited < timeout:
+            time.sleep(0.05)
+            waited += 0.05
+        if self.readers:
+            print("❌ Потоки чтения не остановились, перезапуск отменен")
+            self.thaw()
+            return False
+        # снимки последних изменений уходят клиентам до передачи сокетов
+        self.bus.flush()
+
+        if self.stats:
+            self.stats.close()
+        if self.analytics:
+            # незаконченный файл закрывается, новый процесс начнет свой
+            self.analytics.close()
+        for room in list(self.rooms.values()):
+            if room.recorder:
+                self.in_room(room, room.recorder.flush)
+        REPLAY_WRITER.wait()
+
+        # порт gossip освобождается для нового процесса
+        if self.federation:
+            self.federation.stop()
+
+        state = handoff.export_state(self, self.detached)
+        if handoff.spawn_successor(state, timeout):
+            print("✅ Новый процесс принял состояние")
+            return True
+
+        print("❌ Новый процесс не запустился, продолжаем работу")
+        if self.stats:
+            self.stats = StatsStore(self.stats_path)
+        if state['federation']:
+            self.start_federation(state['federation'])
+        self.thaw()
+        return False
+
+    def thaw(self):
+        self.frozen = False
+        self.stop_reason = None
+        detached, self.detached = self.detached, {}
+        for client_socket, (address, buffer) in detached.items():
+            threading.Thread(target=self.handle_client, args=(client_socket, address, buffer),
+                             daemon=True).start()
+        threading.Thread(target=self.matchmaker.run, daemon=True).start()
+
+    def restore_from(self, state):
+        # вызывается в новом процессе до start()
+        for client_socket, address, buffer in handoff.restore_state(self, state):
+            self.admission.add(address[0])
+            threading.Thread(target=self.serve_client, args=(client_socket, address, buffer),
+                             daemon=True).start()
+        if state.get('federation'):
+            self.start_federation(state['federation'])
+        print(f"♻️ Принято от прежнего процесса: комнат {len(self.rooms)}, "
+              f"подключений {len(state['clients'])}")
+
+    def start_federation(self, config):
+        self.federation = Federation(self, **config)
+        self.federation.start()
+        return self.federation
+
+    def start_profiling(self, interval=0.01, all_threads=False):
+        # блокировки оборачиваются на ходу, сами объекты блокировок не меняются
+        if self.profiler:
+            return self.profiler
+        profiler = Profiler(interval, all_threads)
+        self.lock = profiler.wrap_lock(self.lock, 'server')
+        self.matchmaker.lock = profiler.wrap_lock(self.matchmaker.lock, 'matchmaker')
+        for room in list(self.rooms.values()):
+            room.lock = profiler.wrap_lock(room.lock, 'room')
+        profiler.start()
+        self.profiler = profiler
+        print("🔬 Профилирование включено")
+        return profiler
+
+    def stop_profiling(self, prefix='profile'):
+        profiler, self.profiler = self.profiler, None
+        if profiler is None:
+            return None
+        profiler.stop()
+        self.lock = self.lock.lock
+        self.matchmaker.lock = self.matchmaker.lock.lock
+        for room in list(self.rooms.values()):
+            if isinstance(room.lock, TracedLock):
+                room.lock = room.lock.lock
+        paths = profiler.dump(prefix)
+        print(f"🔬 Профиль сохранен: {', '.join(paths)}")
+        return paths
+
+    def start_tracing(self, tracer=None):
+        # гистограммы и выборка трасс, см. tracing.py
+        if self.tracer is None:
+            self.tracer = tracer or Tracer()
+            sample = (f"1 из {self.tracer.sample_every}" if self.tracer.sample_every
+                      else "только по запросу клиента")
+            print(f"⏱️ Трассировка команд: выборка {sample}, медленные - от {self.tracer.slow_ms} мс")
+        return self.tracer
+
+    def stop_tracing(self):
+        self.tracer = None
+
+    def toggle_profiling(self):
+        if self.profiler:
+            self.stop_profiling()
+        else:
+            self.start_profiling()
+
+    def request_stop(self, reason):
+        # обработчик сигнала только выставляет флаг, поток приема проверяет его
+        self.stop_reason = reason
+
+    def start(self, on_ready=None):
+        for name, reason in (('SIGTERM', 'drain'), ('SIGHUP', 'restart')):
+            if hasattr(signal, name) and threading.current_thread() is threading.main_thread():
+                signal.signal(getattr(signal, name), lambda signum, frame, reason=reason: self.request_stop(reason))
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.toggle_profiling())
+
+        try:
+            if not self.inherited_socket:
+                self.server_socket.bind((self.host, self.port))
+                self.server_socket.listen(self.backlog)
             print(f"🚀 Сервер игры в города запущен на {self.host}:{self.port}")
             print("🏠 Создана комната 'Основная'")
             print("⏳ Ожидаем подключений...")
 
-            self.accept_connections()
+            threading.Thread(target=self.expire_sessions_loop, daemon=True).start()
+            threading.Thread(target=self.matchmaker.run, daemon=True).start()
+            threading.Thread(target=self.deadlines_loop, daemon=True).start()
+            if on_ready:
+                on_ready()
+
+            while True:
+                self.accept_connections()
+                if self.stop_reason != 'restart' or self.hot_restart():
+                    break
 
         except KeyboardInterrupt:
             print("\n🛑 Сервер остановлен")
         except Exception as e:
             print(f"❌ Ошибка сервера: {e}")
         finally:
+            if self.stop_reason == 'restart' and self.frozen:
+                # слушающий сокет и клиенты теперь принадлежат новому процессу
+                return
             self.server_socket.close()
+            self.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер игры в города")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--handoff', help="файл состояния от прежнего процесса при перезапуске")
+    parser.add_argument('--max-connections', type=int, default=MAX_CONNECTIONS)
+    parser.add_argument('--max-per-ip', type=int, default=MAX_CONNECTIONS_PER_IP,
+                        help="подключений с одного адреса (для нагрузки с одной машины поднять)")
+    parser.add_argument('--profile', action='store_true',
+                        help="профилировать с запуска; SIGUSR1 включает и выключает на ходу")
+    parser.add_argument('--node-id', help="имя узла федерации; без него узел работает один")
+    parser.add_argument('--gossip-port', type=int, default=9888)
+    parser.add_argument('--peers', default='', help="соседи по федерации: хост:порт,хост:порт")
+    parser.add_argument('--public-host', help="адрес узла для перехода игроков с других узлов")
+    parser.add_argument('--federation-secret', default=os.environ.get(SECRET_ENV),
+                        help=f"общий секрет узлов для токенов перехода (или {SECRET_ENV})")
+    parser.add_argument('--dictionary', action='append', default=[], metavar='ИМЯ=ФАЙЛ',
+                        help="свой словарь: файл с городом в каждой строке")
+    parser.add_argument('--admin-token', default=os.environ.get('CITIES_ADMIN_TOKEN'),
+                        help="токен административных команд (турниры с чужими игроками)")
+    parser.add_argument('--room-capacity', type=int, default=ROOM_CAPACITY,
+                        help="мест в комнате по умолчанию; 0 - без ограничения")
+    parser.add_argument('--room-workers', type=int, default=0,
+                        help="потоков, между которыми делятся комнаты (для Python без GIL); 0 - без пула")
+    parser.add_argument('--trace', action='store_true',
+                        help="гистограммы задержек по комнатам, выборка трасс и журнал медленных команд")
+    parser.add_argument('--trace-every', type=int, default=tracing.SAMPLE_EVERY,
+                        help="трассировать каждую N-ю команду; 0 - только по запросу клиента")
+    parser.add_argument('--slow-ms', type=float, default=tracing.SLOW_MS,
+                        help="команды дольше стольких мс попадают в журнал медленных")
+    args = parser.parse_args()
+    if args.node_id and not args.federation_secret:
+        parser.error(f"для федерации нужен общий секрет: --federation-secret или {SECRET_ENV}")
+
+    for item in args.dictionary:
+        name, _, path = item.partition('=')
+        DICTIONARIES.load(name, path)
+
+    if args.handoff:
+        state = handoff.load_handoff(args.handoff)
+        server = CitiesGameServer(state['host'], state['port'], **state['options'])
+        if state.get('tracing'):
+            server.start_tracing(Tracer(**state['tracing']))
+        server.restore_from(state)
+        on_ready = lambda: handoff.signal_ready(state)
+    else:
+        server = CitiesGameServer(args.host, args.port, max_connections=args.max_connections,
+                                  max_connections_per_ip=args.max_per_ip, room_workers=args.room_workers,
+                                  room_capacity=args.room_capacity, admin_token=args.admin_token)
+        on_ready = None
+
+    if args.profile:
+        server.start_profiling()
+    if args.trace and not args.handoff:
+        server.start_tracing(Tracer(args.trace_every, args.slow_ms))
+    if args.node_id and not args.handoff:
+        server.start_federation({'node_id': args.node_id, 'host': args.host, 'port': args.gossip_port,
+                                 'peers': parse_peers(args.peers), 'secret': args.federation_secret,
+                                 'public_address': (args.public_host or args.host, args.port)})
+    server.start(on_ready=on_ready)
 
 
 if __name__ == "__main__":
-    server = CitiesGameServer()
-    server.start()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""Офлайн-анализ словаря: массовая симуляция партий и перебор цепочек.
+
+Правила те же, что в GameRoom: город нельзя повторять, следующий город
+начинается на последнюю допустимую букву предыдущего. Игрок, которому
+нечем ходить, проигрывает.
+
+    python simulator.py --games 1000000 --workers 8
+"""
+import argparse
+import random
+import time
+from array import array
+from multiprocessing import Pool
+
+from dictionaries import DICTIONARIES
+
+# тот же словарь, что у комнат сервера по умолчанию, но без загрузки самого сервера
+DEFAULT_DICTIONARY = DICTIONARIES.get('ru')
+
+
+class GameStats:
+    """Счетчики по сыгранным партиям, которые можно складывать между процессами"""
+
+    def __init__(self, city_count, letter_count):
+        self.games = 0
+        self.lengths = array('Q', bytes(8 * (city_count + 1)))
+        self.stuck_letters = array('Q', bytes(8 * letter_count))
+        self.opening_games = array('Q', bytes(8 * city_count))
+        self.opening_moves = array('Q', bytes(8 * city_count))
+        self.opening_wins = array('Q', bytes(8 * city_count))
+
+    def merge(self, other):
+        self.games += other.games
+        for mine, theirs in ((self.lengths, other.lengths),
+                             (self.stuck_letters, other.stuck_letters),
+                             (self.opening_games, other.opening_games),
+                             (self.opening_moves, other.opening_moves),
+                             (self.opening_wins, other.opening_wins)):
+            for i, value in enumerate(theirs):
+                mine[i] += value
+
+    def average_length(self):
+        if not self.games:
+            return 0.0
+        return sum(length * count for length, count in enumerate(self.lengths)) / self.games
+
+    def max_length(self):
+        for length in range(len(self.lengths) - 1, -1, -1):
+            if self.lengths[length]:
+                return length
+        return 0
+
+
+def simulate_games(dictionary, games, players=2, seed=None):
+    rng = random.Random(seed)
+    randrange = rng.randrange
+    first_ids = dictionary.first_letter_ids
+    last_ids = dictionary.last_letter_ids
+    buckets = [list(ids) for ids in dictionary.ids_by_letter]
+    city_count = len(dictionary)
+    stats = GameStats(city_count, len(dictionary.letters))
+
+    for _ in range(games):
+        remaining = [bucket.copy() for bucket in buckets]
+        opening = randrange(city_count)
+        remaining[first_ids[opening]].remove(opening)
+        letter = last_ids[opening]
+        moves = 1
+
+        while True:
+            bucket = remaining[letter]
+            if not bucket:
+                break
+            # случайный ход и удаление за O(1): меняем с последним и обрезаем
+            i = randrange(len(bucket))
+            city_id = bucket[i]
+            bucket[i] = bucket[-1]
+            bucket.pop()
+            letter = last_ids[city_id]
+            moves += 1
+
+        stats.games += 1
+        stats.lengths[moves] += 1
+        stats.stuck_letters[letter] += 1
+        stats.opening_games[opening] += 1
+        stats.opening_moves[opening] += moves
+        # ходить не может игрок moves % players, начинавший - игрок 0
+        if moves % players != 0:
+            stats.opening_wins[opening] += 1
+
+    return stats
+
+
+def _simulate_chunk(args):
+    games, players, seed = args
+    return simulate_games(DEFAULT_DICTIONARY, games, players, seed)
+
+
+def run_simulation(games, workers=None, players=2, chunk_size=20000, seed=None):
+    rng = random.Random(seed)
+    chunks = []
+    left = games
+    while left > 0:
+        size = min(chunk_size, left)
+        chunks.append((size, players, rng.getrandbits(64)))
+        left -= size
+
+    total = GameStats(len(DEFAULT_DICTIONARY), len(DEFAULT_DICTIONARY.letters))
+    with Pool(workers) as pool:
+        for stats in pool.imap_unordered(_simulate_chunk, chunks):
+            total.merge(stats)
+    return total
+
+
+def transition_graph(dictionary):
+    # граф переходов: сколько городов ведет с буквы a на букву b
+    size = len(dictionary.letters)
+    graph = [[0] * size for _ in range(size)]
+    for first, last in zip(dictionary.first_letter_ids, dictionary.last_letter_ids):
+        graph[first][last] += 1
+    return graph
+
+
+def dead_end_letters(dictionary):
+    # буквы, на которые города заканчиваются чаще, чем начинаются
+    graph = transition_graph(dictionary)
+    result = []
+    for letter_id, letter in enumerate(dictionary.letters):
+        outgoing = sum(graph[letter_id])
+        incoming = sum(row[letter_id] for row in graph)
+        if incoming > outgoing:
+            result.append((letter, incoming, outgoing))
+    result.sort(key=lambda item: (item[2] - item[1], item[2]))
+    return result
+
+
+class _ChainFrame:
+    """Узел перебора longest_chain на явном стеке"""
+
+    __slots__ = ('letter', 'used', 'candidates', 'best', 'best_city', 'complete', 'pending')
+
+    def __init__(self, letter, used, candidates, complete):
+        self.letter = letter
+        self.used = used
+        self.candidates = iter(candidates)
+        self.best = 0
+        self.best_city = None
+        self.complete = complete    # False - бюджет кончился, результат только лучший из найденных
+        self.pending = None         # город, в чей перебор ушли сейчас
+
+
+def longest_chain(dictionary, start_city, budget=200000):
+    """Самая длинная цепочка от start_city перебором с мемоизацией.
+
+    Возвращает (цепочка, полный_перебор). Если бюджет узлов исчерпан,
+    цепочка - лучшая из найденных. Перебор идет на явном стеке: глубина
+    цепочки равна числу городов и в большом словаре не влезла бы в рекурсию.
+    """
+    last_ids = dictionary.last_letter_ids
+    ids_by_letter = dictionary.ids_by_letter
+    memo = {}       # (буква, использованные) -> (длина, город), только полностью перебранные
+    partial = {}    # то же для оборванных бюджетом: нужны для сборки цепочки, в перебор не идут
+    nodes = 1
+
+    letter = last_ids[start_city]
+    stack = [_ChainFrame(letter, 1 << start_city, ids_by_letter[letter], nodes <= budget)]
+    root = stack[0]
+    while stack:
+        frame = stack[-1]
+        child = None
+        if frame.complete:
+            used = frame.used
+            for city_id in frame.candidates:
+                bit = 1 << city_id
+                if used & bit:
+                    continue
+                key = (last_ids[city_id], used | bit)
+                known = memo.get(key)
+                if known is not None:
+                    if known[0] >= frame.best:
+                        frame.best = known[0] + 1
+                        frame.best_city = city_id
+                    continue
+                nodes += 1
+                frame.pending = city_id
+                child = _ChainFrame(key[0], key[1], ids_by_letter[key[0]], nodes <= budget)
+                break
+        if child is not None:
+            stack.append(child)
+            continue
+
+        stack.pop()
+        (memo if frame.complete else partial)[frame.letter, frame.used] = (frame.best, frame.best_city)
+        if stack:
+            parent = stack[-1]
+            if frame.best >= parent.best:
+                parent.best = frame.best + 1
+                parent.best_city = parent.pending
+            if not frame.complete:
+                parent.complete = False
+
+    chain = [start_city]
+    used = 1 << start_city
+    letter = last_ids[start_city]
+    while True:
+        entry = memo.get((letter, used)) or partial.get((letter, used))
+        if entry is None or entry[1] is None:
+            break
+        city_id = entry[1]
+        chain.append(city_id)
+        used |= 1 << city_id
+        letter = last_ids[city_id]
+
+    return [dictionary.names[city_id] for city_id in chain], root.complete
+
+
+def print_report(dictionary, stats, elapsed, top=10, chain_budget=200000):
+    print(f"🎲 Сыграно партий: {stats.games} за {elapsed:.1f} с "
+          f"({stats.games / max(elapsed, 1e-9):.0f} партий/с)")
+    print(f"📏 Средняя длина: {stats.average_length():.2f}, максимальная: {stats.max_length()}")
+
+    print("\n🚫 Тупиковые буквы (входит / выходит городов):")
+    for letter, incoming, outgoing in dead_end_letters(dictionary):
+        print(f"  {letter.upper()}: {incoming} / {outgoing}")
+
+    total_stuck = max(sum(stats.stuck_letters), 1)
+    print("\n🧱 На каких буквах заканчиваются партии:")
+    stuck = sorted(range(len(dictionary.letters)), key=lambda i: stats.stuck_letters[i], reverse=True)
+    for letter_id in stuck[:top]:
+        share = 100 * stats.stuck_letters[letter_id] / total_stuck
+        print(f"  {dictionary.letters[letter_id].upper()}: {share:.1f}%")
+
+    print("\n🏁 Лучшие первые ходы (доля побед начинающего):")
+    openings = [i for i in range(len(dictionary)) if stats.opening_games[i]]
+    openings.sort(key=lambda i: stats.opening_wins[i] / stats.opening_games[i], reverse=True)
+    for city_id in openings[:top]:
+        games = stats.opening_games[city_id]
+        print(f"  {dictionary.names[city_id]}: {100 * stats.opening_wins[city_id] / games:.1f}% "
+              f"(в среднем {stats.opening_moves[city_id] / games:.1f} ходов)")
+
+    if openings:
+        chain, exhaustive = longest_chain(dictionary, openings[0], chain_budget)
+        mark = "" if exhaustive else " (бюджет перебора исчерпан)"
+        print(f"\n🔗 Самая длинная цепочка от {chain[0]}: {len(chain)} городов{mark}")
+        print("  " + " → ".join(chain))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция партий в города")
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--chain-budget', type=int, default=200000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = run_simulation(args.games, args.workers, args.players, seed=args.seed)
+    elapsed = time.perf_counter() - started
+    print_report(DEFAULT_DICTIONARY, stats, elapsed, args.top, args.chain_budget)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import sqlite3
+import threading
+from bisect import bisect_left, insort
+
+
+class Leaderboard:
+    """Упорядоченный набор ключей, разбитый на блоки.
+
+    Вставка и удаление трогают один блок, место игрока считается по
+    длинам блоков плюс бинарный поиск внутри блока.
+    """
+
+    BLOCK_SIZE = 512
+
+    def __init__(self):
+        self.blocks = []
+        self.maxes = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _block_for(self, key):
+        i = bisect_left(self.maxes, key)
+        return min(i, len(self.blocks) - 1)
+
+    def add(self, key):
+        self.size += 1
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            return
+
+        i = self._block_for(key)
+        block = self.blocks[i]
+        insort(block, key)
+        self.maxes[i] = block[-1]
+
+        if len(block) > 2 * self.BLOCK_SIZE:
+            half = block[self.BLOCK_SIZE:]
+            del block[self.BLOCK_SIZE:]
+            self.blocks.insert(i + 1, half)
+            self.maxes[i] = block[-1]
+            self.maxes.insert(i + 1, half[-1])
+
+    def remove(self, key):
+        i = self._block_for(key)
+        block = self.blocks[i]
+        j = bisect_left(block, key)
+        if j == len(block) or block[j] != key:
+            raise KeyError(key)
+
+        del block[j]
+        self.size -= 1
+        if block:
+            self.maxes[i] = block[-1]
+        else:
+            del self.blocks[i]
+            del self.maxes[i]
+
+    def rank(self, key):
+        # место с нуля, как если бы key стоял в списке
+        if not self.blocks:
+            return 0
+        i = self._block_for(key)
+        return sum(len(block) for block in self.blocks[:i]) + bisect_left(self.blocks[i], key)
+
+    def top(self, n):
+        result = []
+        for block in self.blocks:
+            for key in block:
+                if len(result) == n:
+                    return result
+                result.append(key)
+        return result
+
+
+class StatsStore:
+    """Пожизненная статистика игроков в SQLite.
+
+    Ответы на запросы идут из памяти, а запись в базу выполняет отдельный
+    поток пачками раз в flush_interval секунд.
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.players = {}       # имя -> [игры, победы, города, лучшая игра]
+        self.leaderboard = Leaderboard()
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+
+        connection = sqlite3.connect(self.path)
+        with connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS player_stats (
+                    name TEXT PRIMARY KEY,
+                    games INTEGER NOT NULL,
+                    wins INTEGER NOT NULL,
+                    cities INTEGER NOT NULL,
+                    best_game INTEGER NOT NULL
+                )
+            """)
+            for name, games, wins, cities, best_game in connection.execute("SELECT * FROM player_stats"):
+                self.players[name] = [games, wins, cities, best_game]
+                self.leaderboard.add(self._key(name))
+        connection.close()
+
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def _key(self, name):
+        games, wins, cities, _ = self.players[name]
+        return (-cities, -wins, name)
+
+    def record_game(self, scores, bots=()):
+        # боты участвуют в выборе победителя, но сами не записываются
+        if not scores:
+            return
+
+        best = max(scores.values())
+        with self.lock:
+            for name, score in scores.items():
+                if name in bots:
+                    continue
+                if name in self.players:
+                    self.leaderboard.remove(self._key(name))
+                else:
+                    self.players[name] = [0, 0, 0, 0]
+
+                stats = self.players[name]
+                stats[0] += 1
+                if score == best and best > 0:
+                    stats[1] += 1
+                stats[2] += score
+                stats[3] = max(stats[3], score)
+                self.leaderboard.add(self._key(name))
+                self.dirty.add(name)
+
+    def top(self, n=10):
+        with self.lock:
+            return [self._row(name) for _, _, name in self.leaderboard.top(n)]
+
+    def player(self, name):
+        with self.lock:
+            if name not in self.players:
+                return None
+            row = self._row(name)
+            row['rank'] = self.leaderboard.rank(self._key(name)) + 1
+            return row
+
+    def _row(self, name):
+        games, wins, cities, best_game = self.players[name]
+        return {'player': name, 'games': games, 'wins': wins, 'cities': cities, 'best_game': best_game}
+
+    def _write_loop(self):
+        connection = sqlite3.connect(self.path)
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+
+            with self.lock:
+                rows = [(name, *self.players[name]) for name in self.dirty]
+                self.dirty = set()
+                closed = self.closed
+
+            if rows:
+                try:
+                    with connection:
+                        connection.executemany("""
+                            INSERT INTO player_stats (name, games, wins, cities, best_game)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT(name) DO UPDATE SET
+                                games = excluded.games, wins = excluded.wins,
+                                cities = excluded.cities, best_game = excluded.best_game
+                        """, rows)
+                except sqlite3.Error as e:
+                    print(f"Ошибка записи статистики: {e}")
+
+            if closed:
+                break
+        connection.close()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.wakeup.set()
+        self.writer.join()
@@ -0,0 +1,43 @@
+"""Допуск подключений и ограничение частоты команд."""
+from admission import AdmissionControl, TokenBucket
+from harness import Harness
+
+
+def test_limits_per_ip_and_total():
+    admission = AdmissionControl(max_connections=3, max_per_ip=2)
+    assert admission.admit('10.0.0.1') is None
+    assert admission.admit('10.0.0.1') is None
+    assert admission.admit('10.0.0.1') == 'too_many_connections'
+    assert admission.admit('10.0.0.2') is None
+    assert admission.admit('10.0.0.3') == 'server_full'
+
+    admission.release('10.0.0.1')
+    assert admission.admit('10.0.0.3') is None
+    assert admission.total == 3
+
+
+def test_restored_connections_count_over_limits():
+    admission = AdmissionControl(max_connections=1, max_per_ip=1)
+    admission.add('10.0.0.1')
+    admission.add('10.0.0.1')
+    assert admission.per_ip['10.0.0.1'] == 2
+    assert admission.admit('10.0.0.2') == 'server_full'
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=2, burst=3, now=0.0)
+    assert [bucket.take(0.0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.take(0.5)
+    assert not bucket.take(0.5)
+    # запас не растет выше burst
+    assert [bucket.take(100.0) for _ in range(4)] == [True, True, True, False]
+
+
+def test_server_rate_limits_commands():
+    harness = Harness(command_rate=1, command_burst=2)
+    client = harness.client('Аня')
+    client.join()
+    assert client.send('list_rooms')['type'] == 'rooms_list'
+    assert client.send('list_rooms')['message'] == 'Слишком много команд, подождите немного'
+    harness.advance(1.0)
+    assert client.send('list_rooms')['type'] == 'rooms_list'
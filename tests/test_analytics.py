@@ -0,0 +1,35 @@
+"""Выгрузка партий: файл закрывается по времени, даже если новых партий нет."""
+import csv
+import gzip
+import os
+
+from analytics import ROTATE_SECONDS
+from harness import Harness
+
+
+def play_one_game(harness):
+    anna, boris = harness.client('Аня'), harness.client('Боря')
+    anna.join()
+    boris.join()
+    assert anna.send('start', city='Москва')['type'] == 'success'
+    assert boris.send('add_city', city='Абакан')['type'] == 'success'
+    # сброс идущей партии засчитывается как ее окончание
+    assert anna.send('reset')['type'] == 'success'
+
+
+def test_idle_file_rotates_on_tick(tmp_path):
+    harness = Harness(analytics_dir=str(tmp_path))
+    play_one_game(harness)
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.part')]
+
+    harness.advance(ROTATE_SECONDS / 2)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.csv.gz')]
+
+    harness.advance(ROTATE_SECONDS / 2)
+    finished = [name for name in os.listdir(tmp_path) if name.endswith('.csv.gz')]
+    assert len(finished) == 1
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.part')]
+    with gzip.open(tmp_path / finished[0], 'rt', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 1
+    assert rows[0]['room'] == 'Основная'
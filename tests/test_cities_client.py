@@ -0,0 +1,61 @@
+"""Клиентская библиотека: разбор кадров от сервера."""
+import asyncio
+import json
+
+import cities_client
+from cities_client import AsyncCitiesClient
+
+
+def serve_frames(frames):
+    async def handle(reader, writer):
+        for frame in frames:
+            writer.write(frame)
+        await writer.drain()
+        await reader.read()     # ждем, пока клиент закроется
+        writer.close()
+    return handle
+
+
+def test_room_state_longer_than_default_readline_limit():
+    players = [f"Игрок с длинным именем {i}" for i in range(2000)]
+    snapshot = json.dumps({'type': 'room_state', 'room_name': 'Основная', 'players': players}) + '\n'
+    assert len(snapshot) > 64 * 1024
+
+    async def run():
+        server = await asyncio.start_server(serve_frames([snapshot.encode('utf-8')]), 'localhost', 0)
+        port = server.sockets[0].getsockname()[1]
+        client = AsyncCitiesClient('Аня', 'localhost', port)
+        await client.connect()
+        for _ in range(200):
+            if client.room_state:
+                break
+            await asyncio.sleep(0.01)
+        await client.close()
+        server.close()
+        await server.wait_closed()
+        return client
+
+    client = asyncio.run(run())
+    assert client.room_state['players'] == players
+
+
+def test_frame_over_limit_fails_pending_commands(monkeypatch):
+    monkeypatch.setattr(cities_client, 'READ_LIMIT', 1024)
+    frame = (json.dumps({'type': 'success', 'message': 'x' * 4096}) + '\n').encode('utf-8')
+
+    async def run():
+        server = await asyncio.start_server(serve_frames([frame]), 'localhost', 0)
+        port = server.sockets[0].getsockname()[1]
+        client = AsyncCitiesClient('Аня', 'localhost', port)
+        await client.connect()
+        try:
+            await asyncio.wait_for(client.command('list_rooms'), 5)
+            outcome = 'answered'
+        except ConnectionError:
+            outcome = 'closed'
+        await client.close()
+        server.close()
+        await server.wait_closed()
+        return outcome
+
+    assert asyncio.run(run()) == 'closed'
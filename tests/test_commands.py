@@ -0,0 +1,74 @@
+"""Разбор команд: схема полей и игрок, привязанный к подключению."""
+from commands import COMMANDS
+from harness import Harness
+
+
+def joined(harness, *names):
+    clients = [harness.client(name) for name in names]
+    for client in clients:
+        client.join()
+    return clients
+
+
+def test_commands_need_join():
+    harness = Harness()
+    stranger = harness.client('Аня')
+    for command in ('leave', 'reset', 'queue', 'chat', 'add_bot'):
+        assert stranger.send(command)['message'] == 'Сначала присоединитесь к игре'
+
+
+def test_player_name_in_command_is_ignored():
+    harness = Harness()
+    anna, boris = joined(harness, 'Аня', 'Боря')
+    boris.name = 'Аня'
+    boris.send('queue')
+    boris.send('leave')
+    # ушел и встал в очередь тот, кто вошел с этого подключения
+    assert 'Аня' in harness.server.player_sessions
+    assert 'Боря' not in harness.server.player_sessions
+    assert 'Аня' not in harness.server.matchmaker.waiting
+
+
+def test_move_is_made_by_connection_owner():
+    harness = Harness()
+    anna, boris = joined(harness, 'Аня', 'Боря')
+    room = harness.server.rooms['Основная']
+    assert anna.send('start', city='Москва')['type'] == 'success'
+    # ход Бори под именем Ани не проходит за Аню
+    anna_score = room.table.score_dict().get('Аня', 0)
+    current = room.get_current_player()
+    other = anna if current == 'Боря' else boris
+    other.name = current
+    response = other.send('add_city', city='Абакан')
+    assert response['type'] == 'error'
+    assert room.table.score_dict().get('Аня', 0) == anna_score
+
+
+def test_second_join_on_same_connection_rejected():
+    harness = Harness()
+    anna, = joined(harness, 'Аня')
+    anna.name = 'Аня-2'
+    assert anna.send('join')['message'] == 'Вы уже в игре'
+    assert 'Аня-2' not in harness.server.player_sessions
+
+
+def test_schema_rejects_wrong_types_and_lengths():
+    spec = COMMANDS['add_bot']
+    assert spec.parse_args({'difficulty': 'hard'}) == (['hard'], None)
+    assert spec.parse_args({}) == (['medium'], None)
+    for bad in (5, ['hard'], 'x' * 17):
+        args, error = spec.parse_args({'difficulty': bad})
+        assert args is None
+        assert "'difficulty'" in error
+
+    # bool - подкласс int, но числом не считается
+    args, error = COMMANDS['leaderboard'].parse_args({'limit': True})
+    assert args is None
+
+
+def test_unknown_and_malformed_commands():
+    harness = Harness()
+    client = harness.client('Аня')
+    assert client.send('fly')['message'] == 'Неизвестная команда'
+    harness.server.handle_line('не json', client.socket)
+    assert client.last('error')['message'] == 'Неверный формат сообщения'
@@ -0,0 +1,64 @@
+"""Сжатие кадров: поток deflate со словарем разжимается клиентом в те же байты."""
+import json
+
+from compression import (COMPRESS_THRESHOLD, COMPRESSION, FRAME_HEADER, STREAM_START, StreamCompressor,
+                         StreamDecompressor, build_dictionary, dictionary_id, pack_dictionary, unpack_dictionary)
+from dictionaries import RUSSIAN_CITIES
+from harness import Harness
+
+
+def split_frames(data, decompressor):
+    # строки JSON и сжатые кадры чередуются, как их разбирает клиент
+    frames = []
+    while data:
+        if data[:1] == b'{':
+            line, data = data.split(b'\n', 1)
+            frames.append(line + b'\n')
+            continue
+        marker, length = FRAME_HEADER.unpack_from(data)
+        payload = data[FRAME_HEADER.size:FRAME_HEADER.size + length]
+        data = data[FRAME_HEADER.size + length:]
+        frames.append(decompressor.decode(marker, payload))
+    return frames
+
+
+def test_stream_round_trip():
+    zdict = build_dictionary(RUSSIAN_CITIES)
+    compressor, decompressor = StreamCompressor(zdict), StreamDecompressor(zdict)
+    frames = [json.dumps({'type': 'room_state', 'used_cities': RUSSIAN_CITIES[:n]}, ensure_ascii=False)
+              .encode('utf-8') + b'\n' for n in range(1, 40)]
+    frames.append(b'{"type": "pong"}\n')
+    wire = b''.join(compressor.encode(frame) for frame in frames)
+    assert split_frames(wire, decompressor) == frames
+    # соседние снимки ссылаются друг на друга внутри потока
+    assert compressor.bytes_out < compressor.bytes_in / 4
+
+
+def test_short_frames_stay_plain():
+    compressor = StreamCompressor(b'')
+    frame = b'{"type": "ok"}\n'
+    assert len(frame) < COMPRESS_THRESHOLD
+    assert compressor.encode(frame) == frame
+    assert compressor.compressor is None
+
+
+def test_dictionary_travels_in_join_reply():
+    zdict = build_dictionary(RUSSIAN_CITIES)
+    assert unpack_dictionary(pack_dictionary(zdict)) == zdict
+
+    harness = Harness()
+    client = harness.client('Аня')
+    reply = client.send('join', compression=COMPRESSION)
+    assert reply['compression'] == dictionary_id(harness.server.frame_dictionary)
+    received = unpack_dictionary(reply['dictionary'])
+    assert received == harness.server.frame_dictionary
+
+    # снимки комнаты после ответа идут сжатыми кадрами одного потока
+    harness.server.broadcast_room_state('Основная')
+    client.drain()
+    wire = b''.join(client.frames)
+    assert wire[wire.index(b'\n') + 1:][:1] == STREAM_START
+    frames = split_frames(wire, StreamDecompressor(received))
+    assert json.loads(frames[0])['type'] == 'success'
+    assert [json.loads(frame)['type'] for frame in frames[1:]] == ['room_state'] * (len(frames) - 1)
+    assert len(frames) >= 3
@@ -0,0 +1,49 @@
+"""Реестр словарей: свои правила клиента проверяются и не копятся без предела."""
+import pytest
+
+from dictionaries import MAX_VARIANTS, DictionaryRegistry
+from harness import Harness
+
+CITIES = ["Абакан", "Нарва", "Астана", "Анкара", "Рим", "Москва"]
+
+
+@pytest.fixture
+def registry():
+    registry = DictionaryRegistry()
+    registry.register('test', CITIES, 'classic')
+    return registry
+
+
+def test_named_profile_compiled_once(registry):
+    assert registry.get('test') is registry.get('test', 'classic')
+
+
+def test_bad_rules_rejected(registry):
+    for skip_letters, min_length in (('абвгдеж', None), ('1', None), (None, 0), (None, 100)):
+        with pytest.raises(ValueError):
+            registry.get('test', 'classic', skip_letters, min_length)
+
+
+def test_empty_variant_not_cached(registry):
+    assert not len(registry.get('test', 'classic', None, 10))
+    assert not registry.variants
+
+
+def test_variants_bounded_lru(registry):
+    first = registry.get('test', 'strict', 'а', 2)
+    letters = 'бвгдежзийклмнопрстуфхцчшщ'
+    for i in range(2 * MAX_VARIANTS):
+        registry.get('test', 'strict', letters[i % len(letters)] + letters[i // len(letters)])
+        # первый вариант нужен постоянно и не вытесняется
+        assert registry.get('test', 'strict', 'а', 2) is first
+    assert len(registry.variants) == MAX_VARIANTS
+
+
+def test_create_room_reports_bad_rules():
+    harness = Harness()
+    player = harness.client('Аня')
+    player.join()
+    response = player.send('create_room', room_name='Своя', min_length=1000)
+    assert response['type'] == 'error'
+    assert 'длина' in response['message']
+    assert 'Своя' not in harness.server.rooms
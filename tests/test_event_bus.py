@@ -0,0 +1,58 @@
+"""Шина событий: пачки, переполнение и подписчики с coalesce."""
+import threading
+
+from event_bus import EventBus, RoomEvent
+
+
+def event(event_type, room, version=1):
+    return RoomEvent(event_type, room, version, {'current_player': f"игрок {version}"}, 0.0)
+
+
+def collect(bus, **options):
+    batches = []
+    bus.subscribe('test', batches.append, **options)
+    return batches
+
+
+def test_batches_and_type_filter():
+    bus = EventBus(threaded=False)
+    batches = collect(bus, types=('city_played',), max_batch=2)
+    for version in range(5):
+        bus.publish(event('city_played', 'Комната', version))
+        bus.publish(event('chat', 'Комната', version))
+    bus.flush()
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert all(item.type == 'city_played' for batch in batches for item in batch)
+
+
+def test_overflow_drops_oldest():
+    bus = EventBus(threaded=False)
+    batches = collect(bus, max_queue=3)
+    for version in range(5):
+        bus.publish(event('city_played', 'Комната', version))
+    bus.flush()
+    assert [item.version for item in batches[0]] == [2, 3, 4]
+    assert bus.stats()['test']['dropped'] == 2
+
+
+def test_coalesce_keeps_last_event_of_every_room():
+    bus = EventBus(threaded=False)
+    batches = collect(bus, max_queue=3, coalesce=True)
+    for version in range(1000):
+        bus.publish(event('city_played', f"Комната {version % 10}", version))
+    bus.publish(event('game_over', 'Комната 3', 1000))
+    bus.flush()
+    delivered = {item.room: item for batch in batches for item in batch}
+    assert len(delivered) == 10
+    assert delivered['Комната 3'].type == 'game_over'
+    assert delivered['Комната 9'].version == 999
+    assert bus.stats()['test']['dropped'] == 0
+
+
+def test_threaded_delivery():
+    bus = EventBus()
+    received = threading.Event()
+    bus.subscribe('test', lambda batch: received.set(), coalesce=True)
+    bus.publish(event('turn_changed', 'Комната'))
+    assert received.wait(2.0)
+    bus.close()
@@ -0,0 +1,66 @@
+"""Федерация: подпись gossip и токены перехода."""
+import json
+import socket
+import threading
+
+from federation import Federation
+from harness import Harness
+
+
+def node(node_id, secret='общий секрет'):
+    return Federation(Harness().server, node_id, secret=secret)
+
+
+def gossip(rooms, node_id='b', seq=1):
+    return json.dumps({'type': 'gossip', 'from': node_id, 'beats': {node_id: 1},
+                       'states': [{'node': node_id, 'seq': seq, 'address': ['localhost', 8889],
+                                   'rooms': rooms}]}).encode('utf-8')
+
+
+def feed(federation, *lines):
+    # строки проходят через тот же цикл чтения, что и с сокета соседа
+    ours, theirs = socket.socketpair()
+    federation.running = True
+    reader = threading.Thread(target=federation._read_loop, args=(ours,))
+    reader.start()
+    theirs.sendall(b''.join(lines))
+    theirs.close()
+    reader.join(5)
+
+
+def test_signed_gossip_accepted():
+    a, b = node('a'), node('b')
+    feed(a, b.seal(gossip([['Комната', 2, False]])))
+    assert a.locate('Комната') == ('b', ['localhost', 8889])
+
+
+def test_unsigned_and_foreign_gossip_dropped():
+    a, stranger = node('a'), node('c', secret='чужой секрет')
+    body = gossip([['Комната', 2, False]])
+    feed(a, body + b'\n', b'0' * 64 + b' ' + body + b'\n', stranger.seal(body))
+    assert a.locate('Комната') is None
+    assert 'b' not in a.nodes
+
+
+def test_tampered_gossip_dropped():
+    a, b = node('a'), node('b')
+    line = b.seal(gossip([['Комната', 2, False]]))
+    feed(a, line.replace('Комната'.encode('utf-8'), 'Ловушка'.encode('utf-8')))
+    assert a.locate('Ловушка') is None
+
+
+def test_malformed_payload_does_not_stop_reader():
+    a, b = node('a'), node('b')
+    feed(a, b.seal(b'[1, 2, 3]'), b.seal(b'"gossip"'),
+         b.seal(json.dumps({'type': 'gossip', 'beats': [], 'states': []}).encode('utf-8')),
+         b.seal(gossip([['Комната', 2, False]])))
+    assert a.locate('Комната') == ('b', ['localhost', 8889])
+
+
+def test_redirect_token_bound_to_player_and_node():
+    a, b = node('a'), node('b')
+    token = a.make_token('Аня', 'Комната', 'b')
+    assert b.verify_token(token, 'Аня') == 'Комната'
+    assert b.verify_token(token, 'Боря') is None
+    assert a.verify_token(token, 'Аня') is None
+    assert node('c', secret='чужой секрет').verify_token(token, 'Аня') is None
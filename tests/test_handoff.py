@@ -0,0 +1,86 @@
+"""Горячий перезапуск: состояние через JSON поднимается в свежем сервере."""
+import json
+import socket
+import time
+
+import pytest
+
+import handoff
+from dictionaries import DICTIONARIES
+from harness import Harness
+
+CUSTOM_CITIES = ["Альфа", "Арбат", "Тула", "Тверь", "Рим"]
+
+
+def successor_state(server, detached=None):
+    # как в spawn_successor: состояние проходит через JSON, сокеты
+    # переходят к новому серверу, старые объекты их больше не закрывают
+    state = json.loads(json.dumps(handoff.export_state(server, detached or {})))
+    server.server_socket.detach()
+    for client_socket in detached or ():
+        client_socket.detach()
+    return state
+
+
+@pytest.fixture
+def custom_dictionary(tmp_path):
+    path = tmp_path / 'custom.txt'
+    path.write_text('# свой словарь\n' + '\n'.join(CUSTOM_CITIES) + '\n', encoding='utf-8')
+    DICTIONARIES.load('custom', str(path))
+    yield 'custom'
+    DICTIONARIES.sources.pop('custom', None)
+    DICTIONARIES.loaded.discard('custom')
+
+
+def test_custom_dictionary_survives_restart(custom_dictionary):
+    old = Harness()
+    player = old.client('Аня')
+    player.join()
+    assert player.send('create_room', room_name='Своя', dictionary=custom_dictionary)['type'] == 'success'
+    assert player.send('start', city='Тула')['type'] == 'success'
+    state = successor_state(old.server)
+
+    # новый процесс: в его аргументах --dictionary нет
+    DICTIONARIES.sources.pop(custom_dictionary)
+    DICTIONARIES.loaded.discard(custom_dictionary)
+
+    new = Harness()
+    try:
+        handoff.restore_state(new.server, state)
+        room = new.server.rooms['Своя']
+        assert room.dictionary.name == custom_dictionary
+        assert room.dictionary.names == DICTIONARIES.get(custom_dictionary).names
+        assert room.get_game_state()['used_cities'] == ['Тула']
+        # и следующий перезапуск снова его унесет
+        assert custom_dictionary in handoff.export_state(new.server, {})['dictionaries']
+    finally:
+        new.server.server_socket.close()
+
+
+def test_options_and_admission_survive_restart():
+    old = Harness(max_connections=50, max_connections_per_ip=3, command_rate=5, command_burst=7,
+                  room_capacity=10)
+    server_side, client_side = socket.socketpair()
+    old.server.socket_players[server_side] = 'Аня'
+    state = successor_state(old.server, {server_side: (('10.0.0.1', 5000), b'')})
+
+    # так main собирает сервер в новом процессе
+    new = Harness(**state['options'])
+    try:
+        assert new.server.admission.max_connections == 50
+        assert new.server.admission.max_per_ip == 3
+        assert (new.server.command_rate, new.server.command_burst) == (5, 7)
+        assert new.server.room_capacity == 10
+
+        new.server.restore_from(state)
+        assert new.server.admission.total == 1
+        assert new.server.admission.per_ip == {'10.0.0.1': 1}
+
+        # отключение перенесенного клиента освобождает место
+        client_side.close()
+        deadline = time.monotonic() + 5
+        while new.server.admission.total and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert new.server.admission.total == 0
+    finally:
+        new.server.server_socket.close()
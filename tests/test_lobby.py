@@ -0,0 +1,36 @@
+"""Рассылка снимков "Основной": поток входов не рассылает всем полный снимок на каждый вход."""
+from harness import Harness
+from server import LARGE_ROOM, LOBBY_SNAPSHOT_INTERVAL
+
+
+def lobby_players(client):
+    state = client.last('room_state')
+    return len(state['players']) if state else 0
+
+
+def test_join_storm_sends_few_snapshots():
+    harness = Harness(max_frames=1000)
+    clients = [harness.client(f"Игрок {i}") for i in range(4 * LARGE_ROOM)]
+    for client in clients:
+        client.join()
+
+    # пока комната маленькая, снимок уходит на каждый вход, потом - раз в интервал
+    first = clients[0]
+    assert len(first.messages('room_state')) <= LARGE_ROOM + 1
+    assert lobby_players(clients[-1]) < len(clients)
+
+    harness.advance(LOBBY_SNAPSHOT_INTERVAL)
+    assert all(lobby_players(client) == len(clients) for client in clients)
+
+
+def test_game_events_in_large_room_are_not_deferred():
+    harness = Harness(max_frames=1000)
+    clients = [harness.client(f"Игрок {i}") for i in range(2 * LARGE_ROOM)]
+    for client in clients:
+        client.join()
+    harness.advance(LOBBY_SNAPSHOT_INTERVAL)
+
+    room = harness.server.rooms['Основная']
+    city = room.dictionary.names[0]
+    assert clients[0].send('start', city=city)['type'] == 'success'
+    assert clients[-1].last('room_state')['game_started']
@@ -0,0 +1,71 @@
+"""Очередь подбора: корзины по уровню игры и комнаты матчей."""
+from harness import FakeClock, Harness
+from matchmaking import Matchmaker
+
+
+def matchmaker(**options):
+    clock = FakeClock()
+    matched = []
+    options.setdefault('bucket_width', 100)
+    return Matchmaker(matched.extend, clock=clock, **options), clock, matched
+
+
+def test_players_of_one_level_share_a_room():
+    queue, clock, matched = matchmaker(room_size=2)
+    for name, skill in (('Аня', 10), ('Боря', 950), ('Вика', 50), ('Гена', 990)):
+        queue.enqueue(name, skill)
+    queue.tick()
+    assert sorted(sorted(group) for group in matched) == [['Аня', 'Вика'], ['Боря', 'Гена']]
+
+
+def test_overdue_players_merge_with_neighbour_bucket_only():
+    queue, clock, matched = matchmaker(room_size=4, max_wait=30)
+    queue.enqueue('Аня', 10)       # корзина 0
+    queue.enqueue('Боря', 150)     # корзина 1, соседняя
+    queue.enqueue('Вика', 950)     # корзина 9, далеко
+    clock.advance(31)
+    queue.tick()
+    assert matched == [['Аня', 'Боря']]
+    assert queue.waiting['Вика'][0] == 9
+
+
+def test_remainder_does_not_travel_two_buckets():
+    queue, clock, matched = matchmaker(room_size=4, max_wait=30)
+    queue.enqueue('Аня', 10)       # корзина 0
+    for name in ('Боря', 'Вика', 'Гена', 'Дима'):
+        queue.enqueue(name, 150)   # корзина 1
+    clock.advance(1)
+    queue.tick()
+    assert len(matched) == 1 and 'Аня' not in matched[0]
+    queue.enqueue('Женя', 250)     # корзина 2: соседняя для 1, но не для 0
+    clock.advance(30)
+    queue.tick()
+    assert len(matched) == 1
+    assert len(queue) == 2
+
+
+def test_empty_match_room_is_removed():
+    harness = Harness()
+    players = [harness.client(name) for name in ('Аня', 'Боря', 'Вика', 'Гена')]
+    for player in players:
+        player.join()
+        assert player.send('queue', skill=500)['type'] == 'success'
+    harness.advance(1.0)
+
+    room_name = harness.server.player_rooms['Аня']
+    assert room_name in harness.server.match_rooms
+    players[0].send('join_room', room_name='Основная')
+    players[1].send('leave')
+    assert room_name in harness.server.rooms
+    players[2].send('join_room', room_name='Основная')
+    players[3].send('join_room', room_name='Основная')
+    assert room_name not in harness.server.rooms
+    assert room_name not in harness.server.match_rooms
+
+
+def test_non_finite_skill_rejected():
+    harness = Harness()
+    player = harness.client('Аня')
+    player.join()
+    assert player.send('queue', skill=float('nan'))['type'] == 'error'
+    assert not len(harness.server.matchmaker)
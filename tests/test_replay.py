@@ -0,0 +1,55 @@
+"""Запись партии в файл .cgr и ее воспроизведение через GameRoom."""
+import random
+
+from bots import BotPlayer
+from replay import ReplayRecorder, ReplayWriter, load_replay, replay_game, synthetic_replays
+from server import GameRoom
+
+
+def play_recorded_game(directory, writer, seed=3):
+    rng = random.Random(seed)
+    room = GameRoom("Запись")
+    room.recorder = ReplayRecorder(str(directory), room.name, writer=writer)
+    for i in range(3):
+        room.add_bot(BotPlayer(f"Бот {i}", 'hard', rng))
+
+    room.start_server_game(rng.randrange(len(room.dictionary)))
+    passes = 0
+    while passes < 3:
+        bot = room.current_bot()
+        city = bot.choose_city(room)
+        if city is None:
+            room.skip_turn(bot.name)
+            passes += 1
+        else:
+            room.add_city(bot.name, city)
+            passes = 0
+    room.finish_game()
+    return room
+
+
+def comparable(state):
+    return {key: state[key] for key in ('names', 'scores', 'seated', 'used', 'last_letter', 'game_started')}
+
+
+def test_recorded_file_replays_to_the_same_state(tmp_path):
+    writer = ReplayWriter()
+    room = play_recorded_game(tmp_path, writer)
+    writer.wait()
+
+    files = list(tmp_path.glob('*.cgr'))
+    assert len(files) == 1
+    replay = load_replay(str(files[0]))
+    assert replay.room_name == "Запись"
+    assert replay.names == ["Бот 0", "Бот 1", "Бот 2"]
+    assert replay.moves == len(room.used.ids)
+
+    replayed, mismatches = replay_game(replay)
+    assert mismatches == 0
+    assert comparable(replayed.export()) == comparable(room.export())
+
+
+def test_synthetic_replays_have_no_mismatches():
+    for replay in synthetic_replays(5, players=2, seed=11):
+        assert replay.moves > 0
+        assert replay_game(replay)[1] == 0
@@ -0,0 +1,90 @@
+"""Круг игроков комнаты: места, удержание при отключении и очки вышедших."""
+import room_state
+from room_state import CitySet, PlayerTable
+
+
+def table_of(*names, capacity=None):
+    table = PlayerTable(capacity)
+    for name in names:
+        assert table.add(name)
+    return table
+
+
+def test_turn_passes_around_the_circle_and_skips_departed():
+    table = table_of('Аня', 'Боря', 'Вика')
+    assert table.names() == ['Аня', 'Боря', 'Вика']
+    table.advance()
+    assert table.current_name() == 'Боря'
+    assert table.remove('Боря')
+    assert table.current_name() == 'Вика'
+    table.advance()
+    assert table.current_name() == 'Аня'
+    assert not table.add('Аня')
+    assert not table.remove('Боря')
+
+
+def test_reserved_seat_is_kept_and_reclaimed_at_end_of_round():
+    table = table_of('Аня', 'Боря', 'Вика', capacity=3)
+    assert table.reserve('Боря')
+    assert 'Боря' in table and not table.is_seated('Боря')
+    assert len(table) == 2 and table.is_full()
+    assert not table.add('Гена')
+
+    table.advance()
+    assert table.current_name() == 'Вика'
+    assert table.reclaim('Боря')
+    assert table.names() == ['Аня', 'Боря', 'Вика']
+    assert not table.reclaim('Боря')
+
+
+def test_departed_scores_survive_until_reset():
+    table = table_of('Аня', 'Боря')
+    table.add_score('Боря', 3)
+    table.remove('Боря')
+    assert table.score_dict() == {'Боря': 3}
+    assert table.add('Боря')
+    assert table.score_dict() == {'Боря': 3}
+
+    table.remove('Боря')
+    table.reset_scores()
+    assert table.score_dict() == {}
+    assert 'Боря' not in table.by_name
+    assert table.add('Вика')
+    assert table.by_name['Вика'].slot == 1
+
+
+def test_departed_limit_forgets_oldest(monkeypatch):
+    monkeypatch.setattr(room_state, 'DEPARTED_LIMIT', 2)
+    table = table_of('Аня', 'Боря', 'Вика', 'Гена')
+    for name in ('Аня', 'Боря', 'Вика'):
+        table.add_score(name)
+        table.remove(name)
+    assert list(table.departed) == ['Боря', 'Вика']
+    assert 'Аня' not in table.by_name
+    assert table.free
+
+
+def test_export_restore_round_trip():
+    table = table_of('Аня', 'Боря', 'Вика', 'Гена')
+    table.add_score('Аня', 2)
+    table.add_score('Гена', 1)
+    table.remove('Гена')
+    table.reserve('Вика')
+    table.advance()
+
+    names, scores, seated, reserved = table.export()
+    restored = PlayerTable.restore(names, scores, seated, reserved, table.current_index(), capacity=5)
+    assert restored.export() == (names, scores, seated, reserved)
+    assert restored.current_name() == 'Боря'
+    assert restored.score_dict() == {'Аня': 2, 'Гена': 1}
+    assert restored.capacity == 5
+
+
+def test_city_set_membership_and_clear():
+    used = CitySet(20)
+    used.add(3)
+    used.add(17)
+    assert 3 in used and 17 in used and 4 not in used
+    assert list(used.ids) == [3, 17] and len(used) == 2
+    used.clear()
+    assert 3 not in used and len(used) == 0
@@ -0,0 +1,55 @@
+"""Комнаты в пуле потоков: состояние комнаты читает и меняет только ее поток."""
+import threading
+
+from harness import Harness
+from room_workers import RoomWorkers
+
+
+def test_call_runs_in_owner_thread():
+    workers = RoomWorkers(2)
+    try:
+        owner = workers.call('Комната', lambda: threading.current_thread().name)
+        assert owner == f"room-worker-{workers.owner('Комната')}"
+        # повторный вход из потока-владельца не ждет сам себя
+        assert workers.call('Комната', workers.call, 'Комната', lambda: 42) == 42
+    finally:
+        workers.stop()
+
+
+def test_room_reads_go_through_owner():
+    harness = Harness(room_workers=2)
+    try:
+        room = harness.server.rooms['Основная']
+        reads = []
+        summary = room.summary
+
+        def traced():
+            reads.append(threading.current_thread().name)
+            return summary()
+
+        room.summary = traced
+        player = harness.client('Аня')
+        player.join()
+        rooms = {info['name']: info for info in player.send('list_rooms')['rooms']}
+        assert rooms['Основная']['players'] == 1
+        assert reads and all(name.startswith('room-worker-') for name in reads)
+    finally:
+        harness.server.workers.stop()
+
+
+def test_bots_play_in_worker_pool():
+    harness = Harness(room_workers=2)
+    try:
+        player = harness.client('Аня')
+        player.join()
+        player.send('create_room', room_name='С ботом')
+        assert player.send('add_bot', difficulty='easy')['type'] == 'success'
+        room = harness.server.rooms['С ботом']
+        city = room.dictionary.names[0]
+        version = room.version
+        assert player.send('start', city=city)['type'] == 'success'
+        # бот ответил сам (ходом или пропуском), очередь снова у человека
+        assert harness.server.in_room(room, room.get_current_player) == 'Аня'
+        assert harness.server.in_room(room, lambda: room.version) >= version + 2
+    finally:
+        harness.server.workers.stop()
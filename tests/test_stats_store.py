@@ -0,0 +1,44 @@
+"""Статистика игроков: блочная таблица лидеров и запись в SQLite."""
+import random
+
+from stats_store import Leaderboard, StatsStore
+
+
+def test_leaderboard_keeps_order_across_block_splits():
+    board = Leaderboard()
+    keys = list(range(3 * Leaderboard.BLOCK_SIZE))
+    random.Random(7).shuffle(keys)
+    for key in keys:
+        board.add(key)
+
+    assert len(board.blocks) > 1
+    assert len(board) == len(keys)
+    assert board.top(5) == [0, 1, 2, 3, 4]
+    assert board.rank(1000) == 1000
+
+    for key in range(0, len(keys), 2):
+        board.remove(key)
+    assert len(board) == len(keys) // 2
+    assert board.top(3) == [1, 3, 5]
+    assert board.rank(1001) == 500
+
+
+def test_record_game_skips_bots_and_survives_restart(tmp_path):
+    path = str(tmp_path / 'stats.db')
+    store = StatsStore(path, flush_interval=0.01)
+    store.record_game({'Аня': 3, 'Боря': 1, 'Бот': 5}, bots=('Бот',))
+    store.record_game({'Аня': 4, 'Боря': 4})
+
+    assert store.player('Бот') is None
+    assert [row['player'] for row in store.top()] == ['Аня', 'Боря']
+    assert store.player('Боря') == {'player': 'Боря', 'games': 2, 'wins': 1,
+                                     'cities': 5, 'best_game': 4, 'rank': 2}
+    store.close()
+
+    reopened = StatsStore(path)
+    try:
+        assert reopened.player('Аня') == {'player': 'Аня', 'games': 2, 'wins': 1,
+                                          'cities': 7, 'best_game': 4, 'rank': 1}
+        assert len(reopened.leaderboard) == 2
+    finally:
+        reopened.close()
@@ -0,0 +1,91 @@
+"""Проверки команды tournament_start."""
+from harness import Harness
+
+
+def joined(harness, *names):
+    clients = [harness.client(name) for name in names]
+    for client in clients:
+        client.join()
+    return clients
+
+
+def test_participant_starts_tournament():
+    harness = Harness()
+    anna, boris = joined(harness, 'Аня', 'Боря')
+    response = anna.send('tournament_start', tournament='Кубок', players=['Аня', 'Боря'])
+    assert response['type'] == 'success'
+    assert 'Кубок' in harness.server.tournaments
+
+
+def test_outsider_cannot_pull_players_in():
+    harness = Harness()
+    _, _, outsider = joined(harness, 'Аня', 'Боря', 'Чужой')
+    response = outsider.send('tournament_start', tournament='Кубок', players=['Аня', 'Боря'])
+    assert response['type'] == 'error'
+    assert not harness.server.tournaments
+
+
+def test_name_in_command_is_not_trusted():
+    harness = Harness()
+    _, _, outsider = joined(harness, 'Аня', 'Боря', 'Чужой')
+    # чужое имя в player_name не делает подключение участником
+    outsider.name = 'Аня'
+    response = outsider.send('tournament_start', tournament='Кубок', players=['Аня', 'Боря'])
+    assert response['type'] == 'error'
+    assert not harness.server.tournaments
+
+
+def test_admin_token_allows_any_players():
+    harness = Harness(admin_token='секрет')
+    _, _, admin = joined(harness, 'Аня', 'Боря', 'Судья')
+    wrong = admin.send('tournament_start', tournament='Кубок', players=['Аня', 'Боря'], admin_token='нет')
+    assert wrong['type'] == 'error'
+    response = admin.send('tournament_start', tournament='Кубок', players=['Аня', 'Боря'], admin_token='секрет')
+    assert response['type'] == 'success'
+
+
+def test_duplicate_players_rejected():
+    harness = Harness()
+    anna, _ = joined(harness, 'Аня', 'Боря')
+    response = anna.send('tournament_start', tournament='Кубок', players=['Аня', 'Аня'])
+    assert response['type'] == 'error'
+    assert 'повторяются' in response['message']
+    assert not harness.server.tournaments
+
+
+def test_non_string_players_rejected():
+    harness = Harness()
+    anna, _ = joined(harness, 'Аня', 'Боря')
+    for players in (['Аня', ['Боря']], ['Аня', 5], ['Аня', None], ['Аня', '']):
+        response = anna.send('tournament_start', tournament='Кубок', players=players)
+        assert response['type'] == 'error'
+        assert response['message'] == 'Игроки турнира указываются именами'
+    assert not harness.server.tournaments
+
+
+def test_large_tournament_fits_in_one_command():
+    harness = Harness()
+    # длинные кириллические имена: в JSON каждая буква занимает 6 байт
+    names = [f'Игрок-участник-турнира-{i:04d}' for i in range(2000)]
+    clients = joined(harness, *names)
+    response = clients[0].send('tournament_start', tournament='Кубок', players=names, duration=60)
+    assert response['type'] == 'success'
+    assert len(harness.server.tournaments['Кубок'].players) == 2000
+
+
+def test_other_commands_keep_small_limit():
+    harness = Harness()
+    anna, = joined(harness, 'Аня')
+    response = anna.send('chat', message='а' * 100, padding='б' * 10000)
+    assert response['message'] == 'Сообщение слишком большое'
+
+
+def test_bad_duration_and_rounds_rejected():
+    harness = Harness()
+    anna, _ = joined(harness, 'Аня', 'Боря')
+    for fields in ({'duration': float('nan')}, {'duration': float('inf')}, {'duration': 0},
+                   {'duration': -5}, {'duration': 10 ** 9}, {'rounds': 0}, {'rounds': -1}):
+        response = anna.send('tournament_start', tournament='Кубок', players=['Аня', 'Боря'], **fields)
+        assert response['type'] == 'error', fields
+    assert not harness.server.tournaments
+    assert not harness.server.deadlines
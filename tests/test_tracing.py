@@ -0,0 +1,72 @@
+"""Трассировка команд: выборка, трассы по запросу и отчет latency."""
+import tracing
+from harness import Harness
+from tracing import RollingHistogram, Tracer, summarize
+
+
+def finish_all(tracer, traces):
+    for trace in traces:
+        if trace is not None:
+            tracer.finish(trace)
+
+
+def test_every_nth_command_and_forced_traces_are_sampled():
+    tracer = Tracer(3, slow_log_path=None)
+    traces = [tracer.begin(0.0, 'list_rooms', {}, None, {}) for _ in range(6)]
+    assert [trace is not None for trace in traces] == [False, False, True, False, False, True]
+    assert tracing.in_flight == 2
+    finish_all(tracer, traces)
+    assert tracing.in_flight == 0
+
+    tracer = Tracer(0, slow_log_path=None)
+    assert tracer.begin(0.0, 'list_rooms', {}, None, {}) is None
+    forced = tracer.begin(0.0, 'list_rooms', {'trace': True}, None, {})
+    assert forced is not None and forced.command == 'list_rooms'
+    finish_all(tracer, [forced])
+    assert tracer.report()['commands']['list_rooms']['count'] == 1
+
+
+def test_slow_move_boosts_tracing_of_its_room():
+    tracer = Tracer(0, slow_ms=0, slow_log_path=None)
+    rooms = {'Аня': 'Основная', 'Боря': 'Другая'}
+    slow = tracer.begin(0.0, 'add_city', {'trace': True}, 'Аня', rooms)
+    finish_all(tracer, [slow])
+    assert tracer.boost == {'Основная': tracing.BOOST_SAMPLES}
+
+    boosted = tracer.begin(0.0, 'add_city', {}, 'Аня', rooms)
+    other = tracer.begin(0.0, 'add_city', {}, 'Боря', rooms)
+    assert boosted is not None and boosted.room == 'Основная'
+    assert other is None
+    finish_all(tracer, [boosted])
+    tracer.forget_room('Основная')
+    assert 'Основная' not in tracer.histograms
+
+
+def test_summary_quantiles_and_slo():
+    histogram = RollingHistogram()
+    for _ in range(99):
+        histogram.record(0.001, 10.0)
+    histogram.record(0.5, 10.0)
+    summary = summarize((histogram,), 10.0, slo_ms=100)
+    assert summary['count'] == 100
+    assert summary['p50_ms'] <= 1.6
+    assert summary['max_ms'] == 500.0
+    assert summary['within_slo'] == 0.99
+    assert summarize((histogram,), 10.0 + 2 * tracing.HISTOGRAM_WINDOW) is None
+
+
+def test_trace_id_in_reply_and_latency_report():
+    harness = Harness()
+    harness.server.start_tracing(Tracer(0, slow_log_path=None))
+    player = harness.client('Аня')
+    player.join()
+
+    assert 'trace_id' not in player.send('list_rooms')
+    reply = player.send('list_rooms', trace=True)
+    assert reply['trace_id']
+    assert tracing.in_flight == 0
+
+    report = player.send('latency')
+    assert report['type'] == 'latency'
+    assert report['sample_every'] == 0
+    assert report['commands']['list_rooms']['count'] == 1
@@ -0,0 +1,138 @@
+import math
+import random
+import threading
+
+MAX_GAME_DURATION = 3600     # секунд на партию тура
+
+
+class Tournament:
+    """Турнир поверх обычных комнат: швейцарка или олимпийская система.
+
+    Все партии тура создаются и запускаются одной пачкой, у каждой серверный
+    дедлайн. Когда заканчивается последняя партия тура, итоги подводятся
+    по player_scores и сразу составляются пары следующего тура.
+    """
+
+    def __init__(self, server, name, players, system='swiss', rounds=3, game_duration=120, rng=None):
+        # rounds учитывается только в швейцарской системе, олимпийская идет до одного игрока
+        if system not in ('swiss', 'bracket'):
+            raise ValueError(f"Неизвестная система турнира: {system}")
+        if len(players) < 2:
+            raise ValueError("Для турнира нужно хотя бы два игрока")
+        # NaN или бесконечность в дедлайне ломают кучу дедлайнов сервера
+        if not math.isfinite(game_duration) or not 0 < game_duration <= MAX_GAME_DURATION:
+            raise ValueError(f"Длительность партии - от 0 до {MAX_GAME_DURATION} секунд")
+        if rounds < 1:
+            raise ValueError("В турнире должен быть хотя бы один тур")
+
+        self.server = server
+        self.name = name
+        self.system = system
+        self.rounds = rounds
+        self.game_duration = game_duration
+        self.rng = rng or random.Random()
+
+        self.players = list(players)
+        self.points = {player: 0.0 for player in self.players}
+        self.city_points = {player: 0 for player in self.players}
+        self.opponents = {player: set() for player in self.players}
+        self.alive = list(self.players)     # для олимпийской системы
+
+        self.round = 0
+        self.pending = {}    # комната -> игроки стола
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def export(self):
+        with self.lock:
+            return {
+                'name': self.name, 'players': self.players, 'system': self.system,
+                'rounds': self.rounds, 'game_duration': self.game_duration,
+                'points': self.points, 'city_points': self.city_points,
+                'opponents': {player: sorted(opponents) for player, opponents in self.opponents.items()},
+                'alive': self.alive, 'round': self.round, 'pending': self.pending, 'finished': self.finished,
+            }
+
+    @classmethod
+    def restore(cls, server, state):
+        tournament = cls(server, state['name'], state['players'], state['system'],
+                         state['rounds'], state['game_duration'])
+        tournament.points = state['points']
+        tournament.city_points = state['city_points']
+        tournament.opponents = {player: set(opponents) for player, opponents in state['opponents'].items()}
+        tournament.alive = state['alive']
+        tournament.round = state['round']
+        tournament.pending = state['pending']
+        tournament.finished = state['finished']
+        return tournament
+
+    def standings(self):
+        return sorted(self.players, key=lambda p: (self.points[p], self.city_points[p]), reverse=True)
+
+    def pair_players(self):
+        if self.system == 'bracket':
+            pool = list(self.alive)
+        else:
+            pool = self.standings()
+
+        pairs = []
+        # нечетный игрок получает свободный тур
+        if len(pool) % 2:
+            bye = pool.pop()
+            self.points[bye] += 1
+
+        while pool:
+            first = pool.pop(0)
+            partner = next((p for p in pool if p not in self.opponents[first]), pool[0])
+            pool.remove(partner)
+            pairs.append([first, partner])
+        return pairs
+
+    def start_round(self):
+        with self.lock:
+            if self.finished:
+                return []
+
+            self.round += 1
+            pairs = self.pair_players()
+            names = [f"{self.name} · Тур {self.round} · Стол {i}" for i in range(1, len(pairs) + 1)]
+            self.pending = dict(zip(names, pairs))
+
+        self.server.start_tournament_games(dict(self.pending), self.game_duration, self.rng)
+        print(f"🏆 {self.name}: тур {self.round}, столов {len(pairs)}")
+        return names
+
+    def on_game_over(self, room_name, scores):
+        with self.lock:
+            table = self.pending.pop(room_name, None)
+            if table is None:
+                return
+
+            for player in table:
+                self.city_points[player] += scores.get(player, 0)
+                self.opponents[player].update(p for p in table if p != player)
+
+            best = max(scores.get(player, 0) for player in table)
+            winners = [player for player in table if scores.get(player, 0) == best]
+            for player in winners:
+                self.points[player] += 1.0 / len(winners)
+
+            if self.system == 'bracket':
+                # при ничьей дальше проходит тот, кто выше в посеве
+                winner = min(winners, key=self.players.index)
+                for player in table:
+                    if player != winner and player in self.alive:
+                        self.alive.remove(player)
+
+            if self.pending:
+                return
+
+            if self.system == 'bracket':
+                self.finished = len(self.alive) < 2
+            else:
+                self.finished = self.round >= self.rounds
+
+        if self.finished:
+            self.server.announce_tournament_results(self)
+        else:
+            self.start_round()
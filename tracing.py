@@ -0,0 +1,352 @@
+"""Трассировка команд: где теряется время между чтением хода и ответом.
+
+Трассируется выборка команд: каждая sample_every-я, команды с полем
+trace=true и следующие команды комнаты, в которой только что был
+медленный ход. У трассы отметки этапов от получения байт из сокета до
+записи ответа, ее id приходит в ответе полем trace_id. Время
+трассированного хода попадает в скользящую гистограмму его комнаты,
+других команд - в гистограмму команды; по ним считаются квантили и
+доля ходов, уложившихся в MOVE_SLO_MS. Трассы дольше порога пишутся в
+журнал медленных команд (JSON в строке).
+
+Остальные команды не получают ни одной отметки времени: их цена -
+счетчик выборки. Доля в гистограмме равна доле выборки, квантили от
+этого не смещаются, а счетчик count показывает объем выборки.
+
+Этапы трассы (время от предыдущей отметки):
+    parse     от получения байт из сокета: очередь за прежними строками блока, JSON и схема команды
+    dispatch  обработчик до комнаты (блокировка сервера, поиск комнаты)
+    mailbox   ожидание в очереди потока комнаты (с --room-workers)
+    lock_wait ожидание блокировки комнаты
+    validate  проверка хода и изменение состояния
+    enqueue   публикация изменения в шину событий
+    room      остаток работы с комнатой
+    write     ответ записан в сокет
+
+    python tracing.py --bench
+"""
+import argparse
+import json
+import itertools
+import os
+import threading
+import time
+from array import array
+from collections import deque
+
+SAMPLE_EVERY = 50           # трассируется каждая пятидесятая команда
+SLOW_MS = 250               # порог журнала медленных команд
+MOVE_SLO_MS = 100           # цель: ответ на ход быстрее, чем за столько мс
+MOVE_COMMANDS = ('start', 'add_city')
+HISTOGRAM_WINDOW = 60       # секунд в скользящей гистограмме
+HISTOGRAM_SLOTS = 6
+BOOST_SAMPLES = 20          # сколько следующих ходов комнаты трассировать после медленного
+SLOW_LOG_PATH = 'slow_commands.log'
+# верхние границы корзин гистограммы в микросекундах: 50 мкс * 2^i, последняя корзина - все, что дольше
+BUCKET_BOUNDS = tuple(50 * 2 ** i for i in range(18))
+LAST_BUCKET = len(BUCKET_BOUNDS)
+
+_local = threading.local()
+# трасс в работе; пока 0, отметки не ставятся. Горячие места проверяют его сами перед mark(),
+# чтобы без трассы не платить даже за вызов функции
+in_flight = 0
+
+
+def current():
+    return getattr(_local, 'trace', None) if in_flight else None
+
+
+def mark(stage):
+    if in_flight:
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace.marks.append((stage, time.perf_counter()))
+
+
+def run_traced(trace, fn, *args):
+    # выполняет fn в потоке комнаты как часть той же трассы
+    previous = getattr(_local, 'trace', None)
+    _local.trace = trace
+    mark('mailbox')
+    try:
+        return fn(*args)
+    finally:
+        _local.trace = previous
+
+
+class Trace:
+    __slots__ = ('trace_id', 'command', 'player', 'room', 'started', 'marks')
+
+    def __init__(self, trace_id, command, player, room, started):
+        self.trace_id = trace_id
+        self.command = command
+        self.player = player
+        self.room = room
+        self.started = started      # байты получены из сокета
+        self.marks = [('parse', time.perf_counter())]
+
+    def spans(self):
+        result = []
+        previous = self.started
+        for stage, at in self.marks:
+            result.append((stage, round((at - previous) * 1000, 3)))
+            previous = at
+        return result
+
+    def to_dict(self, total_ms):
+        return {'trace_id': self.trace_id, 'command': self.command, 'player': self.player, 'room': self.room,
+                'total_ms': round(total_ms, 3), 'spans': self.spans(), 'at': time.strftime("%H:%M:%S")}
+
+
+class RollingHistogram:
+    """Задержки за последние window секунд: кольцо из slots гистограмм.
+
+    Запись трогает одну корзину текущего слота; устаревший слот
+    обнуляется при первой записи в него. Записи идут без блокировки: при
+    гонке двух потоков может потеряться единица в счетчике, для оценки
+    задержек это не важно.
+    """
+
+    __slots__ = ('slot_seconds', 'slots', 'epochs', 'maxima', 'current', 'index', 'until')
+
+    def __init__(self, window=HISTOGRAM_WINDOW, slots=HISTOGRAM_SLOTS):
+        self.slot_seconds = window / slots
+        self.slots = [array('I', bytes(4 * (LAST_BUCKET + 1))) for _ in range(slots)]
+        self.epochs = [-1] * slots
+        self.maxima = [0.0] * slots
+        self.current = self.slots[0]    # слот, в который идут записи, до момента until
+        self.index = 0
+        self.until = 0.0
+
+    def record(self, seconds, now):
+        if now >= self.until:
+            self.rotate(now)
+        # номер корзины - число двоичных разрядов в количестве интервалов по 50 мкс
+        bucket = int(seconds * 20000).bit_length()
+        self.current[bucket if bucket < LAST_BUCKET else LAST_BUCKET] += 1
+        if seconds > self.maxima[self.index]:
+            self.maxima[self.index] = seconds
+
+    def rotate(self, now):
+        epoch = int(now / self.slot_seconds)
+        index = epoch % len(self.slots)
+        if self.epochs[index] != epoch:
+            self.epochs[index] = epoch
+            self.slots[index] = array('I', bytes(4 * (LAST_BUCKET + 1)))
+            self.maxima[index] = 0.0
+        self.current = self.slots[index]
+        self.index = index
+        self.until = (epoch + 1) * self.slot_seconds
+
+    def add_to(self, counts, now):
+        # прибавляет к counts корзины живых слотов, возвращает максимум в мкс
+        oldest = int(now / self.slot_seconds) - len(self.slots) + 1
+        maximum = 0.0
+        for index, epoch in enumerate(self.epochs):
+            if epoch >= oldest:
+                for bucket, count in enumerate(self.slots[index]):
+                    counts[bucket] += count
+                maximum = max(maximum, self.maxima[index] * 1e6)
+        return maximum
+
+
+def summarize(histograms, now, slo_ms=MOVE_SLO_MS):
+    """Квантили и доля укладывающихся в SLO по одной или нескольким гистограммам"""
+    counts = [0] * (LAST_BUCKET + 1)
+    maximum = 0.0
+    for histogram in histograms:
+        maximum = max(maximum, histogram.add_to(counts, now))
+    total = sum(counts)
+    if not total:
+        return None
+
+    def quantile(q):
+        # верхняя граница корзины, в которую попадает q-я доля, но не больше максимума
+        need = q * total
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if seen >= need:
+                if bucket < LAST_BUCKET:
+                    return round(min(BUCKET_BOUNDS[bucket], maximum) / 1000, 3)
+                break
+        return round(maximum / 1000, 3)
+
+    slo_micros = slo_ms * 1000
+    within = sum(count for bucket, count in enumerate(counts)
+                 if bucket < LAST_BUCKET and BUCKET_BOUNDS[bucket] <= slo_micros)
+    return {'count': total, 'p50_ms': quantile(0.5), 'p95_ms': quantile(0.95), 'p99_ms': quantile(0.99),
+            'max_ms': round(maximum / 1000, 3), 'slo_ms': slo_ms, 'within_slo': round(within / total, 4)}
+
+
+class Tracer:
+    def __init__(self, sample_every=SAMPLE_EVERY, slow_ms=SLOW_MS, slow_log_path=SLOW_LOG_PATH):
+        self.sample_every = sample_every    # 0 - только по запросу клиента и после медленных ходов
+        self.period = sample_every or 1 << 62
+        self.slow_ms = slow_ms
+        self.slow_seconds = slow_ms / 1000
+        self.slow_log_path = slow_log_path
+        self.counter = itertools.count(1)   # next() атомарен, блокировка на каждой команде не нужна
+        self.prefix = os.urandom(3).hex()
+        self.histograms = {}        # комната -> RollingHistogram ходов
+        self.commands = {}          # команда, кроме ходов -> RollingHistogram
+        self.boost = {}             # комната -> сколько еще ходов трассировать подряд
+        self.slow = deque(maxlen=200)
+        self.traced = 0
+        self.lock = threading.Lock()    # ускоренная трассировка, счетчик трасс и журнал медленных
+
+    def begin(self, started, command, message, player, player_rooms):
+        """Trace для разобранной команды, если она попала в выборку, иначе None
+
+        player - игрок подключения (None до входа), по нему находится комната.
+        """
+        global in_flight
+        counter = next(self.counter)
+        forced = message.get('trace') is True
+        if counter % self.period and not forced and not self.boost:
+            return None
+
+        room_name = player_rooms.get(player)
+        if counter % self.period and not forced and not (command in MOVE_COMMANDS and self.take_boost(room_name)):
+            return None
+
+        trace = Trace(f"{self.prefix}-{counter:x}", command, player, room_name, started or time.perf_counter())
+        with self.lock:
+            in_flight += 1
+            self.traced += 1
+        _local.trace = trace
+        return trace
+
+    def take_boost(self, room_name):
+        # комнату с недавним медленным ходом трассируем подряд
+        with self.lock:
+            left = self.boost.get(room_name)
+            if left is None:
+                return False
+            if left <= 1:
+                del self.boost[room_name]
+            else:
+                self.boost[room_name] = left - 1
+            return True
+
+    def finish(self, trace):
+        global in_flight
+        ended = time.perf_counter()
+        trace.marks.append(('write', ended))
+        _local.trace = None
+        elapsed = ended - trace.started
+
+        # ход попадает в гистограмму комнаты, остальные команды - в гистограмму команды;
+        # setdefault атомарен, поэтому новую гистограмму создает один поток
+        if trace.command in MOVE_COMMANDS:
+            histograms, key = self.histograms, trace.room
+        else:
+            histograms, key = self.commands, trace.command
+        if key is not None:
+            (histograms.get(key) or histograms.setdefault(key, RollingHistogram())).record(elapsed, ended)
+
+        entry = trace.to_dict(elapsed * 1000) if elapsed >= self.slow_seconds else None
+        with self.lock:
+            in_flight -= 1
+            if entry is not None:
+                self.slow.append(entry)
+                if trace.command in MOVE_COMMANDS and trace.room is not None:
+                    self.boost[trace.room] = BOOST_SAMPLES
+        if entry is not None:
+            self.write_slow(entry)
+
+    def write_slow(self, entry):
+        print(f"🐢 Медленная команда {entry['command']} ({entry['room']}): {entry['total_ms']:.1f} мс, "
+              f"трасса {entry['trace_id']}")
+        if not self.slow_log_path:
+            return
+        try:
+            with open(self.slow_log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"Ошибка записи журнала медленных команд: {e}")
+
+    def forget_room(self, room_name):
+        with self.lock:
+            self.histograms.pop(room_name, None)
+            self.boost.pop(room_name, None)
+
+    def report(self, room_name=None, slow_limit=10):
+        now = time.perf_counter()
+        if room_name is not None:
+            rooms = {room_name: self.histograms[room_name]} if room_name in self.histograms else {}
+        else:
+            rooms = dict(self.histograms)
+        with self.lock:
+            slow = [entry for entry in self.slow if room_name is None or entry['room'] == room_name]
+        return {
+            'moves': summarize(rooms.values(), now),    # все ходы выбранных комнат вместе
+            'rooms': {name: summary for name, histogram in rooms.items()
+                      if (summary := summarize((histogram,), now)) is not None},
+            'commands': {name: summary for name, histogram in dict(self.commands).items()
+                         if (summary := summarize((histogram,), now)) is not None},
+            'slow': slow[-slow_limit:],
+        }
+
+
+def attach_trace_id(response, trace):
+    # ответы - строки JSON-объекта с переводом строки в конце
+    if response.endswith('}\n'):
+        return f'{response[:-2]}, "trace_id": "{trace.trace_id}"}}\n'
+    return response
+
+
+# замер накладных расходов
+
+def run_benchmark(rooms, seconds, chunk):
+    from room_workers import RoomDriver
+    from server import CitiesGameServer
+
+    server = CitiesGameServer(port=0, stats_path=None, replay_dir=None, analytics_dir=None, command_rate=None,
+                              threaded_events=False)
+    drivers = [RoomDriver(server, f"Стол {i}", 20000 + 2 * i) for i in range(rooms)]
+    configs = [("без трассировки", None),
+               ("выборка 1/100", Tracer(100, slow_log_path=None)),
+               (f"выборка 1/{SAMPLE_EVERY}", Tracer(SAMPLE_EVERY, slow_log_path=None)),
+               ("каждая команда", Tracer(1, slow_log_path=None))]
+    spent = [0.0] * len(configs)
+    moves = [0] * len(configs)
+
+    # один сервер, конфигурации сменяются каждые chunk кругов по комнатам: шум общей машины
+    # и рост состояния достаются всем поровну. Все идет в одном потоке (шина без своих
+    # потоков), поэтому считаем процессорное время потока, а не время по часам
+    total = seconds * len(configs)
+    while sum(spent) < total:
+        for index, (_, tracer) in enumerate(configs):
+            server.tracer = tracer
+            started = time.thread_time()
+            for _ in range(chunk):
+                for driver in drivers:
+                    driver.step()
+                server.bus.flush()
+            spent[index] += time.thread_time() - started
+            moves[index] += chunk * len(drivers)
+    server.bus.close()
+
+    baseline = spent[0] / moves[0]
+    print(f"🔎 Комнат {rooms}, по {seconds} с процессорного времени на конфигурацию")
+    for (title, _), time_spent, count in zip(configs, spent, moves):
+        per_move = time_spent / count
+        print(f"  {title:30} {per_move * 1e6:6.1f} мкс на ход  {(per_move - baseline) / baseline * 100:+6.2f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Трассировка команд: замер накладных расходов")
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--rooms', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--chunk', type=int, default=5, help="кругов по комнатам до смены конфигурации")
+    args = parser.parse_args()
+
+    if not args.bench:
+        parser.error("трассировка включается в server.py (--trace-every, --slow-ms), здесь только --bench")
+    run_benchmark(args.rooms, args.seconds, args.chunk)
+
+
+if __name__ == "__main__":
+    main()